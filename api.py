@@ -1,202 +1,563 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
 from flask_cors import CORS
 import numpy as np
-import joblib
-from datetime import datetime, timedelta
-import random
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from batching import MICROBATCH_ENABLED, MicroBatcher
+from cache import MISSING, ROUTE_TTLS, prediction_key, response_cache
+from features import to_columns
+from forecast import DEFAULT_HORIZON, ForecastStore
+from hotswap import ModelSwapper
+from ingest import SalesIngestor
+from metrics import metrics
+from price_optimization import optimize_price
+from recommend import DEFAULT_TOP_K, RecommendationStore
+from registry import registry
+from restock import DEFAULT_LIMIT, plan_restock, top_n
+from scenario import run_scenario
+from wire import decode_body, encode, install_json, response_format
+
+# Rows scored per model.predict call by the batch endpoints
+BATCH_CHUNK_SIZE = 10000
+
+# Response field holding each model's prediction
+OUTPUT_KEYS = {
+    'demand': 'predicted_demand_forecast',
+    'pricing': 'predicted_price',
+    'inventory': 'predicted_inventory_level',
+    'recommendation': 'Recommended Product',
+}
+# Longest forecast window /api/forecast serves
+MAX_FORECAST_DAYS = 90
+# Dashboard: catalog stock below this is flagged, and this many best sellers are listed
+LOW_STOCK_THRESHOLD = 30
+TOP_PRODUCTS = 5
+
+# URL names that differ from registry names
+MODEL_ALIASES = {'price': 'pricing', 'recommend': 'recommendation'}
 
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app)  # ✅ Enable CORS for frontend communication
+# Route errors go to app.logger (the 'api' logger: Flask's stderr handler unless logging is configured)
+install_json(app)  # orjson-backed jsonify/get_json when installed; MessagePack and Arrow bodies: see wire.py
+
+# All bundles are served from this process and load lazily from Model/ on first use (see registry.py);
+# set WALMART_PRELOAD=1 to load and warm them up at startup
+if os.environ.get('WALMART_PRELOAD') == '1':
+    registry.preload()
+
+# Updated bundles are loaded and warmed in the background and swapped in without a restart; a versioned
+# bundle can be staged as a candidate that shadow-scores sampled live traffic first (see hotswap.py)
+swapper = ModelSwapper(registry)
+
+# data/sales.csv is tailed into per-product aggregates (see ingest.py); forecast, dashboard and restock
+# read those instead of rescanning the log, and forecasts for every product are precomputed from them
+ingestor = SalesIngestor()
+forecast_store = ForecastStore(registry, ingestor)
+
+# predict_proba of the recommendation forest for every profile, built once per bundle version (see recommend.py)
+recommendations = RecommendationStore(registry)
+if os.environ.get('WALMART_PRELOAD') == '1':
+    recommendations.table()
+
+# Opt-in (WALMART_MICROBATCH=1): concurrent single-row predictions are queued for a few ms and
+# scored together (see batching.py)
+class InFlight:
+    """Requests currently being served by this process (lets the batchers stop waiting when nobody else can join)"""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def add(self, delta):
+        with self._lock:
+            self.count += delta
+
+    def __call__(self):
+        return self.count
+
+in_flight = InFlight()
+batchers = ({name: MicroBatcher(registry, name, cache=response_cache, in_flight=in_flight, swapper=swapper)
+             for name in registry.specs} if MICROBATCH_ENABLED else {})
+
+# Hot-path instrumentation: per-stage latency histograms and request/error counts (see metrics.py)
+def metric_labels(model=None):
+    return (('endpoint', request.endpoint or 'unknown'), ('model', model or g.get('model_name', '')))
+
+@contextmanager
+def timed_stage(stage, model=None):
+    with metrics.timer('walmart_stage_seconds', metric_labels(model) + (('stage', stage),)):
+        yield
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    in_flight.add(1)
+    swapper.ensure_started()
+
+@app.teardown_request
+def end_request(exc=None):
+    in_flight.add(-1)
+
+@app.after_request
+def record_request_metrics(response):
+    labels = metric_labels()
+    metrics.observe('walmart_request_seconds', labels, time.perf_counter() - g.get('request_start', time.perf_counter()))
+    metrics.inc('walmart_requests_total', labels + (('status', str(response.status_code)),))
+    if response.status_code >= 400:
+        metrics.inc('walmart_request_errors_total', labels)
+    metrics.maybe_flush()
+    return response
+
+def read_json(force=True, single=False):
+    """Request body as JSON, MessagePack or Arrow by Content-Type (`single`: one record is expected)"""
+    with timed_stage('decode'):
+        return decode_body(request, force=force, single=single)
+
+def respond(payload):
+    """Response in the content type the client accepts (JSON unless it asks for MessagePack or Arrow)"""
+    with timed_stage('encode'):
+        return encode(app, payload, response_format(request))
+
+# Cached predictions and GET responses depend on the models, so drop them when a bundle is reloaded
+def _invalidate_cache(model_name):
+    response_cache.invalidate(f'predict:{model_name}')
+    for route in ROUTE_TTLS:
+        response_cache.invalidate(route)
+
+registry.add_listener(_invalidate_cache)
 
-# Load demand prediction model
-try:
-    model_bundle = joblib.load(r'D:\Walmart\Model\demand_model_bundle.pkl')
-    model = model_bundle['model']
-    le_products = model_bundle['label_encoder_products']
-    le_category = model_bundle['label_encoder_category']
-    le_region = model_bundle['label_encoder_region']
-    le_weather = model_bundle['label_encoder_weather']
-    le_season = model_bundle['label_encoder_seasonality']
-except Exception as e:
-    raise RuntimeError(f"❌ Failed to load model or encoders: {str(e)}")
-
-# Mock data for dashboard (replace with actual database queries)
-def get_mock_dashboard_data():
+def cached_route(route):
+    """Serve repeated GETs of a route with the same path and query string from the response cache"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = (route, request.path, tuple(sorted(request.args.items(multi=True))), request.headers.get('Accept', ''))
+            cached = response_cache.get(key)
+            if cached is not MISSING:
+                body, status, mimetype = cached
+                return app.response_class(body, status=status, mimetype=mimetype)
+            response = app.make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                response_cache.set(key, (response.get_data(), 200, response.mimetype), ROUTE_TTLS[route])
+            return response
+        return wrapper
+    return decorator
+
+def get_dashboard_data():
+    """Dashboard totals and best sellers from the sales aggregates, low stock from a scan of the catalog store"""
+    ingestor.refresh()
+    sales, products = ingestor.by_product, ingestor.products
+    n = len(sales)
+
+    top = []
+    if n:
+        units = sales.total_units[:n]
+        best = top_n(units, TOP_PRODUCTS)
+        product_ids = [sales.keys[i] for i in best]
+        for i, product_id, row in zip(best, product_ids, products.rows_of('id', product_ids)):
+            name = products.vocab['name'][products['name'][row]] if row >= 0 else product_id
+            top.append({'_id': product_id, 'name': name, 'totalQuantity': int(units[i]),
+                        'product': {'_id': product_id, 'name': name}})
+
+    low = np.flatnonzero(products['stock'] < LOW_STOCK_THRESHOLD)
     return {
-        'totalSales': 1250,
-        'totalOrders': 89,
-        'lowStock': [
-            {'_id': '1', 'name': 'Wireless Headphones', 'stock': 5},
-            {'_id': '2', 'name': 'Smartphone Case', 'stock': 8},
-            {'_id': '3', 'name': 'USB Cable', 'stock': 12}
-        ],
-        'topProducts': [
-            {'_id': '1', 'name': 'Wireless Headphones', 'totalQuantity': 150, 'product': {'_id': '1', 'name': 'Wireless Headphones'}},
-            {'_id': '2', 'name': 'Smartphone Case', 'totalQuantity': 120, 'product': {'_id': '2', 'name': 'Smartphone Case'}},
-            {'_id': '3', 'name': 'USB Cable', 'totalQuantity': 95, 'product': {'_id': '3', 'name': 'USB Cable'}},
-            {'_id': '4', 'name': 'Bluetooth Speaker', 'totalQuantity': 80, 'product': {'_id': '4', 'name': 'Bluetooth Speaker'}}
-        ]
+        'totalSales': int(sales.total_units[:n].sum()),
+        'totalOrders': int(sales.sales_count[:n].sum()),
+        'lowStock': [{'_id': product_id, 'name': name, 'stock': int(stock)} for product_id, name, stock in
+                     zip(products.decode('id', low), products.decode('name', low), products['stock'][low])],
+        'topProducts': top,
     }
 
-def generate_demand_forecast_data(product_id='all'):
-    """Generate mock demand forecast data"""
-    base_date = datetime.now()
-    data = []
-    
-    for i in range(14):  # 14 days of data
-        date = base_date + timedelta(days=i)
-        actual_demand = random.randint(50, 100) if i < 7 else None  # Only past 7 days have actual data
-        predicted_demand = random.randint(45, 105)
-        
-        data.append({
-            'day': date.strftime('%Y-%m-%d'),
-            'demand': actual_demand,
-            'predicted': predicted_demand
-        })
-    
-    return data
-
-def generate_price_optimization_data(product_id='all'):
-    """Generate mock price optimization data"""
-    price_points = [250, 275, 300, 325, 350, 375, 400]
-    data = []
-    
-    for price in price_points:
-        # Simple demand curve - higher price = lower demand
-        demand = max(30, 120 - (price - 250) * 0.2)
-        revenue = price * demand
-        
-        data.append({
-            'price': price,
-            'demand': int(demand),
-            'revenue': int(revenue)
-        })
-    
-    return data
-
-def generate_restock_suggestions():
-    """Generate mock restock suggestions"""
-    return [
-        {
-            'name': 'Wireless Headphones',
-            'stock': 5,
-            'predictedDemand': 25.5,
-            'restock': 20
-        },
-        {
-            'name': 'Smartphone Case',
-            'stock': 8,
-            'predictedDemand': 18.3,
-            'restock': 15
-        },
-        {
-            'name': 'USB Cable',
-            'stock': 12,
-            'predictedDemand': 22.1,
-            'restock': 18
-        }
-    ]
-
-# Feature preprocessing (existing function)
-def preprocess_input(user):
-    try:
-        units_sold_trans = np.log1p(user['Units Sold'])
-        demand_forecast_trans = np.log1p(user['Demand Forecast'])
-
-        product_encoded = le_products.transform([user['Products']])[0]
-        category_encoded = le_category.transform([user['Category']])[0]
-        region_encoded = le_region.transform([user['Region']])[0]
-        weather_encoded = le_weather.transform([user['Weather Condition']])[0]
-        season_encoded = le_season.transform([user['Seasonality']])[0]
-
-        date_obj = datetime(user['year'], user['month'], user['day'])
-        weekday = date_obj.weekday()
-        weekend = 1 if weekday > 4 else 0
-        m1 = np.sin(user['month'] * (2 * np.pi / 12))
-        m2 = np.cos(user['month'] * (2 * np.pi / 12))
-        price_discount = user['Price'] * user['Discount']
-        sold_ordered_interaction = units_sold_trans * user['Units Ordered']
-
-        return np.array([[product_encoded, category_encoded, region_encoded, units_sold_trans, user['Units Ordered'],
-                          demand_forecast_trans, user['Price'], user['Discount'], weather_encoded,
-                          user['Holiday/Promotion'], user['Competitor Pricing'], season_encoded,
-                          user['year'], user['month'], user['day'],
-                          weekend, m1, m2, weekday,
-                          price_discount, sold_ordered_interaction]])
+def generate_demand_forecast_data(product_id='all', days=DEFAULT_HORIZON):
+    """Demand forecast from the sales history, scored for all products in one pass and kept precomputed"""
+    if not 1 <= days <= MAX_FORECAST_DAYS:
+        raise ValueError(f"days must be between 1 and {MAX_FORECAST_DAYS}")
+    return forecast_store.forecast(product_id, days)
+
+def generate_price_optimization_data(product_id='all', params=None):
+    """Demand-forest price sweep: revenue curve over a dense price (x discount) grid"""
+    return optimize_price(registry.get('demand'), product_id, params)
+
+def generate_restock_suggestions(limit=DEFAULT_LIMIT, quantile=None):
+    """Top restock suggestions over the whole catalog, with demand batch-scored by the demand forest"""
+    if quantile is not None and not 0 <= quantile <= 1:
+        raise ValueError("quantile must be between 0 and 1")
+    ingestor.refresh()
+    return plan_restock(registry.get('demand'), ingestor.products, ingestor, limit, quantile=quantile)
+
+# Prediction helpers shared by every model route (preprocessing lives in features.py)
+def resolve_model(name):
+    name = MODEL_ALIASES.get(name, name)
+    if name not in registry.specs:
+        raise KeyError(f"Unknown model '{name}'")
+    return name
+
+def format_prediction(value):
+    return round(value, 2) if isinstance(value, float) else value
+
+def preprocess_input(user, model_name='demand', model=None):
+    try:
+        return (model or registry.get(model_name)).preprocess_row(user)
     except Exception as e:
         raise ValueError(f"Preprocessing Error: {str(e)}")
 
+def preprocess_batch(payload, model_name='demand'):
+    """Build the feature matrix for many rows; returns (X, errors by row index)"""
+    model = registry.get(model_name)
+    columns, n_rows = to_columns(payload, model.fields)
+    return model.preprocess(columns, n_rows)
+
+def predict_one(model_name, user, lenient=False):
+    """One prediction; `lenient` scores labels this model doesn't know as unknown instead of rejecting them"""
+    g.setdefault('model_name', model_name)
+    if model_name in batchers and not lenient:
+        return predict_batched(model_name, user)
+    model = registry.get(model_name)
+    if lenient:
+        model = model.lenient()
+    with timed_stage('preprocess', model_name):
+        X_input = preprocess_input(user, model_name, model)
+    key = prediction_key(model, X_input)
+    prediction = response_cache.get(key)
+    if prediction is MISSING:
+        with timed_stage('predict', model_name):
+            raw = model.predict(X_input)
+            prediction = model.decode(raw)[0]
+        response_cache.set(key, prediction, ROUTE_TTLS['predict'])
+        swapper.shadow(model_name, model, X_input, raw)
+    return prediction
+
+def predict_batched(model_name, user):
+    """predict_one through the model's micro-batcher; the stage covers queueing and the shared batch"""
+    if not isinstance(user, dict):
+        raise ValueError("Preprocessing Error: Input must be a JSON object")
+    with timed_stage('microbatch', model_name):
+        try:
+            return batchers[model_name].submit(user)
+        except ValueError as e:
+            raise ValueError(f"Preprocessing Error: {str(e)}")
+
+def _valid_rows(model_name, payload):
+    """(model, X, indices of rows that passed preprocessing, errors by row index)"""
+    g.setdefault('model_name', model_name)
+    model = registry.get(model_name)
+    with timed_stage('preprocess', model_name):
+        X, errors = preprocess_batch(payload, model_name)
+    valid = np.ones(len(X), dtype=bool)
+    valid[list(errors)] = False
+    return model, X, np.flatnonzero(valid), errors
+
+def predict_batch(model_name, payload, chunk_size=BATCH_CHUNK_SIZE):
+    """Score many rows at once; failed rows get None and are reported by index"""
+    model, X, rows, errors = _valid_rows(model_name, payload)
+    results = [None] * len(X)
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        X_chunk = X[chunk]
+        with timed_stage('predict', model_name):
+            raw = model.predict(X_chunk)
+            predictions = model.decode(raw)
+        swapper.shadow(model_name, model, X_chunk, raw)
+        for i, value in zip(chunk.tolist(), predictions):
+            results[i] = format_prediction(value)
+    return results, [{'index': i, 'error': errors[i]} for i in sorted(errors)]
+
+def parse_spread(args):
+    """?quantiles=0.1,0.9 and ?std=true, or None when neither is asked for"""
+    quantiles = [float(q) for q in args.get('quantiles', '').split(',') if q.strip()]
+    if any(not 0 <= q <= 1 for q in quantiles):
+        raise ValueError("quantiles must be between 0 and 1")
+    with_std = args.get('std', '').lower() in ('1', 'true', 'yes')
+    return (quantiles, with_std) if quantiles or with_std else None
+
+def format_spread(std, values, quantiles, with_std):
+    """Response fields for the tree spread of one row (scalars) or many (lists)"""
+    spread = {'quantiles': {f'{q:g}': values[i] for i, q in enumerate(quantiles)}} if quantiles else {}
+    if with_std:
+        spread['std'] = std
+    return spread
+
+def predict_spread_one(model_name, user, quantiles=()):
+    """One regressor prediction with the std and quantiles across trees, from the same tree evaluations"""
+    g.setdefault('model_name', model_name)
+    model = registry.get(model_name)
+    with timed_stage('preprocess', model_name):
+        X_input = preprocess_input(user, model_name)
+    with timed_stage('predict', model_name):
+        mean, std, values = model.predict_spread(X_input, quantiles)
+    swapper.shadow(model_name, model, X_input, mean)
+    return float(mean[0]), round(float(std[0]), 2), [round(float(v), 2) for v in values[0]]
+
+def predict_batch_spread(model_name, payload, quantiles=(), chunk_size=BATCH_CHUNK_SIZE):
+    """predict_batch plus per-row std and quantiles across trees; returns (results, std, quantile columns, errors)"""
+    model, X, rows, errors = _valid_rows(model_name, payload)
+    results, std = [None] * len(X), [None] * len(X)
+    columns = [[None] * len(X) for _ in quantiles]
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        X_chunk = X[chunk]
+        with timed_stage('predict', model_name):
+            mean, chunk_std, values = model.predict_spread(X_chunk, quantiles)
+        swapper.shadow(model_name, model, X_chunk, mean)
+        for k, i in enumerate(chunk):
+            results[i], std[i] = round(float(mean[k]), 2), round(float(chunk_std[k]), 2)
+            for column, value in zip(columns, values[k]):
+                column[i] = round(float(value), 2)
+    return results, std, columns, [{'index': i, 'error': errors[i]} for i in sorted(errors)]
+
+def predict_demand_batch(payload, chunk_size=BATCH_CHUNK_SIZE):
+    return predict_batch('demand', payload, chunk_size)
+
 # 🔮 Demand Forecast Prediction (existing endpoint)
 @app.route('/predict/demand', methods=['POST'])
 def predict_demand():
     try:
-        user_input = request.get_json(force=True)
-        X_input = preprocess_input(user_input)
-        predicted_demand = model.predict(X_input)[0]
-        return jsonify({'predicted_demand_forecast': round(predicted_demand, 2)})
+        user_input = read_json(single=True)
+        spread = parse_spread(request.args)
+        if spread:
+            quantiles, with_std = spread
+            predicted_demand, std, values = predict_spread_one('demand', user_input, quantiles)
+            return respond(dict({'predicted_demand_forecast': round(predicted_demand, 2)},
+                                **format_spread(std, values, quantiles, with_std)))
+        predicted_demand = predict_one('demand', user_input)
+        return respond({'predicted_demand_forecast': round(predicted_demand, 2)})
     except Exception as e:
-        print(f"[ERROR - Demand]: {str(e)}")
+        app.logger.error("Demand: %s", e)
         return jsonify({'error': str(e)}), 400
 
-# 💰 Dynamic Price Estimation (existing endpoint)
+def check_known_labels(user, model_names):
+    """Reject categorical labels that none of the models knows; a label any of them knows (in any case) passes
+
+    Returns {model name: {feature: label}} for the labels a model will score as
+    unknown because only the other models know them.
+    """
+    if not isinstance(user, dict):
+        return {}
+    models = {name: registry.get(name) for name in model_names}
+    unknown = {}
+    for feature, strict in next(iter(models.values())).encoders.items():
+        value = user.get(feature)
+        missing = [name for name, model in models.items()
+                   if feature in model.encoders and model.lenient().encoders[feature].encode(value) < 0]
+        if len(missing) == sum(feature in model.encoders for model in models.values()):
+            try:
+                strict.encode(value)
+            except ValueError as e:
+                raise ValueError(f"Preprocessing Error: {str(e)}")
+        for name in missing:
+            unknown.setdefault(name, {})[feature] = value
+    return unknown
+
+# 💰 Dynamic Price Estimation (backed by the pricing forest from price.py)
 @app.route('/predict/price', methods=['POST'])
 def predict_price():
     try:
-        user_input = request.get_json(force=True)
-        X_input = preprocess_input(user_input)
-        predicted_demand = model.predict(X_input)[0]
-
-        base_price = user_input['Price']
-        dynamic_price = base_price + (0.05 * predicted_demand) - (0.01 * user_input['Units Ordered'])
-        dynamic_price = round(max(dynamic_price, 1), 2)
+        user_input = read_json(single=True)
+        # The demand and pricing forests were fitted on different vocabularies (demand knows 'Iphone 15' and
+        # 'Clothing', pricing 'iPhone 15'), so both score with case-insensitive, fallback lookups and only labels
+        # neither of them knows are rejected; a label one model had to score as unknown marks the answer degraded
+        unknown = check_known_labels(user_input, ('demand', 'pricing'))
+        predicted_demand = predict_one('demand', user_input, lenient=True)
+        dynamic_price = round(max(predict_one('pricing', user_input, lenient=True), 1), 2)
 
-        return jsonify({
+        result = {
             'predicted_demand_forecast': round(predicted_demand, 2),
             'predicted_dynamic_price': dynamic_price
-        })
+        }
+        if unknown:
+            result.update(degraded=True, unknownLabels=unknown)
+        return respond(result)
+    except Exception as e:
+        app.logger.error("Price: %s", e)
+        return jsonify({'error': str(e)}), 400
+
+def recommend_top_k(user, k=DEFAULT_TOP_K):
+    """Top-k products with scores for one profile, looked up in the precomputed table"""
+    g.setdefault('model_name', recommendations.model_name)
+    with timed_stage('predict', recommendations.model_name):
+        try:
+            return recommendations.recommend_one(user, k)
+        except ValueError as e:
+            raise ValueError(f"Preprocessing Error: {str(e)}")
+
+# 🛍️ Product Recommendation (previously served by prod_api.py); ?k= sets how many products are ranked
+@app.route('/recommend', methods=['POST'])
+def recommend():
+    try:
+        user_input = read_json(force=False, single=True)
+        ranked = recommend_top_k(user_input, request.args.get('k', DEFAULT_TOP_K, type=int))
+        return respond({'Recommended Product': ranked[0]['product'], 'recommendations': ranked})
+    except Exception as e:
+        app.logger.error("Recommend: %s", e)
+        return jsonify({'error': str(e)}), 400
+
+# 🛍️ Top-k recommendations for many profiles at once
+@app.route('/recommend/batch', methods=['POST'])
+def recommend_batch():
+    try:
+        payload = read_json()
+        g.model_name = recommendations.model_name
+        with timed_stage('predict', recommendations.model_name):
+            ranked, errors = recommendations.recommend_many(payload, request.args.get('k', DEFAULT_TOP_K, type=int))
+        return respond({'Recommended Product': [r[0]['product'] if r else None for r in ranked],
+                        'recommendations': ranked,
+                        'errors': [{'index': i, 'error': errors[i]} for i in sorted(errors)]})
+    except Exception as e:
+        app.logger.error("Recommend Batch: %s", e)
+        return jsonify({'error': str(e)}), 400
+
+# 🧠 Any registered model: demand, price/pricing, inventory, recommend/recommendation
+@app.route('/predict/<model_name>', methods=['POST'])
+def predict_model(model_name):
+    try:
+        name = resolve_model(model_name)
+    except KeyError as e:
+        return jsonify({'error': str(e.args[0])}), 404
+    try:
+        user_input = read_json(single=True)
+        spread = parse_spread(request.args)
+        if spread:
+            quantiles, with_std = spread
+            prediction, std, values = predict_spread_one(name, user_input, quantiles)
+            return respond(dict({OUTPUT_KEYS.get(name, 'prediction'): format_prediction(prediction)},
+                                **format_spread(std, values, quantiles, with_std)))
+        return respond({OUTPUT_KEYS.get(name, 'prediction'): format_prediction(predict_one(name, user_input))})
+    except Exception as e:
+        app.logger.error("Predict %s: %s", name, e)
+        return jsonify({'error': str(e)}), 400
+
+# 📦 Batch scoring for any registered model
+@app.route('/predict/<model_name>/batch', methods=['POST'])
+def predict_model_batch(model_name):
+    try:
+        name = resolve_model(model_name)
+    except KeyError as e:
+        return jsonify({'error': str(e.args[0])}), 404
+    try:
+        payload = read_json()
+        spread = parse_spread(request.args)
+        if spread:
+            quantiles, with_std = spread
+            predictions, std, columns, errors = predict_batch_spread(name, payload, quantiles)
+            return respond(dict({OUTPUT_KEYS.get(name, 'prediction'): predictions, 'errors': errors},
+                                **format_spread(std, columns, quantiles, with_std)))
+        predictions, errors = predict_batch(name, payload)
+        return respond({OUTPUT_KEYS.get(name, 'prediction'): predictions, 'errors': errors})
     except Exception as e:
-        print(f"[ERROR - Price]: {str(e)}")
+        app.logger.error("Batch %s: %s", name, e)
+        return jsonify({'error': str(e)}), 400
+
+# 🔁 Model versions: status, background reload, candidate staging with shadow scoring, promotion
+@app.route('/api/models', methods=['GET'])
+def get_models():
+    return respond(swapper.status())
+
+@app.route('/api/models/<model_name>/reload', methods=['POST'])
+def reload_model(model_name):
+    try:
+        name = resolve_model(model_name)
+    except KeyError as e:
+        return jsonify({'error': str(e.args[0])}), 404
+    swapper.reload(name)
+    return jsonify({'model': name, 'status': 'reloading'}), 202
+
+@app.route('/api/models/<model_name>/candidate', methods=['POST', 'DELETE'])
+def model_candidate(model_name):
+    try:
+        name = resolve_model(model_name)
+    except KeyError as e:
+        return jsonify({'error': str(e.args[0])}), 404
+    try:
+        if request.method == 'DELETE':
+            swapper.discard(name)
+            return respond({'model': name, 'status': 'discarded'})
+        body = read_json()
+        if not isinstance(body, dict):
+            raise ValueError("Body must be a JSON object with a 'version'")
+        candidate = swapper.stage(name, body.get('version'), body.get('shadow_fraction'))
+        return jsonify({'model': name, 'version': candidate.version, 'status': candidate.state}), 202
+    except Exception as e:
+        app.logger.error("Candidate %s: %s", name, e)
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/models/<model_name>/promote', methods=['POST'])
+def promote_model(model_name):
+    try:
+        name = resolve_model(model_name)
+    except KeyError as e:
+        return jsonify({'error': str(e.args[0])}), 404
+    try:
+        candidate = swapper.promote(name)
+        return respond({'model': name, 'version': candidate.version, 'status': 'promoted',
+                        'shadow': candidate.stats.summary()})
+    except Exception as e:
+        app.logger.error("Promote %s: %s", name, e)
         return jsonify({'error': str(e)}), 400
 
 # 📊 Dashboard Metrics (NEW)
 @app.route('/api/dashboard/metrics', methods=['GET'])
+@cached_route('dashboard')
 def get_dashboard_metrics():
     try:
-        metrics = get_mock_dashboard_data()
-        return jsonify(metrics)
+        dashboard = get_dashboard_data()
+        return respond(dashboard)
     except Exception as e:
-        print(f"[ERROR - Dashboard Metrics]: {str(e)}")
+        app.logger.error("Dashboard Metrics: %s", e)
         return jsonify({'error': str(e)}), 400
 
 # 📈 Demand Forecast Data (NEW)
 @app.route('/api/forecast/<product_id>', methods=['GET'])
+@cached_route('forecast')
 def get_demand_forecast(product_id):
     try:
-        demand_data = generate_demand_forecast_data(product_id)
-        return jsonify({'demandData': demand_data})
+        demand_data = generate_demand_forecast_data(product_id, request.args.get('days', DEFAULT_HORIZON, type=int))
+        return respond({'demandData': demand_data})
     except Exception as e:
-        print(f"[ERROR - Demand Forecast]: {str(e)}")
+        app.logger.error("Demand Forecast: %s", e)
         return jsonify({'error': str(e)}), 400
 
 # 💰 Price Optimization Data (NEW)
 @app.route('/api/price-optimization/<product_id>', methods=['GET'])
+@cached_route('price_optimization')
 def get_price_optimization(product_id):
     try:
-        price_data = generate_price_optimization_data(product_id)
-        return jsonify({'priceData': price_data})
+        return respond(generate_price_optimization_data(product_id, request.args))
+    except KeyError as e:
+        return jsonify({'error': str(e.args[0])}), 404
+    except Exception as e:
+        app.logger.error("Price Optimization: %s", e)
+        return jsonify({'error': str(e)}), 400
+
+# 🧪 What-if scenarios: a grid of demand inputs (region, weather, event, discount, date...) scored in one pass
+@app.route('/api/scenario', methods=['POST'])
+def post_scenario():
+    try:
+        spec = read_json()
+        g.model_name = 'demand'
+        ingestor.refresh()
+        with timed_stage('predict', 'demand'):
+            result = run_scenario(registry.get('demand'), spec, ingestor.event_index, ingestor.products)
+        return respond(result)
     except Exception as e:
-        print(f"[ERROR - Price Optimization]: {str(e)}")
+        app.logger.error("Scenario: %s", e)
         return jsonify({'error': str(e)}), 400
 
 # 📦 Restock Suggestions (NEW)
 @app.route('/api/restock', methods=['GET'])
+@cached_route('restock')
 def get_restock_suggestions():
     try:
-        suggestions = generate_restock_suggestions()
-        return jsonify(suggestions)
+        suggestions = generate_restock_suggestions(request.args.get('limit', DEFAULT_LIMIT, type=int),
+                                                   request.args.get('quantile', type=float))
+        return respond(suggestions)
     except Exception as e:
-        print(f"[ERROR - Restock Suggestions]: {str(e)}")
+        app.logger.error("Restock Suggestions: %s", e)
         return jsonify({'error': str(e)}), 400
 
 # 📅 Events Data (NEW)
@@ -209,15 +570,25 @@ def get_events():
             {'id': 2, 'name': 'Back to School', 'date': '2025-08-01', 'type': 'seasonal'},
             {'id': 3, 'name': 'Flash Sale', 'date': '2025-07-20', 'type': 'flash_sale'}
         ]
-        return jsonify(events)
+        return respond(events)
     except Exception as e:
-        print(f"[ERROR - Events]: {str(e)}")
+        app.logger.error("Events: %s", e)
         return jsonify({'error': str(e)}), 400
 
+# 📏 Prometheus metrics (merged across workers when WALMART_METRICS_DIR is set)
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# 🗄️ Cache statistics
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    return respond(response_cache.stats())
+
 # ✅ Health check
 @app.route('/', methods=['GET'])
 def index():
-    return '✅ Walmart Demand Forecast & Pricing API is running.'
+    return '✅ Walmart Demand Forecast, Pricing & Recommendation API is running.'
 
 # Run Flask app
 if __name__ == '__main__':
@@ -1,11 +1,12 @@
-import numpy as np
 import pandas as pd
 import joblib
 import os
-from datetime import datetime
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.preprocessing import LabelEncoder
 
+from encoders import compile_encoders
+from features import ENCODER_KEYS, build_feature_row, check_parity
+
 # Step 1: Create dataset
 data = pd.DataFrame({
     'Products': ['Iphone 15', 'Umbrella', 'Coca Cola', 'Parle G', 'Vanilla Ice Cream'],
@@ -33,34 +34,17 @@ le_region = LabelEncoder().fit(data['Region'])
 le_weather = LabelEncoder().fit(data['Weather Condition'])
 le_season = LabelEncoder().fit(data['Seasonality'])
 
-# Step 3: Feature engineering
-def preprocess_row(row):
-    product_encoded = le_product.transform([row['Products']])[0]
-    category_encoded = le_category.transform([row['Category']])[0]
-    region_encoded = le_region.transform([row['Region']])[0]
-    weather_encoded = le_weather.transform([row['Weather Condition']])[0]
-    season_encoded = le_season.transform([row['Seasonality']])[0]
-    units_sold_transformed = np.log1p(row['Units Sold'])
-    demand_forecast_transformed = np.log1p(row['Demand Forecast'])  # For consistency
-    date_obj = datetime(row['year'], row['month'], row['day'])
-    weekday = date_obj.weekday()
-    weekend = 1 if weekday > 4 else 0
-    m1 = np.sin(row['month'] * (2 * np.pi / 12))
-    m2 = np.cos(row['month'] * (2 * np.pi / 12))
-    price_discount = row['Price'] * row['Discount']
-    sold_ordered_interaction = units_sold_transformed * row['Units Ordered']
-
-    return [
-        product_encoded, category_encoded, region_encoded, units_sold_transformed, row['Units Ordered'],
-        demand_forecast_transformed, row['Price'], row['Discount'], weather_encoded,
-        row['Holiday/Promotion'], row['Competitor Pricing'], season_encoded,
-        row['year'], row['month'], row['day'],
-        weekend, m1, m2, weekday,
-        price_discount, sold_ordered_interaction
-    ]
+# Step 3: Feature engineering (shared with the API, see features.py)
+encoders = compile_encoders({
+    'label_encoder_products': le_product,
+    'label_encoder_category': le_category,
+    'label_encoder_region': le_region,
+    'label_encoder_weather': le_weather,
+    'label_encoder_seasonality': le_season
+}, ENCODER_KEYS)
 
-# Step 4: Create features and new target (Demand Forecast)
-X = np.array([preprocess_row(row) for _, row in data.iterrows()])
+# Step 4: Create feature matrix and target (columnar path, checked against the serving path)
+X = check_parity(data, encoders)
 y = data['Demand Forecast']  # 🔥 Target changed to demand
 
 # Step 5: Train model
@@ -89,11 +73,7 @@ print(f"✅ Model and encoders saved to: {output_path}")
 # Step 7: Load and test
 bundle = joblib.load(output_path)
 model = bundle['model']
-le_product = bundle['label_encoder_products']
-le_category = bundle['label_encoder_category']
-le_region = bundle['label_encoder_region']
-le_weather = bundle['label_encoder_weather']
-le_season = bundle['label_encoder_seasonality']
+encoders = compile_encoders(bundle, ENCODER_KEYS)
 
 # Test input
 test_input = {
@@ -116,27 +96,7 @@ test_input = {
 
 # Preprocess input
 def preprocess_input(user):
-    units_sold_trans = np.log1p(user['Units Sold'])
-    demand_forecast_trans = np.log1p(user['Demand Forecast'])
-    product_encoded = le_product.transform([user['Products']])[0]
-    category_encoded = le_category.transform([user['Category']])[0]
-    region_encoded = le_region.transform([user['Region']])[0]
-    weather_encoded = le_weather.transform([user['Weather Condition']])[0]
-    season_encoded = le_season.transform([user['Seasonality']])[0]
-    date_obj = datetime(user['year'], user['month'], user['day'])
-    weekday = date_obj.weekday()
-    weekend = 1 if weekday > 4 else 0
-    m1 = np.sin(user['month'] * (2 * np.pi / 12))
-    m2 = np.cos(user['month'] * (2 * np.pi / 12))
-    price_discount = user['Price'] * user['Discount']
-    sold_ordered_interaction = units_sold_trans * user['Units Ordered']
-
-    return np.array([[product_encoded, category_encoded, region_encoded, units_sold_trans, user['Units Ordered'],
-                      demand_forecast_trans, user['Price'], user['Discount'], weather_encoded,
-                      user['Holiday/Promotion'], user['Competitor Pricing'], season_encoded,
-                      user['year'], user['month'], user['day'],
-                      weekend, m1, m2, weekday,
-                      price_discount, sold_ordered_interaction]])
+    return build_feature_row(user, encoders)
 
 # Predict
 X_test = preprocess_input(test_input)
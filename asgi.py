@@ -0,0 +1,268 @@
+"""Async serving entry point: HTTP I/O on an asyncio event loop, Flask routes in a process pool
+
+`app` is a plain ASGI application. Each request body is read on the event loop,
+then the whole WSGI call into api.app (preprocessing + prediction included)
+runs in a pool of pre-warmed worker processes that each load the model bundles
+once, so CPU-bound inference scales across cores instead of serializing on the
+GIL. Route contracts are those of api.py unchanged.
+
+Serve it with any ASGI server:
+    uvicorn asgi:app --port 5000
+or with the small built-in HTTP/1.1 server (no extra dependencies):
+    python asgi.py --port 5000 --workers 8
+"""
+import argparse
+import asyncio
+import http
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Worker processes in the pool (default: one per core)
+WORKERS = int(os.environ.get('WALMART_WORKERS', 0)) or os.cpu_count()
+# Largest request body accepted, in bytes
+MAX_BODY_SIZE = int(os.environ.get('WALMART_MAX_BODY_SIZE', 64 * 1024 * 1024))
+# Seconds the pool may take until every worker has loaded the bundles
+STARTUP_TIMEOUT = float(os.environ.get('WALMART_STARTUP_TIMEOUT', 300))
+
+_wsgi_app = None
+_ready = None
+
+
+def _init_worker(ready):
+    """Runs once per pool process: import the Flask app and load + warm every bundle"""
+    global _wsgi_app, _ready
+    from api import app, registry
+
+    registry.preload()
+    _wsgi_app = app
+    _ready = ready
+
+
+def _warm():
+    # Every worker blocks here until all of them are initialized, so each warm-up call holds a distinct process
+    _ready.wait(STARTUP_TIMEOUT)
+    return os.getpid()
+
+
+def call_wsgi(method, path, query_string, headers, body, scheme='http', server=None, client=None):
+    """One WSGI call into api.app inside a pool worker; returns (status code, headers, body)"""
+    from werkzeug.datastructures import Headers
+    from werkzeug.test import EnvironBuilder, run_wsgi_app
+
+    builder = EnvironBuilder(path=path, method=method, headers=Headers(headers), data=body,
+                             query_string=query_string, base_url=f"{scheme}://{server or 'localhost'}")
+    try:
+        environ = builder.get_environ()
+    finally:
+        builder.close()
+    if client:
+        environ['REMOTE_ADDR'] = client
+    app_iter, status, response_headers = run_wsgi_app(_wsgi_app, environ, buffered=True)
+    try:
+        payload = b''.join(app_iter)
+    finally:
+        if hasattr(app_iter, 'close'):
+            app_iter.close()
+    return int(status.split(' ', 1)[0]), list(response_headers.items()), payload
+
+
+class PoolApp:
+    """ASGI application that forwards every HTTP request to api.app in a process pool"""
+
+    def __init__(self, workers=WORKERS, max_body_size=MAX_BODY_SIZE):
+        self.workers = workers
+        self.max_body_size = max_body_size
+        self.pool = None
+        self._lock = threading.Lock()  # one pool is created at a time, however many requests ask for it
+
+    def start(self):
+        """Create the pool and wait until every worker has loaded the bundles; returns the pool"""
+        with self._lock:
+            if self.pool is not None:
+                return self.pool
+            # Workers publish /metrics snapshots to a shared directory so a scrape sees all of them
+            os.environ.setdefault('WALMART_METRICS_DIR', tempfile.mkdtemp(prefix='walmart-metrics-'))
+            context = multiprocessing.get_context('spawn')
+            pool = ProcessPoolExecutor(self.workers, mp_context=context, initializer=_init_worker,
+                                       initargs=(context.Barrier(self.workers),))
+            try:
+                futures = [pool.submit(_warm) for _ in range(self.workers)]
+                for future in futures:
+                    future.result(timeout=STARTUP_TIMEOUT)
+            except BaseException:
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+            self.pool = pool
+            return pool
+
+    def discard(self, pool):
+        """Shut down a broken pool; the next request starts a fresh one"""
+        with self._lock:
+            if self.pool is pool:
+                self.pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def stop(self):
+        with self._lock:
+            pool, self.pool = self.pool, None
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await asyncio.get_running_loop().run_in_executor(None, self.start)
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.stop()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        chunks, size, more_body = [], 0, True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            chunks.append(message.get('body', b''))
+            size += len(chunks[-1])
+            more_body = message.get('more_body', False)
+            if size > self.max_body_size:
+                await _send_error(send, 413, 'Request body too large')
+                return
+
+        pool = self.pool or await asyncio.get_running_loop().run_in_executor(None, self.start)
+        headers = [(key.decode('latin-1'), value.decode('latin-1')) for key, value in scope['headers']]
+        server = scope.get('server')
+        client = scope.get('client')
+        try:
+            status, response_headers, body = await asyncio.get_running_loop().run_in_executor(
+                pool, call_wsgi, scope['method'], scope['path'], scope['query_string'].decode('latin-1'),
+                headers, b''.join(chunks), scope.get('scheme', 'http'),
+                f'{server[0]}:{server[1]}' if server else None, client[0] if client else None)
+        except BrokenProcessPool as e:
+            print(f"[ERROR - ASGI]: {str(e)}")
+            self.discard(pool)  # a worker died
+            await _send_error(send, 503, 'Worker pool restarting')
+            return
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(key.lower().encode('latin-1'), value.encode('latin-1'))
+                                for key, value in response_headers]})
+        await send({'type': 'http.response.body', 'body': body})
+
+
+async def _send_error(send, status, message):
+    body = ('{"error": "%s"}' % message).encode()
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+app = PoolApp()
+
+
+# Minimal HTTP/1.1 server for the ASGI app: keep-alive, Content-Length bodies (no chunked uploads)
+async def _handle_connection(asgi_app, reader, writer):
+    server = writer.get_extra_info('sockname')[:2]
+    client = writer.get_extra_info('peername')
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line.strip():
+                return
+            method, target, version = request_line.decode('latin-1').split()
+            headers = []
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers.append((name.strip().lower().encode('latin-1'), value.strip().encode('latin-1')))
+            fields = {name: value for name, value in headers}
+            length = int(fields.get(b'content-length', b'0'))
+            if length < 0:
+                return
+            if length > asgi_app.max_body_size:
+                # Answer before reading: the body is never buffered, and the connection can't be reused
+                message = b'{"error": "Request body too large"}'
+                writer.write(b'HTTP/1.1 413 Request Entity Too Large\r\nContent-Type: application/json\r\n'
+                             b'Content-Length: %d\r\nConnection: close\r\n\r\n%s' % (len(message), message))
+                await writer.drain()
+                return
+            body = await reader.readexactly(length)
+            keep_alive = (fields.get(b'connection', b'').lower() != b'close'
+                          and (version == 'HTTP/1.1' or fields.get(b'connection', b'').lower() == b'keep-alive'))
+
+            path, _, query = target.partition('?')
+            scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': version.split('/')[1],
+                     'method': method, 'scheme': 'http', 'path': path, 'raw_path': path.encode('latin-1'),
+                     'query_string': query.encode('latin-1'), 'root_path': '', 'headers': headers,
+                     'server': server, 'client': client}
+            received = [{'type': 'http.request', 'body': body, 'more_body': False}]
+            response = {}
+
+            async def receive():
+                return received.pop() if received else {'type': 'http.disconnect'}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    response['status'] = message['status']
+                    response['headers'] = message.get('headers', [])
+                    response['body'] = []
+                else:
+                    response['body'].append(message.get('body', b''))
+
+            await asgi_app(scope, receive, send)
+            payload = b''.join(response['body'])
+            status = http.HTTPStatus(response['status'])
+            head = [f'HTTP/1.1 {status.value} {status.phrase}']
+            head += [f"{key.decode('latin-1')}: {value.decode('latin-1')}" for key, value in response['headers']
+                     if key.lower() not in (b'content-length', b'connection')]
+            head += [f'Content-Length: {len(payload)}', f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+            writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + payload)
+            await writer.drain()
+            if not keep_alive:
+                return
+    except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(asgi_app, host='127.0.0.1', port=5000):
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, asgi_app.start)
+    server = await asyncio.start_server(lambda r, w: _handle_connection(asgi_app, r, w), host, port)
+    print(f"Serving on http://{host}:{port} with {asgi_app.workers} worker processes", flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        asgi_app.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(PoolApp(args.workers), args.host, args.port))
+    except KeyboardInterrupt:
+        pass
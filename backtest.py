@@ -0,0 +1,335 @@
+"""Rolling-origin backtest of the demand forest over the sales history: accuracy and cost per time fold
+
+The sales log (data/sales.csv, read from its columnar store table, see
+store.py, which is converted again only when the log changed) is summed to
+units per product and day and
+joined with the catalog (products.csv: name, category, price) and the event
+impacts (events.csv). Every product-day becomes one row of the demand
+features, built once: its Units Sold / Demand Forecast inputs are the
+product's average daily units over the --window days that end --horizon
+days before that row's day, so a row's inputs never use sales from its own
+forecast horizon. Weather and event are taken as known for the day.
+
+The last --folds horizons are the test windows, each forecast from its own
+origin. For every fold, a process pool worker:
+- trains a fresh forest on the rows before the origin (all of them, or the
+  last --train-days), unless --no-retrain, and
+- scores the served bundle and any --versions (Model/versions/, see
+  train.py) on the fold's test rows.
+
+The feature matrices, targets and days are placed in shared memory once and
+every worker maps them instead of receiving a copy. Per fold and model, the
+report has MAE, RMSE, WAPE and bias, plus training time and predict
+throughput, so a new bundle version can be compared with the served one on
+accuracy and speed before it is promoted.
+
+    python backtest.py --folds 4 --horizon 7
+    python backtest.py --versions 20250801T101500000000Z --no-retrain --report backtest.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from features import CodedColumn, build_features
+from forecast import SEASONS, fallback_encoders, sales_inputs
+from ingest import DATA_DIR, load_events
+from registry import registry
+from store import EPOCH, SALES_COLUMNS, STORE_DIR, open_converted
+
+MODEL = 'demand'
+FOLDS = 4
+# Days forecast from each origin, and the trailing days averaged into a row's sales inputs
+HORIZON_DAYS = 7
+WINDOW_DAYS = 28
+# Model label of the forest trained on each fold
+RETRAINED = 'retrained'
+SERVED = 'served'
+
+
+# History
+
+def read_daily_sales(path, store_dir=STORE_DIR):
+    """Units per (product, day) from the sales log, with the day's last weather, event and region"""
+    table = open_converted('sales', path, SALES_COLUMNS, store_dir)
+    sales = pd.DataFrame({
+        'productId': table.decode('productId'),
+        'day': table['date'].astype(np.int64),
+        'units': table['quantity'],
+        'weather': table.decode('weather'),
+        'event': table.decode('event'),
+        'region': table.decode('region'),
+    })
+    sales = sales[sales['productId'] != '']
+    daily = sales.groupby(['productId', 'day'], sort=True).agg(
+        units=('units', 'sum'), weather=('weather', 'last'), event=('event', 'last'), region=('region', 'last'))
+    return daily.reset_index()
+
+
+def lagged_mean_units(product_codes, days, units, horizon, window):
+    """Each row's product average daily units over the `window` days ending `horizon` days before its day
+
+    Rows must be sorted by (product, day). Windows are found by binary search
+    on a (product, day) key over cumulative sums, so this is O(n log n).
+    """
+    span = int(days.max() - days.min()) + horizon + window + 1
+    key = product_codes.astype(np.int64) * span + (days - days.min() + horizon + window)
+    cumulative = np.concatenate([[0.0], np.cumsum(units)])
+    end = np.searchsorted(key, key - horizon, side='right')
+    start = np.searchsorted(key, key - horizon - window, side='right')
+    return (cumulative[end] - cumulative[start]) / window
+
+
+def history_inputs(daily, products, events, horizon=HORIZON_DAYS, window=WINDOW_DAYS):
+    """Demand-model input columns for every product-day, joined with the catalog and event impacts"""
+    catalog = products.drop_duplicates('id').set_index('id')
+    joined = catalog.reindex(daily['productId'])
+    names = np.where(joined['name'].isna(), daily['productId'], joined['name']).astype(object)
+    impact = daily['event'].map(dict(zip(events['name'], events['impact']))).fillna(0.0).to_numpy(dtype=np.float64)
+    product_codes, _ = pd.factorize(daily['productId'])
+    days = daily['day'].to_numpy(dtype=np.int64)
+    mean_daily = lagged_mean_units(product_codes, days, daily['units'].to_numpy(dtype=np.float64), horizon, window)
+    price = pd.to_numeric(joined['price'], errors='coerce').fillna(0.0).to_numpy(dtype=np.float64)
+    calendar = pd.DatetimeIndex(EPOCH + days)
+
+    def coded(values):
+        codes, labels = pd.factorize(pd.Series(values, dtype=object))
+        return CodedColumn(codes, list(labels))
+
+    columns = sales_inputs(mean_daily, impact)
+    columns.update({
+        'Products': coded(names),
+        'Category': coded(joined['category'].fillna('').to_numpy(dtype=object)),
+        'Region': coded(daily['region'].to_numpy(dtype=object)),
+        'Weather Condition': coded(daily['weather'].str.capitalize().to_numpy(dtype=object)),
+        'Seasonality': CodedColumn(calendar.month.to_numpy(), SEASONS),
+        'Price': price,
+        'Competitor Pricing': price,
+        'Discount': np.zeros(len(daily)),
+        'year': calendar.year.to_numpy(dtype=np.float64),
+        'month': calendar.month.to_numpy(dtype=np.float64),
+        'day': calendar.day.to_numpy(dtype=np.float64),
+    })
+    return columns
+
+
+def fold_origins(days, folds=FOLDS, horizon=HORIZON_DAYS):
+    """First test day of each fold: the last `folds` horizons of the history, oldest first"""
+    last = int(days.max())
+    return [last - horizon * k + 1 for k in range(folds, 0, -1)]
+
+
+# Shared memory
+
+def share(array):
+    """Copy an array into a new shared memory block; returns (block, descriptor a worker can attach by)"""
+    array = np.ascontiguousarray(array)
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+    return block, {'name': block.name, 'shape': array.shape, 'dtype': array.dtype.str}
+
+
+def attach(descriptor):
+    """(block, array view) of a shared array; the block must stay referenced while the view is used"""
+    block = shared_memory.SharedMemory(name=descriptor['name'])
+    return block, np.ndarray(descriptor['shape'], dtype=np.dtype(descriptor['dtype']), buffer=block.buf)
+
+
+# Folds
+
+def error_metrics(predicted, actual):
+    error = predicted - actual
+    total = float(np.abs(actual).sum())
+    return {
+        'mae': round(float(np.abs(error).mean()), 4),
+        'rmse': round(float(np.sqrt((error ** 2).mean())), 4),
+        'wape': round(float(np.abs(error).sum()) / total, 4) if total else None,
+        'bias': round(float(error.mean()), 4),
+    }
+
+
+def _score(model_name, forest, X, y):
+    start = time.perf_counter()
+    predicted = forest.predict(X)
+    seconds = time.perf_counter() - start
+    return dict(model=model_name, predict_seconds=round(seconds, 4),
+                rows_per_second=round(len(X) / seconds) if seconds else None, **error_metrics(predicted, y))
+
+
+def run_fold(task):
+    """Worker: train on the rows before the fold's origin, then score every model on its test rows"""
+    from forest import compile_forest
+    from train import new_forest
+
+    blocks, arrays = [], {}
+    try:
+        for key, descriptor in task['arrays'].items():
+            block, arrays[key] = attach(descriptor)
+            blocks.append(block)
+        days, y = arrays['days'], arrays['y']
+        origin, horizon = task['origin'], task['horizon']
+        train_rows = days < origin
+        if task['train_days']:
+            train_rows &= days >= origin - task['train_days']
+        test_rows = (days >= origin) & (days < origin + horizon)
+        fold = {'fold': task['fold'], 'origin': str(EPOCH + origin), 'train_rows': int(train_rows.sum()),
+                'test_rows': int(test_rows.sum()), 'models': []}
+        if not test_rows.any():
+            return fold
+
+        if task['n_estimators'] and train_rows.any():
+            X = arrays[task['retrain_features']]
+            model = new_forest(task['n_estimators']).set_params(n_jobs=1)
+            start = time.perf_counter()
+            model.fit(X[train_rows], y[train_rows])
+            train_seconds = time.perf_counter() - start
+            fold['models'].append(dict(_score(RETRAINED, compile_forest(model), X[test_rows], y[test_rows]),
+                                       train_seconds=round(train_seconds, 4)))
+        for label, path, features in task['models']:
+            loaded = registry.load(task['model'], path)
+            fold['models'].append(_score(label, loaded.forest, arrays[features][test_rows], y[test_rows]))
+        return fold
+    finally:
+        arrays.clear()
+        for block in blocks:
+            block.close()
+
+
+def summarize(folds):
+    """Per model: errors over every test row of every fold (rows-weighted) and total predict throughput"""
+    totals = {}
+    for fold in folds:
+        for result in fold['models']:
+            total = totals.setdefault(result['model'], {'rows': 0, 'actual': 0.0, 'abs': 0.0, 'sq': 0.0, 'err': 0.0,
+                                                        'seconds': 0.0, 'train_seconds': 0.0, 'folds': 0})
+            n = fold['test_rows']
+            total['rows'] += n
+            total['actual'] += fold['actual_units']
+            total['abs'] += result['mae'] * n
+            total['sq'] += result['rmse'] ** 2 * n
+            total['err'] += result['bias'] * n
+            total['seconds'] += result['predict_seconds']
+            total['train_seconds'] += result.get('train_seconds', 0.0)
+            total['folds'] += 1
+    summary = []
+    for name, total in totals.items():
+        rows = max(total['rows'], 1)
+        summary.append({
+            'model': name, 'folds': total['folds'], 'rows': total['rows'],
+            'mae': round(total['abs'] / rows, 4), 'rmse': round((total['sq'] / rows) ** 0.5, 4),
+            'wape': round(total['abs'] / total['actual'], 4) if total['actual'] else None, 'bias': round(total['err'] / rows, 4),
+            'rows_per_second': round(total['rows'] / total['seconds']) if total['seconds'] else None,
+            'train_seconds': round(total['train_seconds'], 3) if name == RETRAINED else None,
+        })
+    return summary
+
+
+def backtest(data_dir=DATA_DIR, versions=(), folds=FOLDS, horizon=HORIZON_DAYS, window=WINDOW_DAYS,
+             train_days=None, n_estimators=None, workers=None):
+    """Run every fold in a process pool; returns {'folds': [...], 'summary': [...]}"""
+    from train import N_ESTIMATORS
+
+    n_estimators = N_ESTIMATORS if n_estimators is None else n_estimators
+    daily = read_daily_sales(os.path.join(data_dir, 'sales.csv'))
+    if daily.empty:
+        raise ValueError("No usable rows in the sales history")
+    products = pd.read_csv(os.path.join(data_dir, 'products.csv'), dtype={'id': str})
+    columns = history_inputs(daily, products, load_events(os.path.join(data_dir, 'events.csv')), horizon, window)
+
+    # Models to score: the served bundle and the requested versions (loading compiles them once, here)
+    models = [(SERVED, None, registry.load(MODEL))]
+    for version in versions:
+        path = registry.version_path(MODEL, version)
+        if not os.path.exists(path):
+            raise ValueError(f"No bundle version '{version}'; available: {registry.versions(MODEL)}")
+        models.append((version, path, registry.load(MODEL, path)))
+
+    # One feature matrix per distinct encoder vocabulary; retraining uses the served bundle's
+    blocks, arrays, features_of, vocabularies = [], {}, [], []
+    try:
+        for label, path, model in models:
+            vocabulary = {name: list(lookup.classes) for name, lookup in model.encoders.items()}
+            if vocabulary not in vocabularies:
+                X, _ = build_features(columns, fallback_encoders(model), len(daily))
+                block, arrays[f'X{len(vocabularies)}'] = share(X.astype(np.float32))
+                blocks.append(block)
+                vocabularies.append(vocabulary)
+            features_of.append((label, path, f'X{vocabularies.index(vocabulary)}'))
+        for key, values in (('y', daily['units'].to_numpy(dtype=np.float64)),
+                            ('days', daily['day'].to_numpy(dtype=np.int64))):
+            block, arrays[key] = share(values)
+            blocks.append(block)
+
+        days = daily['day'].to_numpy(dtype=np.int64)
+        tasks = [{'fold': i, 'origin': origin, 'horizon': horizon, 'train_days': train_days,
+                  'n_estimators': n_estimators, 'retrain_features': 'X0', 'model': MODEL,
+                  'models': features_of, 'arrays': arrays}
+                 for i, origin in enumerate(fold_origins(days, folds, horizon))]
+        with ProcessPoolExecutor(max_workers=workers or min(len(tasks), os.cpu_count() or 1)) as pool:
+            results = list(pool.map(run_fold, tasks))
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    units = daily['units'].to_numpy(dtype=np.float64)
+    for fold, task in zip(results, tasks):
+        fold['actual_units'] = float(units[(days >= task['origin']) & (days < task['origin'] + horizon)].sum())
+    return {'rows': len(daily), 'products': int(daily['productId'].nunique()), 'first_day': str(EPOCH + days.min()),
+            'last_day': str(EPOCH + days.max()), 'folds': results, 'summary': summarize(results)}
+
+
+def print_report(report):
+    print(f"📈 {report['rows']} product-days of {report['products']} products, "
+          f"{report['first_day']} .. {report['last_day']}")
+    for fold in report['folds']:
+        print(f"  fold {fold['fold']} from {fold['origin']}: {fold['train_rows']} train rows, "
+              f"{fold['test_rows']} test rows")
+        for result in fold['models']:
+            train = f"  trained in {result['train_seconds']:.2f} s" if 'train_seconds' in result else ''
+            print(f"    {result['model']:<28} MAE {result['mae']:10.3f}  RMSE {result['rmse']:10.3f}  "
+                  f"WAPE {result['wape']}  bias {result['bias']:+.3f}  {result['rows_per_second']} rows/s{train}")
+    print("  all folds:")
+    for result in report['summary']:
+        print(f"    {result['model']:<28} MAE {result['mae']:10.3f}  RMSE {result['rmse']:10.3f}  "
+              f"WAPE {result['wape']}  bias {result['bias']:+.3f}  {result['rows_per_second']} rows/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--data-dir', default=DATA_DIR, help='directory with sales.csv, products.csv and events.csv')
+    parser.add_argument('--versions', nargs='*', default=[], help='bundle versions to score next to the served one')
+    parser.add_argument('--folds', type=int, default=FOLDS)
+    parser.add_argument('--horizon', type=int, default=HORIZON_DAYS, help='days forecast from each fold origin')
+    parser.add_argument('--window', type=int, default=WINDOW_DAYS, help='trailing days averaged into sales inputs')
+    parser.add_argument('--train-days', type=int, help='train on this many days before each origin (default: all)')
+    parser.add_argument('--n-estimators', type=int, help='trees per retrained forest')
+    parser.add_argument('--no-retrain', action='store_true', help='only score the bundles')
+    parser.add_argument('--workers', type=int, help='worker processes (default: one per fold, up to the CPU count)')
+    parser.add_argument('--report', help='write the report as JSON to this file')
+    args = parser.parse_args()
+
+    import warnings
+    warnings.filterwarnings('ignore')  # bundles were pickled with an older sklearn
+    if args.folds < 1 or args.horizon < 1 or args.window < 1:
+        parser.error('--folds, --horizon and --window must be positive')
+    try:
+        report = backtest(args.data_dir, args.versions, args.folds, args.horizon, args.window, args.train_days,
+                          0 if args.no_retrain else args.n_estimators, args.workers)
+    except Exception as e:
+        print(f"[ERROR - Backtest]: {str(e)}")
+        sys.exit(1)
+    print_report(report)
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
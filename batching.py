@@ -0,0 +1,133 @@
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+from cache import MISSING, ROUTE_TTLS, prediction_key
+from features import to_columns
+from metrics import metrics
+
+# Opt-in: coalesce concurrent single-row predictions into batches (WALMART_MICROBATCH=1)
+MICROBATCH_ENABLED = os.environ.get('WALMART_MICROBATCH') == '1'
+# Most rows scored together, and longest a row waits for others to join its batch
+MAX_BATCH = int(os.environ.get('WALMART_MICROBATCH_MAX_BATCH', 64))
+MAX_WAIT = float(os.environ.get('WALMART_MICROBATCH_MAX_WAIT_MS', 2)) / 1000
+
+
+class _Pending:
+    __slots__ = ('record', 'done', 'value', 'error')
+
+    def __init__(self, record):
+        self.record = record
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class MicroBatcher:
+    """Queues single-row predictions for one model and scores them in batches on a worker thread
+
+    A batch closes when it holds `max_batch` rows or `max_wait` seconds after
+    its first row arrived, then runs one columnar preprocess and one predict;
+    each caller gets its own row's result (or error) back. If `in_flight`
+    is given (a callable returning how many requests are being served), a
+    batch also closes as soon as it holds that many rows, so a lone request
+    is not held back waiting for company. Predictions go through the same
+    response cache as unbatched ones, and scored rows are offered to the
+    `swapper`'s candidate for shadow scoring (see hotswap.py).
+    """
+
+    def __init__(self, registry, model_name, max_batch=MAX_BATCH, max_wait=MAX_WAIT, cache=None, in_flight=None,
+                 swapper=None):
+        self.registry = registry
+        self.model_name = model_name
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.cache = cache
+        self.in_flight = in_flight
+        self.swapper = swapper
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._worker_pid = None
+
+    def submit(self, record):
+        """Block until this row's batch is scored; returns the decoded prediction or raises ValueError"""
+        self._ensure_worker()
+        pending = _Pending(record)
+        self._queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise ValueError(pending.error)
+        return pending.value
+
+    def _ensure_worker(self):
+        # Threads don't survive fork, so pre-forked workers each start their own on first use
+        if self._worker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker_pid != os.getpid():
+                self._queue = queue.SimpleQueue()
+                threading.Thread(target=self._run, args=(self._queue,), daemon=True,
+                                 name=f'microbatch-{self.model_name}').start()
+                self._worker_pid = os.getpid()
+
+    def _run(self, pending_rows):
+        while True:
+            batch = [pending_rows.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                if self.in_flight is not None and len(batch) >= self.in_flight() and pending_rows.empty():
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(pending_rows.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._score(batch)
+
+    def _score(self, batch):
+        labels = (('endpoint', 'microbatch'), ('model', self.model_name))
+        try:
+            model = self.registry.get(self.model_name)
+            with metrics.timer('walmart_stage_seconds', labels + (('stage', 'preprocess'),)):
+                columns, n_rows = to_columns([pending.record for pending in batch], model.fields)
+                X, errors = model.preprocess(columns, n_rows)
+            for i, message in errors.items():
+                batch[i].error = message
+
+            keys, todo = {}, []
+            for i, pending in enumerate(batch):
+                if pending.error is not None:
+                    continue
+                if self.cache is not None:
+                    keys[i] = prediction_key(model, X[i:i + 1])
+                    cached = self.cache.get(keys[i])
+                    if cached is not MISSING:
+                        pending.value = cached
+                        continue
+                todo.append(i)
+
+            if todo:
+                X_todo = X[np.asarray(todo)]
+                with metrics.timer('walmart_stage_seconds', labels + (('stage', 'predict'),)):
+                    raw = model.predict(X_todo)
+                    values = model.decode(raw)
+                if self.swapper is not None:
+                    self.swapper.shadow(self.model_name, model, X_todo, raw)
+                for i, value in zip(todo, values):
+                    batch[i].value = value
+                    if self.cache is not None:
+                        self.cache.set(keys[i], value, ROUTE_TTLS['predict'])
+            metrics.inc('walmart_microbatches_total', labels)
+            metrics.inc('walmart_microbatch_rows_total', labels, len(batch))
+        except Exception as e:
+            for pending in batch:
+                if pending.error is None and pending.value is None:
+                    pending.error = str(e)
+        finally:
+            for pending in batch:
+                pending.done.set()
@@ -0,0 +1,100 @@
+"""Scaling of the process-pool ASGI server vs the threaded WSGI server
+
+Starts each server in its own process: Flask on werkzeug's threaded server
+(every request shares one GIL), then asgi.py with each --workers count.
+Replays the same synthetic payloads (see load_test.py) at every concurrency
+level. The response cache is off in the servers so every request runs the model.
+
+Run from the repo root:
+    python -m benchmarks.bench_asgi --workers 1 2 4 --concurrency 1 8 32
+"""
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import time
+import warnings
+
+import numpy as np
+
+from benchmarks.load_test import endpoint_payloads, run_load, summarize, wsgi_sender
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WSGI_SERVER = """
+import sys, warnings
+warnings.filterwarnings('ignore')
+from werkzeug.serving import make_server
+from api import app, registry
+from benchmarks.load_test import KeepAliveHandler
+registry.preload()
+server = make_server('127.0.0.1', int(sys.argv[1]), app, threaded=True, request_handler=KeepAliveHandler)
+print('Serving', flush=True)
+server.serve_forever()
+"""
+
+
+def start_server(command, port, timeout=120):
+    env = dict(os.environ, WALMART_CACHE='0', PYTHONWARNINGS='ignore')
+    process = subprocess.Popen(command, cwd=REPO_DIR, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/')
+            if conn.getresponse().status == 200:
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"Server {' '.join(command)} did not come up on port {port}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--workers', type=int, nargs='+', default=sorted({1, 2, os.cpu_count()}))
+    parser.add_argument('--endpoint', choices=('/predict/demand', '/predict/price', '/recommend'),
+                        default='/predict/demand')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore')  # bundles were pickled with an older sklearn
+    from registry import registry
+
+    bodies = endpoint_payloads(registry, args.endpoint, args.requests, np.random.default_rng(args.seed))
+    servers = [('wsgi threaded', [sys.executable, '-c', WSGI_SERVER, str(args.port)])]
+    servers += [(f'asgi {workers} workers',
+                 [sys.executable, 'asgi.py', '--port', str(args.port), '--workers', str(workers)])
+                for workers in args.workers]
+
+    print(f"{os.cpu_count()} CPUs, {args.endpoint}, {args.requests} requests per run")
+    results = []
+    for label, command in servers:
+        process = start_server(command, args.port)
+        try:
+            for concurrency in args.concurrency:
+                send = wsgi_sender(args.port, args.endpoint)
+                run_load(send, bodies[:min(100, len(bodies))], concurrency)  # warm-up
+                latencies, errors, wall = run_load(send, bodies, concurrency)
+                summary = dict(summarize(latencies, wall), server=label, concurrency=concurrency, errors=len(errors))
+                results.append(summary)
+                print(f"{label:<16} c={concurrency:<3} {summary['throughput_rps']:9.1f} req/s  "
+                      f"p50 {summary['p50_ms']:7.2f} ms  p99 {summary['p99_ms']:7.2f} ms"
+                      + (f"  errors {len(errors)}" if errors else ''))
+        finally:
+            process.terminate()
+            process.wait()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'cpus': os.cpu_count(), 'endpoint': args.endpoint, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Per-request category encoding cost: LabelEncoder.transform vs compiled lookup tables
+
+Run from the repo root:  python -m benchmarks.bench_encoding
+"""
+import os
+import timeit
+import warnings
+
+import joblib
+
+from encoders import compile_encoders
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Model')
+
+DEMAND_KEYS = {
+    'Products': 'label_encoder_products',
+    'Category': 'label_encoder_category',
+    'Region': 'label_encoder_region',
+    'Weather Condition': 'label_encoder_weather',
+    'Seasonality': 'label_encoder_seasonality',
+}
+RECOMMEND_KEYS = {'Job': 'le_job', 'Budget': 'le_budget', 'Interest': 'le_interest', 'Lifestyle': 'le_lifestyle'}
+
+
+def bench(bundle_name, keys, repeat=5, number=2000):
+    bundle = joblib.load(os.path.join(MODEL_DIR, bundle_name))
+    lookups = compile_encoders(bundle, keys)
+    request = {feature: str(bundle[key].classes_[0]) for feature, key in keys.items()}
+
+    def with_label_encoders():
+        return [bundle[key].transform([request[feature]])[0] for feature, key in keys.items()]
+
+    def with_lookups():
+        return [lookups[feature].encode(request[feature]) for feature in keys]
+
+    assert [int(code) for code in with_label_encoders()] == with_lookups()
+
+    results = {}
+    for label, fn in (('LabelEncoder.transform', with_label_encoders), ('compiled lookup', with_lookups)):
+        best = min(timeit.repeat(fn, repeat=repeat, number=number)) / number
+        results[label] = best
+        print(f"{bundle_name:<28} {label:<24} {best * 1e6:10.2f} µs/request ({len(keys)} encoders)")
+    print(f"{bundle_name:<28} {'speedup':<24} {results['LabelEncoder.transform'] / results['compiled lookup']:10.1f}x")
+    return results
+
+
+if __name__ == '__main__':
+    warnings.filterwarnings('ignore')  # bundles were pickled with an older sklearn
+    bench('demand_model_bundle.pkl', DEMAND_KEYS)
+    bench('recommendation_model.pkl', RECOMMEND_KEYS)
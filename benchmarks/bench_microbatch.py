@@ -0,0 +1,80 @@
+"""Throughput vs added latency of single-row micro-batching
+
+Replays synthetic single-row payloads (see load_test.py) against a local
+threaded WSGI server, first unbatched and then with a MicroBatcher per model
+at each --max-wait, for every concurrency level. Latency deltas are relative
+to the unbatched run at the same concurrency.
+
+Run from the repo root:
+    python -m benchmarks.bench_microbatch --concurrency 1 8 32 --max-wait-ms 0.5 2 5
+"""
+import argparse
+import json
+import threading
+import warnings
+
+import numpy as np
+from werkzeug.serving import make_server
+
+from benchmarks.load_test import KeepAliveHandler, endpoint_payloads, run_load, summarize, wsgi_sender
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000, help='requests per run')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--endpoint', choices=('/predict/demand', '/predict/price', '/recommend'),
+                        default='/predict/demand')
+    parser.add_argument('--max-batch', type=int, default=64)
+    parser.add_argument('--max-wait-ms', type=float, nargs='+', default=[0.5, 2, 5])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore')  # bundles were pickled with an older sklearn
+    import api
+    from batching import MicroBatcher
+
+    api.response_cache.enabled = False  # every request must reach the model
+    api.registry.preload()
+    bodies = endpoint_payloads(api.registry, args.endpoint, args.requests, np.random.default_rng(args.seed))
+
+    server = make_server('127.0.0.1', 0, api.app, threaded=True, request_handler=KeepAliveHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    modes = [None] + args.max_wait_ms
+    results, baseline = [], {}
+    for max_wait_ms in modes:
+        api.batchers.clear()
+        if max_wait_ms is not None:
+            api.batchers.update({
+                name: MicroBatcher(api.registry, name, args.max_batch, max_wait_ms / 1000, in_flight=api.in_flight)
+                for name in api.registry.specs})
+        for concurrency in args.concurrency:
+            send = wsgi_sender(server.server_port, args.endpoint)
+            run_load(send, bodies[:min(100, len(bodies))], concurrency)  # warm-up
+            latencies, errors, wall = run_load(send, bodies, concurrency)
+            summary = dict(summarize(latencies, wall), concurrency=concurrency, errors=len(errors),
+                           mode='unbatched' if max_wait_ms is None else f'batched {max_wait_ms:g} ms')
+            if max_wait_ms is None:
+                baseline[concurrency] = summary
+            else:
+                base = baseline[concurrency]
+                summary['speedup'] = summary['throughput_rps'] / base['throughput_rps']
+                summary['added_p50_ms'] = summary['p50_ms'] - base['p50_ms']
+                summary['added_p99_ms'] = summary['p99_ms'] - base['p99_ms']
+            results.append(summary)
+            print(f"{summary['mode']:<18} c={concurrency:<3} {summary['throughput_rps']:9.1f} req/s  "
+                  f"p50 {summary['p50_ms']:7.2f} ms  p99 {summary['p99_ms']:7.2f} ms"
+                  + (f"  x{summary['speedup']:.2f}  p50 {summary['added_p50_ms']:+.2f} ms"
+                     if 'speedup' in summary else '')
+                  + (f"  errors {len(errors)}" if errors else ''))
+    server.shutdown()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'endpoint': args.endpoint, 'max_batch': args.max_batch, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
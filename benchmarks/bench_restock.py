@@ -0,0 +1,93 @@
+"""Restock planner latency over a synthetic catalog
+
+Writes a catalog of --skus products (and a sales log covering a share of them)
+to a temporary data directory, converts it to the columnar store and times
+plan_restock() end to end, plus the demand-forest pass with and without
+distinct-pattern scoring.
+
+Run from the repo root:  python -m benchmarks.bench_restock --skus 500000
+"""
+import argparse
+import os
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+
+def synthetic_data(directory, n_skus, n_sales, rng):
+    base_names = np.array(['Coca Cola', 'Parle G', 'Umbrella', 'Desk Lamp', 'Yoga Mat', 'Air Fryer'])
+    categories = np.array(['Groceries', 'Electronics', 'Clothing', 'Kitchen', 'Health'])
+    ids = np.arange(1, n_skus + 1).astype(str)
+    pd.DataFrame({
+        'id': ids,
+        'name': np.char.add(base_names[rng.integers(0, len(base_names), n_skus)], np.char.add(' #', ids)),
+        'category': categories[rng.integers(0, len(categories), n_skus)],
+        'price': rng.integers(50, 5000, n_skus),
+        'stock': rng.integers(0, 500, n_skus),
+        'brand': 'Brand',
+        'tags': '',
+        'demand': rng.integers(1, 100, n_skus),
+        'image': '',
+    }).to_csv(os.path.join(directory, 'products.csv'), index=False)
+    pd.DataFrame({
+        'productId': ids[rng.integers(0, max(n_skus // 10, 1), n_sales)],
+        'quantity': rng.integers(1, 50, n_sales),
+        'date': (np.datetime64('2025-07-01') + rng.integers(0, 30, n_sales)).astype(str),
+        'weather': np.array(['rainy', 'sunny', 'cloudy'])[rng.integers(0, 3, n_sales)],
+        'event': np.array(['Monsoon Season', 'Festival Season', ''])[rng.integers(0, 3, n_sales)],
+    }).to_csv(os.path.join(directory, 'sales.csv'), index=False)
+    with open(os.path.join(directory, 'events.csv'), 'w') as f:
+        f.write('name,impact,products\nMonsoon Season,+30%,Umbrellas\nFestival Season,+45%,Sweets\n')
+
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--skus', type=int, default=500000)
+    parser.add_argument('--sales', type=int, default=1000000, help='rows in the synthetic sales log')
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore')  # bundles were pickled with an older sklearn
+    from forecast import demand_features
+    from ingest import SalesIngestor
+    from registry import registry
+    from restock import catalog_inputs, plan_restock
+
+    model = registry.get('demand')
+    with tempfile.TemporaryDirectory() as directory:
+        synthetic_data(directory, args.skus, args.sales, np.random.default_rng(0))
+        start = time.perf_counter()
+        ingestor = SalesIngestor(directory, store_dir=os.path.join(directory, 'store')).refresh()
+        print(f"ingest + convert        {time.perf_counter() - start:8.3f} s  ({args.skus} SKUs, {args.sales} sales)")
+        products = ingestor.products
+
+        day = np.array([np.datetime64('2025-08-01')])
+        features, X = best_of(lambda: demand_features(model, catalog_inputs(products, ingestor), len(products), day),
+                              args.repeat)
+        distinct, fast = best_of(lambda: model.forest.predict_distinct(X), args.repeat)
+        full, slow = best_of(lambda: model.forest.predict(X), 1)
+        assert np.array_equal(fast, slow)
+        total, suggestions = best_of(lambda: plan_restock(model, products, ingestor, args.limit, '2025-08-01'),
+                                     args.repeat)
+
+        print(f"features                {features:8.3f} s")
+        print(f"predict (every row)     {full:8.3f} s")
+        print(f"predict (distinct)      {distinct:8.3f} s")
+        print(f"plan_restock total      {total:8.3f} s  -> top {len(suggestions)} suggestions")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Worker startup time and memory: per-worker pickle loading vs the memory-mapped model registry
+
+Starts N fresh worker processes per mode, has each one load every bundle and
+serve one prediction, then measures RSS and PSS (proportional set size: shared
+pages are split between the processes that map them) while all workers are alive.
+
+Run from the repo root:  python -m benchmarks.bench_startup --workers 4
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import time
+import warnings
+
+MODES = ('pickle', 'mmap')
+BUNDLES = ('demand', 'pricing', 'inventory', 'recommendation')
+
+
+def read_memory_kb():
+    """(RSS, PSS) of the current process in kB (Linux only)"""
+    rss = pss = None
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                rss = int(line.split()[1])
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                if line.startswith('Pss:'):
+                    pss = int(line.split()[1])
+    except FileNotFoundError:
+        pass
+    return rss, pss
+
+
+def load_models(mode):
+    """Load every bundle the way a worker would and run one prediction through each"""
+    import numpy as np
+
+    if mode == 'pickle':
+        # What api.py / prod_api.py used to do at import time in every worker
+        import joblib
+        from forest import compile_forest
+        from registry import MODEL_DIR, MODEL_SPECS
+
+        forests = [compile_forest(joblib.load(os.path.join(MODEL_DIR, MODEL_SPECS[name]['file']))['model'])
+                   for name in BUNDLES]
+    else:
+        from registry import ModelRegistry
+
+        forests = [ModelRegistry().get(name).forest for name in BUNDLES]
+
+    for forest in forests:
+        forest.predict(np.zeros((1, forest.n_features)))
+    return forests
+
+
+def worker(mode, barrier, results):
+    warnings.filterwarnings('ignore')  # bundles were pickled with an older sklearn
+    start = time.perf_counter()
+    forests = load_models(mode)
+    startup = time.perf_counter() - start
+    barrier.wait()  # measure memory only once every worker holds its models
+    rss, pss = read_memory_kb()
+    results.put({'startup_s': startup, 'rss_kb': rss, 'pss_kb': pss})
+    barrier.wait()
+    del forests
+
+
+def run(mode, workers):
+    ctx = mp.get_context('spawn')  # fresh interpreters, so imports count towards startup
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(mode, barrier, results)) for _ in range(workers)]
+    for proc in procs:
+        proc.start()
+    samples = [results.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+
+    def mean(key):
+        values = [s[key] for s in samples if s[key] is not None]
+        return sum(values) / len(values) if values else None
+
+    pss = [s['pss_kb'] for s in samples if s['pss_kb'] is not None]
+    return {
+        'mode': mode,
+        'workers': workers,
+        'startup_s_mean': mean('startup_s'),
+        'startup_s_max': max(s['startup_s'] for s in samples),
+        'rss_kb_mean': mean('rss_kb'),
+        'pss_kb_mean': mean('pss_kb'),
+        'pss_kb_total': sum(pss) if pss else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    # Make sure the compiled arrays exist so the mmap mode measures a warm start
+    from registry import registry
+    registry.preload(BUNDLES)
+
+    reports = [run(mode, args.workers) for mode in args.modes]
+    for r in reports:
+        pss = f"{r['pss_kb_mean'] / 1024:8.1f} MB" if r['pss_kb_mean'] else '     n/a'
+        print(f"{r['mode']:<7} workers={r['workers']}  startup mean {r['startup_s_mean'] * 1e3:8.1f} ms "
+              f"(max {r['startup_s_max'] * 1e3:8.1f} ms)  RSS {r['rss_kb_mean'] / 1024:8.1f} MB  PSS {pss}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
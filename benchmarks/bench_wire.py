@@ -0,0 +1,98 @@
+"""Payload size and end-to-end time of batch scoring per wire format
+
+Posts the same --rows synthetic rows (see load_test.py) to /predict/demand/batch
+in-process through Flask's test client, once per format:
+
+    json rows       list of row objects, Flask's stdlib JSON provider, then orjson
+    json columns    {"columns": {field: [...]}}, stdlib JSON, then orjson
+    msgpack         columnar MessagePack, numeric columns as typed buffers
+    arrow           Arrow IPC stream, strings dictionary-encoded
+
+Times cover the whole request (decode, preprocess, predict, encode) and
+exclude building the client-side body. Formats whose library is not
+installed are skipped.
+
+Run from the repo root:  python -m benchmarks.bench_wire --rows 100000
+"""
+import argparse
+import json
+import time
+import warnings
+
+import numpy as np
+from flask.json.provider import DefaultJSONProvider
+
+from benchmarks.load_test import synthetic_payloads
+
+ENDPOINT = '/predict/demand/batch'
+
+
+def bodies(rows):
+    """{format: (content type, accept, body bytes)} for every format whose library is installed"""
+    import wire
+
+    columns = {name: [row[name] for row in rows] for name in rows[0]}
+    formats = {
+        'json rows': (wire.JSON, wire.JSON, json.dumps(rows).encode()),
+        'json columns': (wire.JSON, wire.JSON, json.dumps({'columns': columns}).encode()),
+    }
+    if wire.msgpack is not None:
+        typed = {name: values if isinstance(values[0], str) else
+                 {'dtype': '<f8', 'data': np.asarray(values, dtype='<f8').tobytes()}
+                 for name, values in columns.items()}
+        formats['msgpack'] = (wire.MSGPACK, wire.MSGPACK, wire.msgpack.packb({'columns': typed}))
+    if wire.pa is not None:
+        pa = wire.pa
+        table = pa.table({name: pa.array(values).dictionary_encode() if isinstance(values[0], str) else pa.array(values)
+                          for name, values in columns.items()})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        formats['arrow'] = (wire.ARROW, wire.ARROW, sink.getvalue().to_pybytes())
+    return formats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3, help='runs per format; the best is reported')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore')  # bundles were pickled with an older sklearn
+    import api
+    import wire
+
+    api.registry.preload()
+    rows = synthetic_payloads([api.registry.get('demand')], args.rows, np.random.default_rng(args.seed))
+    client = api.app.test_client()
+    fast_json = api.app.json
+
+    runs = []
+    for name, (content_type, accept, body) in bodies(rows).items():
+        providers = [('stdlib', DefaultJSONProvider(api.app)), ('orjson', fast_json)] if accept == wire.JSON else [('', fast_json)]
+        for provider_name, provider in providers:
+            if provider_name == 'orjson' and wire.orjson is None:
+                continue
+            api.app.json = provider
+            best, response = float('inf'), None
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                response = client.post(ENDPOINT, data=body, content_type=content_type, headers={'Accept': accept})
+                best = min(best, time.perf_counter() - start)
+            assert response.status_code == 200, response.data[:200]
+            label = f'{name} ({provider_name})' if provider_name else name
+            runs.append({'format': label, 'request_bytes': len(body), 'response_bytes': len(response.data),
+                         'seconds': best, 'seconds_per_100k_rows': best * 100000 / args.rows})
+            print(f"{label:<24} request {len(body) / 2 ** 20:8.2f} MB  response {len(response.data) / 2 ** 20:7.2f} MB  "
+                  f"{runs[-1]['seconds_per_100k_rows'] * 1000:8.1f} ms / 100k rows")
+    api.app.json = fast_json
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'rows': args.rows, 'endpoint': ENDPOINT, 'results': runs}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+"""Load test and latency benchmark for the Flask prediction APIs
+
+Replays synthetic payloads built from the category vocabularies in the model
+bundles against /predict/demand, /predict/price and /recommend, through Flask's
+test client and/or a local threaded WSGI server, at several concurrency levels.
+Reports throughput and p50/p95/p99 latency per endpoint, plus a per-request
+breakdown into JSON parse, preprocessing, model predict and serialization.
+
+Run from the repo root:
+    python -m benchmarks.load_test --requests 2000 --concurrency 1 4 16 --output bench.json
+"""
+import argparse
+import http.client
+import json
+import platform
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+# endpoint -> registry models whose inputs make up its payload
+ENDPOINTS = {
+    '/predict/demand': ('demand',),
+    '/predict/price': ('demand', 'pricing'),
+    '/recommend': ('recommendation',),
+}
+PERCENTILES = (50, 95, 99)
+
+
+def synthetic_payloads(models, n, rng):
+    """Random rows drawn from the bundles' category vocabularies and plausible numeric ranges
+
+    Endpoints that score several models only draw categories every one of them knows.
+    """
+    vocab = {feature: [label for label in lookup.classes
+                       if all(label in model.encoders[feature].codes for model in models[1:])]
+             for feature, lookup in models[0].encoders.items()}
+    rows = []
+    for _ in range(n):
+        row = {feature: str(rng.choice(labels)) for feature, labels in vocab.items()}
+        if models[0].features == 'sales':
+            row.update({
+                'Units Sold': int(rng.integers(1, 500)),
+                'Units Ordered': int(rng.integers(1, 250)),
+                'Demand Forecast': int(rng.integers(1, 500)),
+                'Price': round(float(rng.uniform(5, 1000)), 2),
+                'Discount': int(rng.integers(0, 30)),
+                'Holiday/Promotion': int(rng.integers(0, 2)),
+                'Competitor Pricing': round(float(rng.uniform(5, 1000)), 2),
+                'year': int(rng.integers(2022, 2026)),
+                'month': int(rng.integers(1, 13)),
+                'day': int(rng.integers(1, 29)),
+            })
+        rows.append(row)
+    return rows
+
+
+def endpoint_payloads(registry, endpoint, n, rng):
+    models = [registry.get(name) for name in ENDPOINTS[endpoint]]
+    return [json.dumps(row).encode() for row in synthetic_payloads(models, n, rng)]
+
+
+def summarize(latencies, wall):
+    latencies = np.asarray(latencies)
+    summary = {'requests': len(latencies), 'throughput_rps': len(latencies) / wall if wall else None,
+               'mean_ms': float(latencies.mean() * 1e3)}
+    for p in PERCENTILES:
+        summary[f'p{p}_ms'] = float(np.percentile(latencies, p) * 1e3)
+    return summary
+
+
+def run_load(send, bodies, concurrency):
+    """Send every body with `concurrency` threads; returns (latencies, errors, wall seconds)"""
+    latencies = [0.0] * len(bodies)
+    errors = []
+
+    def one(i):
+        start = time.perf_counter()
+        status = send(bodies[i])
+        latencies[i] = time.perf_counter() - start
+        if status != 200:
+            errors.append(i)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(len(bodies))))
+    return latencies, errors, time.perf_counter() - start
+
+
+def flask_client_sender(app, endpoint):
+    local = threading.local()
+
+    def send(body):
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        return local.client.post(endpoint, data=body, content_type='application/json').status_code
+    return send
+
+
+class KeepAliveHandler(WSGIRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def wsgi_sender(port, endpoint):
+    local = threading.local()
+
+    def send(body):
+        if not hasattr(local, 'conn'):
+            local.conn = http.client.HTTPConnection('127.0.0.1', port)
+        local.conn.request('POST', endpoint, body=body, headers={'Content-Type': 'application/json'})
+        response = local.conn.getresponse()
+        response.read()
+        return response.status
+    return send
+
+
+def stage_breakdown(registry, endpoint, bodies):
+    """Time each stage of the request path in-process, without HTTP or Flask overhead"""
+    stages = {'json_parse': [], 'preprocess': [], 'predict': [], 'serialize': []}
+    models = [registry.get(name) for name in ENDPOINTS[endpoint]]
+    for body in bodies:
+        t0 = time.perf_counter()
+        row = json.loads(body)
+        t1 = time.perf_counter()
+        matrices = [model.preprocess_row(row) for model in models]
+        t2 = time.perf_counter()
+        outputs = [model.decode(model.predict(X))[0] for model, X in zip(models, matrices)]
+        t3 = time.perf_counter()
+        json.dumps({'predictions': outputs})
+        t4 = time.perf_counter()
+        for stage, elapsed in zip(stages, (t1 - t0, t2 - t1, t3 - t2, t4 - t3)):
+            stages[stage].append(elapsed)
+    return {stage: {'mean_us': float(np.mean(values) * 1e6), 'p50_us': float(np.percentile(values, 50) * 1e6),
+                    'p99_us': float(np.percentile(values, 99) * 1e6)}
+            for stage, values in stages.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=1000, help='requests per endpoint and concurrency level')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--endpoints', nargs='+', choices=list(ENDPOINTS), default=list(ENDPOINTS))
+    parser.add_argument('--transports', nargs='+', choices=('test-client', 'wsgi'), default=['test-client', 'wsgi'])
+    parser.add_argument('--cache', action='store_true', help='leave the response cache on')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore')  # bundles were pickled with an older sklearn
+    from api import app, registry, response_cache
+
+    response_cache.enabled = args.cache
+    registry.preload()
+    rng = np.random.default_rng(args.seed)
+    payloads = {endpoint: endpoint_payloads(registry, endpoint, args.requests, rng) for endpoint in args.endpoints}
+
+    server = None
+    if 'wsgi' in args.transports:
+        server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=KeepAliveHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    results = []
+    for endpoint, bodies in payloads.items():
+        for transport in args.transports:
+            for concurrency in args.concurrency:
+                send = (flask_client_sender(app, endpoint) if transport == 'test-client'
+                        else wsgi_sender(server.server_port, endpoint))
+                run_load(send, bodies[:min(50, len(bodies))], concurrency)  # warm-up
+                latencies, errors, wall = run_load(send, bodies, concurrency)
+                summary = dict(summarize(latencies, wall), endpoint=endpoint, transport=transport,
+                               concurrency=concurrency, errors=len(errors))
+                results.append(summary)
+                print(f"{endpoint:<16} {transport:<11} c={concurrency:<3} {summary['throughput_rps']:9.1f} req/s  "
+                      + '  '.join(f"p{p} {summary[f'p{p}_ms']:7.2f} ms" for p in PERCENTILES)
+                      + (f"  errors {len(errors)}" if errors else ''))
+
+    stages = {endpoint: stage_breakdown(registry, endpoint, bodies) for endpoint, bodies in payloads.items()}
+    for endpoint, breakdown in stages.items():
+        print(f"{endpoint:<16} stages  " + '  '.join(f"{stage} {t['mean_us']:8.1f} µs" for stage, t in breakdown.items()))
+
+    if server is not None:
+        server.shutdown()
+    if args.output:
+        report = {
+            'meta': {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+                     'machine': platform.machine(), 'requests': args.requests, 'cache': args.cache,
+                     'models': {name: registry.get(name).version for name in registry.names()}},
+            'results': results,
+            'stages': stages,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+# Total entries kept across all routes and models (least recently used are evicted first)
+CACHE_SIZE = int(os.environ.get('WALMART_CACHE_SIZE', 4096))
+CACHE_ENABLED = os.environ.get('WALMART_CACHE', '1') != '0'
+
+# Seconds a cached entry stays valid, per route / model prediction
+ROUTE_TTLS = {
+    'dashboard': 5,
+    'forecast': 30,
+    'price_optimization': 30,
+    'restock': 30,
+    'predict': 300,
+}
+
+MISSING = object()
+
+
+class TTLCache:
+    """Bounded LRU cache with per-entry expiry and hit/miss counters per namespace
+
+    Keys are tuples whose first item is the namespace (route or model name),
+    so counters and invalidation can be scoped to one of them.
+    """
+
+    def __init__(self, maxsize=CACHE_SIZE, enabled=CACHE_ENABLED):
+        self.maxsize = maxsize
+        self.enabled = enabled
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = defaultdict(lambda: {'hits': 0, 'misses': 0})
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        if not self.enabled:
+            return MISSING
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            counters = self._counters[key[0]]
+            if entry is None:
+                counters['misses'] += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            counters['hits'] += 1
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        if not self.enabled or ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, namespace=None):
+        """Drop every entry, or only those of one namespace"""
+        with self._lock:
+            if namespace is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if key[0] == namespace]:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            namespaces = {name: dict(counters) for name, counters in self._counters.items()}
+            return {
+                'enabled': self.enabled,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': sum(c['hits'] for c in namespaces.values()),
+                'misses': sum(c['misses'] for c in namespaces.values()),
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'namespaces': namespaces,
+            }
+
+
+response_cache = TTLCache()
+
+
+def prediction_key(model, X):
+    """Cache key for one prediction: model, bundle version and the canonical feature vector"""
+    return (f'predict:{model.name}', model.version, X.tobytes())
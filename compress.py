@@ -0,0 +1,332 @@
+"""Forest compression: float32 thresholds, compact node indices, depth/tree pruning and a trade-off report
+
+Compiled forests (see forest.py) keep float64 thresholds and intp (int64)
+node indices. Compression rewrites the arrays of one served model:
+
+- Thresholds become float32 without changing a single prediction: inputs
+  are already cast to float32, and for any float32 x, `x <= t` equals
+  `x <= t32` when t32 is the largest float32 not above t (the cast, stepped
+  down with nextafter when it rounded up).
+- Child indices and tree roots use the smallest signed integer type that
+  holds every node id, and feature indices the smallest unsigned one.
+- Optionally, trees are cut at --max-depth (a node at that depth becomes a
+  leaf predicting its own value, which sklearn stores for every node), only
+  the first --n-trees trees are kept, and leaf values are stored as float32.
+  These change predictions; the report shows by how much.
+
+The report compares every requested configuration with the original on
+size, load time, single-row latency, batch throughput and prediction error,
+on rows from --history (also scored against its target column) or on
+synthetic rows. One configuration can then be written as a compact array
+bundle, the same .npy + bundle.json layout the registry memory-maps; with
+--publish it goes to Model/compact/<model>/, which the registry serves in
+place of the pickled bundle it was made from (until that bundle changes).
+
+    python compress.py demand --max-depth 6 8 --n-trees 50 100 --value-dtype float64 float32
+    python compress.py demand --max-depth 8 --publish
+"""
+import argparse
+import itertools
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from forest import FlatForest
+from registry import FOREST_ARRAYS, load_compiled, registry, save_compiled
+
+# Rows scored per configuration when --history is not given
+EVAL_ROWS = 10000
+# Single-row predictions timed per configuration (the median is reported)
+SINGLE_ROW_CALLS = 200
+REPEAT = 3
+VALUE_DTYPES = ('float64', 'float32')
+
+
+def float32_thresholds(threshold):
+    """Largest float32 not above each threshold: exact `<=` splits for float32 inputs"""
+    rounded = threshold.astype(np.float32)
+    above = rounded.astype(np.float64) > threshold
+    rounded[above] = np.nextafter(rounded[above], np.float32(-np.inf))
+    return rounded
+
+
+def index_dtype(n_nodes):
+    """Smallest signed integer type holding every node id"""
+    for dtype in (np.int16, np.int32):
+        if n_nodes <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def feature_dtype(n_features):
+    for dtype in (np.uint8, np.uint16):
+        if n_features <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.intp)
+
+
+def prune_forest(forest, max_depth=None, n_trees=None):
+    """(node ids kept in order, leaf mask over them, depth reached) for the first `n_trees` trees cut at `max_depth`"""
+    if n_trees is not None and n_trees < 1:
+        raise ValueError(f"n_trees must be at least 1, got {n_trees}")
+    if max_depth is not None and max_depth < 0:
+        raise ValueError(f"max_depth must be at least 0, got {max_depth}")
+    roots = np.asarray(forest.roots[:n_trees], dtype=np.int64)
+    left, right = np.asarray(forest.left, dtype=np.int64), np.asarray(forest.right, dtype=np.int64)
+    kept, leaves = [], []
+    frontier, depth = roots, 0
+    while len(frontier):
+        is_leaf = left[frontier] == frontier
+        if max_depth is not None and depth >= max_depth:
+            is_leaf[:] = True
+        kept.append(frontier)
+        leaves.append(is_leaf)
+        internal = frontier[~is_leaf]
+        if not len(internal):
+            break
+        frontier = np.concatenate([left[internal], right[internal]])
+        depth += 1
+    kept, leaves = np.concatenate(kept), np.concatenate(leaves)
+    order = np.argsort(kept, kind='stable')  # original layout: each tree's nodes stay contiguous
+    return kept[order], leaves[order], depth
+
+
+def compress_forest(forest, max_depth=None, n_trees=None, value_dtype='float64'):
+    """A compressed copy of a FlatForest (see the module docstring)"""
+    nodes, is_leaf, depth = prune_forest(forest, max_depth, n_trees)
+    dtype = index_dtype(len(nodes))
+    new_ids = np.arange(len(nodes), dtype=np.int64)
+    # Old id -> new id for every kept node; children of kept internal nodes are always kept
+    left = np.searchsorted(nodes, np.asarray(forest.left)[nodes])
+    right = np.searchsorted(nodes, np.asarray(forest.right)[nodes])
+    return FlatForest(
+        feature=np.where(is_leaf, 0, np.asarray(forest.feature)[nodes]).astype(feature_dtype(forest.n_features)),
+        threshold=float32_thresholds(np.where(is_leaf, 0.0, np.asarray(forest.threshold, dtype=np.float64)[nodes])),
+        left=np.where(is_leaf, new_ids, left).astype(dtype),
+        right=np.where(is_leaf, new_ids, right).astype(dtype),
+        value=np.ascontiguousarray(np.asarray(forest.value)[nodes], dtype=value_dtype),
+        roots=np.searchsorted(nodes, np.asarray(forest.roots[:n_trees])).astype(dtype),
+        max_depth=depth,
+        n_features=forest.n_features,
+        classes=forest.classes,
+    )
+
+
+def forest_bytes(forest):
+    return sum(getattr(forest, key).nbytes for key in FOREST_ARRAYS)
+
+
+def write_compact(model, forest, directory, **meta):
+    """Write a compressed forest with the model's category tables in the registry's compiled layout"""
+    classes = {feature: lookup.classes for feature, lookup in model.encoders.items()}
+    target_classes = model.target.classes if model.target is not None else None
+    save_compiled(directory, forest, classes, target_classes, **meta)
+
+
+def publish_compact(model, forest, target, **meta):
+    """Write the compact bundle next to `target` and move it into place, replacing any previous one
+
+    Workers still mapping the old arrays keep reading them until they reload.
+    """
+    parent = os.path.dirname(os.path.abspath(target))
+    os.makedirs(parent, exist_ok=True)
+    scratch = tempfile.mkdtemp(prefix=f'.{os.path.basename(target)}-', dir=parent)
+    old = None
+    try:
+        write_compact(model, forest, scratch, **meta)
+        if os.path.exists(target):
+            old = tempfile.mkdtemp(prefix=f'.{os.path.basename(target)}-old-', dir=parent)
+            os.replace(target, os.path.join(old, 'bundle'))
+        os.rename(scratch, target)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+        if old:
+            shutil.rmtree(old, ignore_errors=True)
+
+
+# Report
+
+def evaluation_rows(model, history=None, target=None, n_rows=EVAL_ROWS, seed=0):
+    """(X, target values or None): rows from a history CSV, else synthetic rows from the model's vocabularies"""
+    if history:
+        import pandas as pd
+
+        columns = list(model.fields) + ([target] if target else [])
+        frame = pd.read_csv(history, usecols=lambda name: name in columns, nrows=n_rows)
+        X, errors = model.preprocess(frame, len(frame))
+        keep = np.ones(len(frame), dtype=bool)
+        keep[list(errors)] = False
+        y = frame[target].to_numpy()[keep] if target in frame else None
+        return X[keep], y
+    from benchmarks.load_test import synthetic_payloads
+
+    rows = synthetic_payloads([model], n_rows, np.random.default_rng(seed))
+    X, errors = model.preprocess({name: [row[name] for row in rows] for name in model.fields}, len(rows))
+    keep = np.ones(len(rows), dtype=bool)
+    keep[list(errors)] = False
+    return X[keep], None
+
+
+def _best(fn, repeat=REPEAT):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _directory_bytes(directory):
+    return sum(os.path.getsize(os.path.join(directory, entry)) for entry in os.listdir(directory))
+
+
+def errors_against(model, predictions, reference, y=None):
+    """Prediction error against the original forest's outputs (and the target, when known)
+
+    Classifiers are compared on class probabilities, regressors on predictions.
+    """
+    if model.forest.is_classifier:
+        errors = {'agreement': round(float(np.mean(predictions.argmax(1) == reference.argmax(1))), 4),
+                  'maxProbaDiff': round(float(np.abs(predictions - reference).max(initial=0.0)), 6)}
+        if y is not None:
+            labels = np.asarray(model.decode(model.forest.classes.take(predictions.argmax(1))))
+            errors['targetAccuracy'] = round(float(np.mean(labels == y.astype(str))), 4)
+        return errors
+    diff = predictions - reference
+    errors = {'mae': round(float(np.abs(diff).mean()), 6), 'rmse': round(float(np.sqrt((diff ** 2).mean())), 6),
+              'maxAbsDiff': round(float(np.abs(diff).max(initial=0.0)), 6)}
+    if y is not None:
+        y = np.asarray(y, dtype=np.float64)
+        errors['targetMae'] = round(float(np.abs(predictions - y).mean()), 4)
+        errors['targetMaeOriginal'] = round(float(np.abs(reference - y).mean()), 4)
+    return errors
+
+
+def measure(model, forest, X, reference, y=None):
+    """Size, load time, latency and error of one forest on the evaluation rows"""
+    scratch = tempfile.mkdtemp(prefix='.compress-')
+    try:
+        write_compact(model, forest, scratch)
+        size = _directory_bytes(scratch)
+
+        def load():
+            loaded, _ = load_compiled(scratch, mmap_mode=None)
+            loaded.predict(X[:1])
+
+        load_seconds = _best(load)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    score = forest.predict_proba if forest.is_classifier else forest.predict
+    predictions = score(X)
+    single = []
+    for row in X[:SINGLE_ROW_CALLS]:
+        start = time.perf_counter()
+        forest.predict(row[np.newaxis])
+        single.append(time.perf_counter() - start)
+    batch_seconds = _best(lambda: forest.predict(X))
+    return {
+        'nodes': len(forest.left),
+        'trees': forest.n_trees,
+        'maxDepth': forest.max_depth,
+        'dtypes': {key: str(getattr(forest, key).dtype) for key in FOREST_ARRAYS},
+        'arrayBytes': forest_bytes(forest),
+        'diskBytes': size,
+        'loadMs': round(load_seconds * 1000, 3),
+        'singleRowMs': round(float(np.median(single)) * 1000, 4),
+        'batchMsPer10kRows': round(batch_seconds * 1000 * 10000 / len(X), 3),
+        'errors': errors_against(model, predictions, reference, y),
+    }
+
+
+def compression_report(model, configs, X, y=None):
+    """The original forest and every (max_depth, n_trees, value_dtype) configuration, measured on X"""
+    original = model.forest
+    reference = original.predict_proba(X) if original.is_classifier else original.predict(X)
+    rows = [dict(config='original', **measure(model, original, X, reference, y))]
+    rows[0]['pickleBytes'] = os.path.getsize(model.source) if model.source and os.path.isfile(model.source) else None
+    for max_depth, n_trees, value_dtype in configs:
+        forest = compress_forest(original, max_depth, n_trees, value_dtype)
+        rows.append(dict(config=config_name(max_depth, n_trees, value_dtype),
+                         settings={'max_depth': max_depth, 'n_trees': n_trees, 'value_dtype': value_dtype},
+                         **measure(model, forest, X, reference, y)))
+    return rows
+
+
+def config_name(max_depth, n_trees, value_dtype):
+    depth = 'full' if max_depth is None else max_depth
+    trees = 'all' if n_trees is None else n_trees
+    return f"depth={depth} trees={trees} values={value_dtype}"
+
+
+def positive_int(value):
+    """argparse type for --max-depth/--n-trees: a whole number of at least 1"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+def print_report(name, rows, n_rows):
+    print(f"📦 {name}: {n_rows} evaluation rows")
+    for row in rows:
+        errors = ' '.join(f'{key}={value}' for key, value in row['errors'].items())
+        print(f"  {row['config']:<40} {row['nodes']:>9} nodes  depth {row['maxDepth']:>3}  "
+              f"{row['diskBytes'] / 1024:9.1f} KB  load {row['loadMs']:8.2f} ms  "
+              f"1 row {row['singleRowMs']:7.3f} ms  {row['batchMsPer10kRows']:8.1f} ms/10k  {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('model', choices=registry.names())
+    parser.add_argument('--max-depth', type=positive_int, nargs='*', default=[None], help='depth limits to try')
+    parser.add_argument('--n-trees', type=positive_int, nargs='*', default=[None], help='tree counts to try')
+    parser.add_argument('--value-dtype', nargs='*', choices=VALUE_DTYPES, default=['float64'])
+    parser.add_argument('--history', help='CSV of model inputs (and target) to evaluate on; synthetic rows otherwise')
+    parser.add_argument('--target', help='target column in --history (default: the training target)')
+    parser.add_argument('--rows', type=int, default=EVAL_ROWS)
+    parser.add_argument('--report', help='write the report as JSON to this file')
+    parser.add_argument('--output', help='write the (single) configuration as a compact bundle to this directory')
+    parser.add_argument('--publish', action='store_true',
+                        help="write it to the registry's compact directory so it is served")
+    args = parser.parse_args()
+
+    import warnings
+    warnings.filterwarnings('ignore')  # bundles were pickled with an older sklearn
+    from train import TARGETS
+
+    configs = list(itertools.product(args.max_depth or [None], args.n_trees or [None], args.value_dtype))
+    if (args.output or args.publish) and len(configs) != 1:
+        parser.error('--output/--publish need exactly one configuration')
+    try:
+        model = registry.load(args.model, registry.bundle_path(args.model))
+        target = args.target or TARGETS.get(args.model)
+        X, y = evaluation_rows(model, args.history, target, args.rows)
+        if not len(X):
+            raise ValueError("No usable evaluation rows")
+        rows = compression_report(model, configs, X, y)
+    except Exception as e:
+        print(f"[ERROR - Compress]: {str(e)}")
+        sys.exit(1)
+    print_report(args.model, rows, len(X))
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({'model': args.model, 'rows': len(X), 'history': args.history, 'results': rows}, f, indent=2)
+
+    if args.output or args.publish:
+        (max_depth, n_trees, value_dtype), = configs
+        forest = compress_forest(model.forest, max_depth, n_trees, value_dtype)
+        meta = {'source': model.source, 'source_version': model.version,
+                'compression': {'max_depth': max_depth, 'n_trees': n_trees, 'value_dtype': value_dtype}}
+        directory = args.output or registry.compact_path(args.model)
+        publish_compact(model, forest, directory, **meta)
+        print(f"✅ {config_name(max_depth, n_trees, value_dtype)} -> {directory}")
+
+
+if __name__ == '__main__':
+    main()
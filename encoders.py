@@ -0,0 +1,99 @@
+from itertools import repeat
+
+import numpy as np
+
+# Unknown-category policies
+UNKNOWN_ERROR = 'error'        # raise / report the row, same as LabelEncoder.transform
+UNKNOWN_FALLBACK = 'fallback'  # map to a fixed fallback code
+UNKNOWN_OTHER = 'other'        # map to the code of an "other" bucket label that the encoder was fitted with
+UNKNOWN_POLICIES = (UNKNOWN_ERROR, UNKNOWN_FALLBACK, UNKNOWN_OTHER)
+
+
+class CategoryLookup:
+    """Plain dict lookup table compiled from a fitted LabelEncoder"""
+
+    def __init__(self, classes, name='', unknown=UNKNOWN_ERROR, fallback_code=-1, other_label='Other',
+                 fold_case=False):
+        if unknown not in UNKNOWN_POLICIES:
+            raise ValueError(f"Unknown category policy must be one of {UNKNOWN_POLICIES}, got '{unknown}'")
+        self.name = name
+        self.classes = [str(label) for label in classes]
+        self.codes = {label: code for code, label in enumerate(self.classes)}
+        # Case-insensitive aliases ('Iphone 15' -> 'iPhone 15'), skipping labels that only differ in case
+        self.folded = None
+        if fold_case:
+            folded = {}
+            for label, code in self.codes.items():
+                folded.setdefault(label.casefold(), []).append(code)
+            self.folded = {key: codes[0] for key, codes in folded.items() if len(codes) == 1}
+        self.unknown = unknown
+        self.unknown_code = None
+        if unknown == UNKNOWN_FALLBACK:
+            self.unknown_code = fallback_code
+        elif unknown == UNKNOWN_OTHER:
+            if other_label not in self.codes:
+                raise ValueError(f"'{other_label}' bucket is not a known label of {name or 'encoder'}")
+            self.unknown_code = self.codes[other_label]
+
+    @classmethod
+    def from_encoder(cls, encoder, **kwargs):
+        return cls(encoder.classes_, **kwargs)
+
+    def lenient(self, fallback_code=-1):
+        """Copy matching labels case-insensitively and mapping the remaining unknown ones to `fallback_code`
+
+        For inputs shared by models whose vocabularies differ: a label another
+        model knows must not fail this one.
+        """
+        return CategoryLookup(self.classes, name=self.name, unknown=UNKNOWN_FALLBACK, fallback_code=fallback_code,
+                              fold_case=True)
+
+    def _fold(self, value):
+        if self.folded is None or not isinstance(value, str):
+            return None
+        return self.folded.get(value.casefold())
+
+    def _unseen(self, value):
+        return f"y contains previously unseen labels: '{value}' ({self.name})"
+
+    def encode(self, value):
+        try:
+            code = self.codes.get(value)
+        except TypeError:  # unhashable input
+            code = None
+        if code is None:
+            code = self._fold(value)
+        if code is None:
+            if self.unknown_code is None:
+                raise ValueError(self._unseen(value))
+            return self.unknown_code
+        return code
+
+    def encode_many(self, values):
+        """Encode a column; returns (codes, {row index: error}) for unknown labels under the error policy"""
+        get = self.codes.get
+        default = -1 if self.unknown_code is None else self.unknown_code
+        try:
+            codes = np.fromiter(map(get, values, repeat(default)), dtype=np.int64, count=len(values))
+        except TypeError:  # unhashable values (lists, dicts) from JSON input
+            codes = np.fromiter((get(value, default) if isinstance(value, str) else default for value in values),
+                                dtype=np.int64, count=len(values))
+        if self.folded is not None:
+            for i in np.flatnonzero(codes == default):
+                code = self._fold(values[i])
+                if code is not None:
+                    codes[i] = code
+        errors = {}
+        if self.unknown_code is None:
+            for i in np.flatnonzero(codes < 0):
+                errors[int(i)] = self._unseen(values[i])
+        return codes, errors
+
+    def decode(self, code):
+        return self.classes[int(code)]
+
+
+def compile_encoders(bundle, keys, **kwargs):
+    """Compile bundle encoders into lookup tables, keyed by feature name ({feature: bundle key})"""
+    return {feature: CategoryLookup.from_encoder(bundle[key], name=feature, **kwargs)
+            for feature, key in keys.items()}
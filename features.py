@@ -0,0 +1,221 @@
+from datetime import datetime
+
+import numpy as np
+
+# Order of the 21 model features shared by the demand, pricing and inventory forests
+FEATURE_COLUMNS = [
+    'product_encoded', 'category_encoded', 'region_encoded', 'units_sold_log', 'Units Ordered',
+    'demand_forecast_log', 'Price', 'Discount', 'weather_encoded',
+    'Holiday/Promotion', 'Competitor Pricing', 'season_encoded',
+    'year', 'month', 'day',
+    'weekend', 'm1', 'm2', 'weekday',
+    'price_discount', 'sold_ordered_interaction',
+]
+
+NUMERIC_FIELDS = ['Units Sold', 'Units Ordered', 'Demand Forecast', 'Price', 'Discount',
+                  'Holiday/Promotion', 'Competitor Pricing', 'year', 'month', 'day']
+CATEGORICAL_FIELDS = ['Products', 'Category', 'Region', 'Weather Condition', 'Seasonality']
+INPUT_FIELDS = NUMERIC_FIELDS + CATEGORICAL_FIELDS
+
+# Inputs of the recommendation model (all categorical)
+PROFILE_FIELDS = ['Job', 'Budget', 'Interest', 'Lifestyle']
+
+# Where each categorical field's LabelEncoder lives in a model bundle
+ENCODER_KEYS = {
+    'Products': 'label_encoder_products',
+    'Category': 'label_encoder_category',
+    'Region': 'label_encoder_region',
+    'Weather Condition': 'label_encoder_weather',
+    'Seasonality': 'label_encoder_seasonality',
+}
+
+# Rows check_parity runs through the single-row path, spread evenly over the frame
+PARITY_SAMPLE_ROWS = 100
+
+# Month sin/cos as lookup tables so every path gets the exact same values
+MONTH_SIN = np.sin(np.arange(13) * (2 * np.pi / 12))
+MONTH_COS = np.cos(np.arange(13) * (2 * np.pi / 12))
+
+
+def to_columns(payload, fields=INPUT_FIELDS):
+    """Normalize a list of row dicts or a columnar dict into (columns, n_rows)"""
+    if isinstance(payload, dict) and 'rows' in payload:
+        payload = payload['rows']
+    elif isinstance(payload, dict) and 'columns' in payload:
+        payload = payload['columns']
+
+    if isinstance(payload, list):
+        columns = {name: [row.get(name) if isinstance(row, dict) else None for row in payload]
+                   for name in fields}
+        return columns, len(payload)
+
+    if isinstance(payload, dict):
+        # Columns may be lists (JSON), NumPy arrays or CodedColumns (MessagePack / Arrow bodies, see wire.py)
+        is_column = [isinstance(values, (list, np.ndarray, CodedColumn)) for values in payload.values()]
+        lengths = {len(values) for values, column in zip(payload.values(), is_column) if column}
+        if len(lengths) != 1 or not all(is_column):
+            raise ValueError("Columnar payload must map every field to a list of equal length")
+        return payload, lengths.pop()
+
+    raise ValueError("Batch payload must be a list of rows or a dict of columns")
+
+
+def _column(columns, name, n_rows):
+    values = columns[name] if name in columns else None
+    return [None] * n_rows if values is None else values
+
+
+def _numeric_column(columns, name, n_rows, errors):
+    values = _column(columns, name, n_rows)
+    try:
+        column = np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        column = np.full(n_rows, np.nan)
+        for i, value in enumerate(values):
+            try:
+                column[i] = float(value)
+            except (TypeError, ValueError):
+                pass
+    for i in np.flatnonzero(np.isnan(column)):
+        errors.setdefault(int(i), f"Missing or invalid value for '{name}'")
+    return column
+
+
+def _categorical_column(columns, name, encoder, n_rows, errors):
+    values = _column(columns, name, n_rows)
+    if hasattr(values, 'codes') and hasattr(values, 'categories'):
+        return _coded_column(values, encoder, errors)
+    codes, unknown = encoder.encode_many(values.tolist() if hasattr(values, 'tolist') else values)
+    for i, message in unknown.items():
+        errors.setdefault(i, message)
+    return codes
+
+
+def _coded_column(values, encoder, errors):
+    """Dictionary-encoded column (CodedColumn or pandas.Categorical): each distinct label is looked up once"""
+    labels = list(values.categories) + [None]  # code -1 (missing) reads the trailing None
+    label_codes, unknown = encoder.encode_many(labels)
+    codes = np.asarray(values.codes, dtype=np.int64)
+    codes = np.where(codes < 0, len(labels) - 1, codes)
+    for i in np.flatnonzero(np.isin(codes, list(unknown))):
+        errors.setdefault(int(i), unknown[codes[i]])
+    return label_codes[codes]
+
+
+class CodedColumn:
+    """Input column given as integer codes into a list of labels, e.g. a string column of the columnar store"""
+
+    def __init__(self, codes, categories):
+        self.codes = codes
+        self.categories = categories
+
+    def __len__(self):
+        return len(self.codes)
+
+
+def _calendar(year, month, day, errors):
+    """Weekday per row from year/month/day columns; invalid dates are reported instead of rolling over"""
+    valid = ((year >= 1) & (year <= 9999) & (month >= 1) & (month <= 12) & (day >= 1) & (day <= 31)
+             & (year == np.floor(year)) & (month == np.floor(month)) & (day == np.floor(day)))
+    year = np.where(valid, year, 1970).astype(np.int64)
+    month = np.where(valid, month, 1).astype(np.int64)
+    day = np.where(valid, day, 1).astype(np.int64)
+    month_start = ((year - 1970) * 12 + (month - 1)).astype('datetime64[M]')
+    dates = month_start.astype('datetime64[D]') + (day - 1).astype('timedelta64[D]')
+    for i in np.flatnonzero(~valid | (dates.astype('datetime64[M]') != month_start)):
+        errors.setdefault(int(i), "day is out of range for month")
+    weekday = (dates.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday
+    return month, weekday
+
+
+def build_features(columns, encoders, n_rows=None):
+    """Columnar feature path: (X with FEATURE_COLUMNS, {row index: error})
+
+    `columns` maps input fields to equal-length column arrays (a DataFrame
+    works as-is) and `encoders` maps categorical fields to CategoryLookup
+    tables. Rows listed in the errors are still present in X but must not
+    be scored.
+    """
+    if n_rows is None:
+        n_rows = len(columns.index) if hasattr(columns, 'index') else len(next(iter(columns.values())))
+    errors = {}
+    numeric = {name: _numeric_column(columns, name, n_rows, errors) for name in NUMERIC_FIELDS}
+    encoded = {name: _categorical_column(columns, name, encoders[name], n_rows, errors)
+               for name in CATEGORICAL_FIELDS}
+
+    month, weekday = _calendar(numeric['year'], numeric['month'], numeric['day'], errors)
+    weekend = (weekday > 4).astype(np.int64)
+    units_sold_log = np.log1p(numeric['Units Sold'])
+    demand_forecast_log = np.log1p(numeric['Demand Forecast'])
+    price_discount = numeric['Price'] * numeric['Discount']
+    sold_ordered_interaction = units_sold_log * numeric['Units Ordered']
+
+    X = np.column_stack([
+        encoded['Products'], encoded['Category'], encoded['Region'], units_sold_log, numeric['Units Ordered'],
+        demand_forecast_log, numeric['Price'], numeric['Discount'], encoded['Weather Condition'],
+        numeric['Holiday/Promotion'], numeric['Competitor Pricing'], encoded['Seasonality'],
+        numeric['year'], numeric['month'], numeric['day'],
+        weekend, MONTH_SIN[month], MONTH_COS[month], weekday,
+        price_discount, sold_ordered_interaction,
+    ]).astype(np.float64, copy=False)
+    return X, errors
+
+
+def build_feature_row(record, encoders):
+    """Single-row feature path: a (1, 21) matrix for one input dict, raising ValueError on bad input"""
+    if not isinstance(record, dict):
+        raise ValueError("Input must be a JSON object")
+    X, errors = build_features({name: [record.get(name)] for name in INPUT_FIELDS}, encoders, n_rows=1)
+    if errors:
+        raise ValueError(errors[0])
+    return X
+
+
+def build_categorical_features(columns, encoders, fields, n_rows=None):
+    """Feature matrix for models whose inputs are only encoded categories (e.g. PROFILE_FIELDS)"""
+    if n_rows is None:
+        n_rows = len(columns.index) if hasattr(columns, 'index') else len(next(iter(columns.values())))
+    errors = {}
+    X = np.column_stack([_categorical_column(columns, name, encoders[name], n_rows, errors)
+                         for name in fields]).astype(np.float64)
+    return X, errors
+
+
+def scalar_feature_row(record, encoders):
+    """Reference row built one scalar at a time, the way preprocess_row did before this module
+
+    Independent of build_features (plain datetime and per-value math), so
+    check_parity can catch the vectorized path drifting from it.
+    """
+    values = {name: float(record[name]) for name in NUMERIC_FIELDS}
+    codes = {name: encoders[name].encode(record[name]) for name in CATEGORICAL_FIELDS}
+    month = int(values['month'])
+    weekday = datetime(int(values['year']), month, int(values['day'])).weekday()
+    units_sold_log = np.log1p(values['Units Sold'])
+    return np.array([[
+        codes['Products'], codes['Category'], codes['Region'], units_sold_log, values['Units Ordered'],
+        np.log1p(values['Demand Forecast']), values['Price'], values['Discount'], codes['Weather Condition'],
+        values['Holiday/Promotion'], values['Competitor Pricing'], codes['Seasonality'],
+        values['year'], values['month'], values['day'],
+        1 if weekday > 4 else 0, np.sin(month * (2 * np.pi / 12)), np.cos(month * (2 * np.pi / 12)), weekday,
+        values['Price'] * values['Discount'], units_sold_log * values['Units Ordered'],
+    ]], dtype=np.float64)
+
+
+def check_parity(frame, encoders, sample_rows=PARITY_SAMPLE_ROWS, X=None):
+    """Assert the columnar (training) path matches the scalar reference row (scalar_feature_row) bit for bit
+
+    Featurizes the whole frame (unless its columnar features `X` are passed
+    in) but only rebuilds `sample_rows` evenly spaced rows one at a time, so
+    the check stays cheap on large frames. Returns X.
+    """
+    if X is None:
+        X, errors = build_features(frame, encoders)
+        if errors:
+            raise ValueError(f"Training rows failed preprocessing: {errors}")
+    sample = np.unique(np.linspace(0, len(frame) - 1, min(sample_rows, len(frame))).astype(np.int64))
+    rows = [scalar_feature_row(record, encoders) for record in frame.iloc[sample].to_dict('records')]
+    rows = np.vstack(rows) if rows else np.empty((0, len(FEATURE_COLUMNS)))
+    if X.shape[0] != len(frame) or X[sample].tobytes() != rows.tobytes():
+        raise AssertionError("Columnar features differ from the scalar reference rows")
+    return X
@@ -0,0 +1,156 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from encoders import UNKNOWN_FALLBACK, CategoryLookup
+from features import CodedColumn, build_features
+from ingest import EPOCH
+
+DEFAULT_HORIZON = 14
+# Leading days of the window that overlap the end of the sales history (and so have actuals)
+HISTORY_DAYS = 7
+
+# Model inputs the sales log does not carry
+DEFAULT_INPUTS = {'Category': '', 'Region': '', 'Price': 0.0, 'Discount': 0, 'Competitor Pricing': 0.0}
+
+SEASONS = np.array(['Winter', 'Winter', 'Winter', 'Spring', 'Spring', 'Spring',
+                    'Summer', 'Summer', 'Summer', 'Autumn', 'Autumn', 'Autumn', 'Winter'])  # index = month
+
+
+class ForecastTable:
+    """Forecast for every product over one date window, held as dense arrays"""
+
+    def __init__(self, product_ids, dates, actual, predicted):
+        self.product_ids = list(product_ids)
+        self.index = {product_id: i for i, product_id in enumerate(self.product_ids)}
+        self.dates = dates          # datetime64[D], shape (days,)
+        self.actual = actual        # (products, days), NaN after the end of the history
+        self.predicted = predicted  # (products, days)
+
+    def series(self, product_id='all'):
+        if product_id == 'all':
+            actual, predicted = np.nansum(self.actual, axis=0), self.predicted.sum(axis=0)
+            actual[np.isnan(self.actual).all(axis=0)] = np.nan
+        elif product_id in self.index:
+            actual, predicted = self.actual[self.index[product_id]], self.predicted[self.index[product_id]]
+        else:
+            return []
+        return [{'day': str(day), 'demand': None if np.isnan(a) else int(a), 'predicted': round(float(p), 2)}
+                for day, a, p in zip(self.dates, actual, predicted)]
+
+
+def fallback_encoders(model):
+    """The model's lookup tables with unknown labels falling back instead of failing
+
+    Sales-log products and catalog names are mostly not in the model vocabulary.
+    """
+    return {feature: CategoryLookup(lookup.classes, name=feature, unknown=UNKNOWN_FALLBACK)
+            for feature, lookup in model.encoders.items()}
+
+
+def sales_inputs(mean_daily, impact):
+    """Model inputs derived from a product's average daily units and its event impact (0.3 for +30%)"""
+    return {
+        'Units Sold': mean_daily,
+        'Units Ordered': mean_daily,
+        'Demand Forecast': mean_daily * (1 + impact),
+        'Holiday/Promotion': (impact > 0).astype(np.int64),
+    }
+
+
+def _per_day(values, n_days):
+    if isinstance(values, CodedColumn):
+        return CodedColumn(np.repeat(values.codes, n_days), values.categories)
+    return np.repeat(values, n_days)
+
+
+def demand_features(model, product_columns, n_products, dates):
+    """Demand-forest features for every (product, day), product-major
+
+    `product_columns` hold one value per product for any input field; the
+    calendar fields come from `dates` and the rest from DEFAULT_INPUTS.
+    """
+    n_days = len(dates)
+    rows = n_products * n_days
+    calendar = pd.DatetimeIndex(dates)
+    columns = {name: _per_day(values, n_days) for name, values in product_columns.items()}
+    columns.update({
+        'Seasonality': CodedColumn(np.tile(calendar.month.to_numpy(), n_products), SEASONS),
+        'year': np.tile(calendar.year.to_numpy(), n_products),
+        'month': np.tile(calendar.month.to_numpy(), n_products),
+        'day': np.tile(calendar.day.to_numpy(), n_products),
+    })
+    for name, value in DEFAULT_INPUTS.items():
+        if name not in columns:
+            columns[name] = (CodedColumn(np.zeros(rows, dtype=np.int64), [value]) if isinstance(value, str)
+                             else np.full(rows, value, dtype=np.float64))
+
+    X, errors = build_features(columns, fallback_encoders(model), rows)
+    if errors:
+        raise ValueError(f"Demand features failed for {len(errors)} rows: {next(iter(errors.values()))}")
+    return X
+
+
+def build_forecast_table(model, ingestor, horizon=DEFAULT_HORIZON, history_days=HISTORY_DAYS):
+    """Score every (product, day) of the forecast window in one batched predict, from the ingested aggregates"""
+    aggregates = ingestor.by_product
+    if not len(aggregates):
+        raise ValueError("No sales history ingested")
+    n_products = len(aggregates)
+    product_ids = np.array(aggregates.keys, dtype=object)
+    mean_daily = aggregates.mean_daily_units()
+
+    # Latest weather and event seen for each product
+    impact = ingestor.event_multiplier(aggregates.latest_event[:n_products]) - 1.0
+    weather = pd.Series(aggregates.latest_weather[:n_products]).str.capitalize().to_numpy()
+
+    last_day = aggregates.max_day
+    days = last_day - (min(history_days, horizon) - 1) + np.arange(horizon)
+    dates = EPOCH + days
+    n_days = len(dates)
+
+    inputs = sales_inputs(mean_daily, impact)
+    inputs.update({'Products': product_ids, 'Weather Condition': weather})
+    X = demand_features(model, inputs, n_products, dates)
+    predicted = model.predict(X).reshape(n_products, n_days)
+
+    actual = aggregates.units_on(days)
+    actual[:, days > last_day] = np.nan
+    return ForecastTable(product_ids, dates, actual, predicted)
+
+
+class ForecastStore:
+    """Precomputed forecast tables per horizon, rebuilt when the model or the ingested aggregates change"""
+
+    def __init__(self, registry, ingestor, model_name='demand'):
+        self.registry = registry
+        self.ingestor = ingestor
+        self.model_name = model_name
+        self._tables = {}
+        self._lock = threading.Lock()
+        registry.add_listener(self._on_reload)
+
+    def _on_reload(self, name):
+        if name == self.model_name:
+            self.invalidate()
+
+    def invalidate(self):
+        with self._lock:
+            self._tables.clear()
+
+    def table(self, horizon=DEFAULT_HORIZON):
+        model = self.registry.get(self.model_name)
+        key = (horizon, model.version, self.ingestor.refresh().version)
+        table = self._tables.get(key)
+        if table is None:
+            with self._lock:
+                table = self._tables.get(key)
+                if table is None:
+                    table = build_forecast_table(model, self.ingestor, horizon)
+                    self._tables = {k: v for k, v in self._tables.items() if k[1:] == key[1:]}
+                    self._tables[key] = table
+        return table
+
+    def forecast(self, product_id='all', horizon=DEFAULT_HORIZON):
+        return self.table(horizon).series(product_id)
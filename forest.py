@@ -0,0 +1,207 @@
+import numpy as np
+
+# Rows traversed together; bounds the (rows x trees) node-index scratch arrays
+TRAVERSAL_CHUNK_SIZE = 1024
+
+
+class FlatForest:
+    """RandomForest compiled into contiguous node arrays with a vectorized traversal
+
+    All trees share one set of node arrays; `roots` holds each tree's offset.
+    Leaves point to themselves, so walking `max_depth` steps from the roots
+    always ends on a leaf. Predictions match sklearn exactly: inputs are cast
+    to float32 like sklearn does, and per-tree outputs are summed in tree
+    order before dividing by the number of trees.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth, n_features, classes=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value  # (n_nodes,) for regressors, (n_nodes, n_classes) class fractions for classifiers
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self.classes = classes
+        self._split_points = None
+        self._child_table = None
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Compile a fitted RandomForestRegressor / RandomForestClassifier"""
+        is_classifier = hasattr(model, 'classes_')
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset, max_depth = 0, 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            is_leaf = tree.children_left < 0
+            node_ids = np.arange(tree.node_count) + offset
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, 0.0, tree.threshold))
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left + offset))
+            rights.append(np.where(is_leaf, node_ids, tree.children_right + offset))
+            if is_classifier:
+                # Same normalization DecisionTreeClassifier.predict_proba applies to each leaf
+                proba = tree.value[:, 0, :model.n_classes_].copy()
+                normalizer = proba.sum(axis=1)[:, np.newaxis]
+                normalizer[normalizer == 0.0] = 1.0
+                proba /= normalizer
+                values.append(proba)
+            else:
+                values.append(tree.value[:, 0, 0])
+            roots.append(offset)
+            offset += tree.node_count
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            feature=np.concatenate(features).astype(np.intp),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            left=np.concatenate(lefts).astype(np.intp),
+            right=np.concatenate(rights).astype(np.intp),
+            value=np.ascontiguousarray(np.concatenate(values), dtype=np.float64),
+            roots=np.asarray(roots, dtype=np.intp),
+            max_depth=max_depth,
+            n_features=model.n_features_in_,
+            classes=np.asarray(model.classes_) if is_classifier else None,
+        )
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def is_classifier(self):
+        return self.classes is not None
+
+    def _check_input(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"X has {X.shape[-1]} features, but the model expects {self.n_features} features")
+        return X
+
+    def _children(self):
+        if self._child_table is None:
+            # [2 * node + went_left]; a private intp copy, so compact (int16/int32) node arrays are never
+            # converted on every traversal step
+            self._child_table = np.stack([self.right, self.left], axis=1).ravel().astype(np.intp)
+        return self._child_table
+
+    def _chunk_leaves(self, chunk):
+        n_rows, n_features = chunk.shape
+        flat = chunk.ravel()
+        row_offsets = (np.arange(n_rows) * n_features)[:, np.newaxis]
+        children = self._children()
+        node = np.broadcast_to(self.roots.astype(np.intp), (n_rows, self.n_trees))
+        for _ in range(self.max_depth):
+            go_left = flat[row_offsets + self.feature[node]] <= self.threshold[node]
+            node = children[2 * node + go_left]
+        return node
+
+    def _chunks(self, X):
+        X = np.ascontiguousarray(self._check_input(X))
+        for start in range(0, len(X), TRAVERSAL_CHUNK_SIZE):
+            yield start, X[start:start + TRAVERSAL_CHUNK_SIZE]
+
+    def apply(self, X):
+        """Leaf index reached in every tree, shape (n_rows, n_trees)"""
+        leaves = np.empty((len(X), self.n_trees), dtype=np.intp)
+        for start, chunk in self._chunks(X):
+            leaves[start:start + len(chunk)] = self._chunk_leaves(chunk)
+        return leaves
+
+    def predict_trees(self, X):
+        """Every tree's output: (n_rows, n_trees) or (n_rows, n_trees, n_classes) for classifiers"""
+        return self.value[self.apply(X)]
+
+    def _average(self, per_tree):
+        total = np.zeros((per_tree.shape[0],) + per_tree.shape[2:], dtype=np.float64)
+        for t in range(per_tree.shape[1]):
+            total += per_tree[:, t]
+        total /= per_tree.shape[1]
+        return total
+
+    def _mean_output(self, X):
+        """Averaged tree outputs, computed chunk by chunk so per-tree values never span the whole batch"""
+        out = np.empty((len(X),) + self.value.shape[1:], dtype=np.float64)
+        for start, chunk in self._chunks(X):
+            out[start:start + len(chunk)] = self._average(self.value[self._chunk_leaves(chunk)])
+        return out
+
+    def predict_spread(self, X, quantiles=()):
+        """predict() plus the spread of the trees around it, from the same traversal (regressors only)
+
+        Returns (mean, std, per-quantile values); mean is exactly predict(X),
+        std is the standard deviation across trees and quantiles are taken
+        over the trees' outputs, shaped (n_rows, len(quantiles)).
+        """
+        if self.is_classifier:
+            raise AttributeError("predict_spread is only available for regressors")
+        quantiles = np.asarray(quantiles, dtype=np.float64)
+        mean = np.empty(len(X), dtype=np.float64)
+        std = np.empty(len(X), dtype=np.float64)
+        spread = np.empty((len(X), len(quantiles)), dtype=np.float64)
+        for start, chunk in self._chunks(X):
+            per_tree = self.value[self._chunk_leaves(chunk)]
+            end = start + len(chunk)
+            mean[start:end] = self._average(per_tree)
+            std[start:end] = per_tree.std(axis=1)
+            if len(quantiles):
+                spread[start:end] = np.quantile(per_tree, quantiles, axis=1).T
+        return mean, std, spread
+
+    def predict_proba(self, X):
+        if not self.is_classifier:
+            raise AttributeError("predict_proba is only available for classifiers")
+        return self._mean_output(X)
+
+    def predict(self, X):
+        averaged = self._mean_output(X)
+        if self.is_classifier:
+            return self.classes.take(np.argmax(averaged, axis=1), axis=0)
+        return averaged
+
+    def split_points(self):
+        """(feature, sorted distinct thresholds) for every feature some split tests"""
+        if self._split_points is None:
+            internal = self.left != np.arange(len(self.left))
+            self._split_points = [(j, np.unique(self.threshold[internal & (self.feature == j)]))
+                                  for j in np.unique(self.feature[internal])]
+        return self._split_points
+
+    def predict_distinct(self, X):
+        """predict() that traverses each distinct split pattern only once
+
+        Rows that fall on the same side of every threshold reach the same
+        leaves, so each feature is reduced to its bin between thresholds and
+        only one row per distinct bin combination is scored. Results are
+        identical to predict(); this pays off when many rows share a pattern,
+        e.g. catalog-wide scoring where most inputs are shared defaults.
+        """
+        X = self._check_input(X)
+        first, inverse = self.distinct_rows(X)
+        return self.predict(X[first])[inverse]
+
+    def distinct_rows(self, X):
+        """(first, inverse): one row index per distinct split pattern, and each row's pattern
+
+        X[first] scored by any method, indexed by `inverse`, equals scoring X.
+        """
+        X = self._check_input(X)
+        points = self.split_points()
+        columns = np.ascontiguousarray(X[:, [j for j, _ in points]].T, dtype=np.float64)
+        bins = [np.searchsorted(thresholds, column, side='left') for column, (_, thresholds) in zip(columns, points)]
+        sizes = [len(thresholds) + 1 for _, thresholds in points]
+        if np.prod(np.asarray(sizes, dtype=np.float64)) < 2.0 ** 62:
+            key = np.zeros(len(X), dtype=np.int64)
+            for column, size in zip(bins, sizes):
+                key = key * size + column
+            _, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+        else:
+            _, first, inverse = np.unique(np.column_stack(bins), axis=0, return_index=True, return_inverse=True)
+        return first, inverse.ravel()
+
+
+def compile_forest(model):
+    """Compile a fitted sklearn forest for sklearn-free inference"""
+    return FlatForest.from_sklearn(model)
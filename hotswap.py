@@ -0,0 +1,437 @@
+"""Zero-downtime model updates: background load and atomic swap, a bundle watcher and shadow scoring
+
+A new bundle is loaded, compiled and warmed on a background thread while the
+current model keeps serving, then swapped in with one reference assignment
+(ModelRegistry.install); requests already holding the old model finish on it.
+
+- The watcher polls the served bundle files (Model/*.pkl, and the compact
+  bundles compress.py publishes for them) and swaps in any that changed, so
+  publishing a file (e.g. `python train.py ...`) updates every worker
+  process without a restart.
+- A versioned bundle (Model/versions/, see train.py) can be staged as a
+  candidate instead. It shadow-scores a sampled share of live prediction
+  batches and reports latency and prediction drift against the active model.
+  Promoting it publishes its file as the served bundle (so the other
+  workers' watchers pick it up too) and swaps it in here at once.
+
+Shadow scoring runs in a child process per worker, which maps the same
+compiled arrays, so it never competes with request handling for the GIL.
+What remains on the serving path for a sampled batch is handing its
+features and predictions to that process's queue (pickled on the queue's
+feeder thread); samples are dropped, and counted, when the queue is full.
+
+Candidate state is shared by every worker process of a deployment (e.g. the
+asgi.py pool): staging writes a marker file next to the versioned bundles
+that each worker's watcher follows, so all of them load and shadow-score the
+candidate and any of them can promote or discard it. Each worker writes its
+shadow statistics to its own file and status reports their sum. With the
+watcher disabled, workers only pick up the marker when they serve a
+/api/models request.
+"""
+import json
+import multiprocessing
+import os
+import queue
+import random
+import shutil
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from registry import VERSIONS_DIR, ModelRegistry, publish_bundle
+
+# Seconds between checks of the served bundle files (0 disables the watcher)
+WATCH_INTERVAL = float(os.environ.get('WALMART_WATCH_INTERVAL', 2))
+# Share of live prediction batches a candidate also scores
+SHADOW_FRACTION = float(os.environ.get('WALMART_SHADOW_FRACTION', 0.05))
+# Sampled batches waiting for the shadow process; when it falls behind, new samples are dropped
+SHADOW_QUEUE_SIZE = 256
+# Seconds between writes of the shadow process's statistics
+SHADOW_FLUSH_INTERVAL = 1.0
+# Per-process shadow statistics files, under Model/versions/
+SHADOW_DIR = '.shadow'
+
+
+class ShadowStats:
+    """Latency and prediction drift of a candidate against the active model, on the same rows"""
+
+    FIELDS = ('batches', 'rows', 'dropped', 'active_seconds', 'candidate_seconds', 'diff_sum', 'abs_diff_sum',
+              'max_abs_diff', 'disagreements')
+
+    def __init__(self):
+        self.batches = 0
+        self.rows = 0
+        self.dropped = 0
+        self.active_seconds = 0.0
+        self.candidate_seconds = 0.0
+        self.diff_sum = 0.0
+        self.abs_diff_sum = 0.0
+        self.max_abs_diff = 0.0
+        self.disagreements = 0
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    @classmethod
+    def merged(cls, snapshots):
+        """Statistics of several processes (to_dict() snapshots) as one"""
+        total = cls()
+        for snapshot in snapshots:
+            for field in cls.FIELDS:
+                if field == 'max_abs_diff':
+                    total.max_abs_diff = max(total.max_abs_diff, snapshot.get(field, 0.0))
+                else:
+                    setattr(total, field, getattr(total, field) + snapshot.get(field, 0))
+        return total
+
+    def add(self, active, candidate, active_seconds, candidate_seconds):
+        diff = np.asarray(candidate, dtype=np.float64) - np.asarray(active, dtype=np.float64)
+        self.batches += 1
+        self.rows += len(diff)
+        self.active_seconds += active_seconds
+        self.candidate_seconds += candidate_seconds
+        self.diff_sum += float(diff.sum())
+        self.abs_diff_sum += float(np.abs(diff).sum())
+        self.max_abs_diff = max(self.max_abs_diff, float(np.abs(diff).max(initial=0.0)))
+        self.disagreements += int(np.count_nonzero(diff))
+
+    def summary(self):
+        rows = max(self.rows, 1)
+        return {
+            'batches': self.batches,
+            'rows': self.rows,
+            'dropped': self.dropped,
+            'activeMsPerRow': round(self.active_seconds * 1000 / rows, 4),
+            'candidateMsPerRow': round(self.candidate_seconds * 1000 / rows, 4),
+            'meanDiff': round(self.diff_sum / rows, 4),
+            'meanAbsDiff': round(self.abs_diff_sum / rows, 4),
+            'maxAbsDiff': round(self.max_abs_diff, 4),
+            'disagreementRate': round(self.disagreements / rows, 4),
+        }
+
+
+class Candidate:
+    """A versioned bundle staged next to the active model"""
+
+    def __init__(self, version, path, fraction, token=None):
+        self.version = version
+        self.path = path
+        self.fraction = fraction
+        self.token = token or uuid.uuid4().hex  # identifies one staging across processes
+        self.model = None
+        self.state = 'loading'  # 'loading', 'ready' or 'failed'
+        self.error = None
+        self.stats = ShadowStats()
+
+
+class ModelSwapper:
+    """Background reloads, candidate staging/promotion and shadow scoring for one ModelRegistry"""
+
+    def __init__(self, registry, watch_interval=WATCH_INTERVAL, shadow_fraction=SHADOW_FRACTION):
+        self.registry = registry
+        self.watch_interval = watch_interval
+        self.shadow_fraction = shadow_fraction
+        self.candidates = {}
+        self.errors = {}
+        self._seen = {}  # served bundle (mtime, size) per model, as last acted on
+        self._lock = threading.Lock()
+        self._pid = None
+        self._process = None  # this process's shadow statistics file name
+        self._flushed = {}  # candidate token -> counts written to its statistics file
+        self._shadow = None  # (pid it was started from, queue, process) of the shadow scoring process
+
+    def ensure_started(self):
+        """Start the watcher thread (once per process: threads don't survive fork)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._process = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+                self.candidates, self._flushed = {}, {}
+                if self.watch_interval > 0:
+                    self._seen = {name: self._stat(name) for name in self.registry.names()}
+                    threading.Thread(target=self._watch, daemon=True, name='bundle-watcher').start()
+                self._pid = os.getpid()
+
+    def _stat(self, name):
+        """(mtime, size) of the served bundle and of its compact bundle header (see compress.py), if any"""
+        try:
+            stat = os.stat(self.registry.bundle_path(name))
+        except OSError:
+            return None
+        try:
+            compact = os.stat(os.path.join(self.registry.compact_path(name), 'bundle.json'))
+        except OSError:
+            compact = None
+        return stat.st_mtime_ns, stat.st_size, compact and (compact.st_mtime_ns, compact.st_size)
+
+    # Served bundles
+
+    def reload(self, name):
+        """Load the served bundle again on a background thread and swap it in when warm"""
+        self.registry.specs[name]  # unknown names fail here, not on the thread
+        threading.Thread(target=self._reload, args=(name,), daemon=True, name=f'reload-{name}').start()
+
+    def _reload(self, name):
+        try:
+            self.registry.install(name, self.registry.load(name))
+            self.errors.pop(name, None)
+        except Exception as e:
+            print(f"[ERROR - Reload {name}]: {str(e)}")
+            self.errors[name] = str(e)
+
+    def _watch(self):
+        while True:
+            time.sleep(self.watch_interval)
+            for name in self.registry.names():
+                try:
+                    self._sync(name)
+                    self._flush(name)
+                except Exception as e:
+                    print(f"[ERROR - Candidate {name}]: {str(e)}")
+                stat = self._stat(name)
+                if stat is None or stat == self._seen.get(name):
+                    continue
+                self._seen[name] = stat
+                # Models not loaded yet will read the new file on first use anyway
+                if self.registry.loaded(name) is not None:
+                    self._reload(name)
+
+    # Candidates (shared through the marker file, see the module docstring)
+
+    def _read_marker(self, name):
+        try:
+            with open(self.registry.candidate_path(name)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_marker(self, name, candidate):
+        path = self.registry.candidate_path(name)
+        scratch = f'{path}.{self._process or os.getpid()}'
+        with open(scratch, 'w') as f:
+            json.dump({'version': candidate.version, 'fraction': candidate.fraction, 'token': candidate.token}, f)
+        os.replace(scratch, path)
+
+    def _remove_marker(self, name, token):
+        marker = self._read_marker(name)
+        if marker is not None and marker['token'] == token:
+            try:
+                os.remove(self.registry.candidate_path(name))
+            except FileNotFoundError:
+                pass
+        shutil.rmtree(self._stats_dir(name, token), ignore_errors=True)
+
+    def _sync(self, name):
+        """Follow the marker: load a candidate staged by another process, drop one discarded or promoted there"""
+        marker = self._read_marker(name)
+        local = self.candidates.get(name)
+        if marker is None:
+            if local is not None:
+                self.candidates.pop(name, None)
+        elif local is None or local.token != marker['token']:
+            self._stage_local(name, Candidate(marker['version'], self.registry.version_path(name, marker['version']),
+                                              marker['fraction'], marker['token']))
+        return self.candidates.get(name)
+
+    def _stage_local(self, name, candidate):
+        self.candidates[name] = candidate
+        threading.Thread(target=self._load_candidate, args=(name, candidate), daemon=True,
+                         name=f'candidate-{name}').start()
+
+    def stage(self, name, version, fraction=None):
+        """Stage a versioned bundle as `name`'s candidate in every process; loads on a background thread"""
+        path = self.registry.version_path(name, version)
+        if not os.path.exists(path):
+            raise ValueError(f"No bundle version '{version}' for '{name}'; available: {self.registry.versions(name)}")
+        fraction = self.shadow_fraction if fraction is None else float(fraction)
+        if not 0 <= fraction <= 1:
+            raise ValueError("Shadow fraction must be between 0 and 1")
+        candidate = Candidate(version, path, fraction)
+        self._write_marker(name, candidate)
+        # Statistics of earlier candidates, including any a shadow process wrote after they were removed
+        root = os.path.dirname(self._stats_dir(name, candidate.token))
+        if os.path.isdir(root):
+            for entry in os.listdir(root):
+                if entry.startswith(f'{name}-') and entry != f'{name}-{candidate.token}':
+                    shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+        self._stage_local(name, candidate)
+        return candidate
+
+    def _load_candidate(self, name, candidate):
+        try:
+            candidate.model = self.registry.load(name, candidate.path)
+            candidate.state = 'ready'
+            if candidate.fraction > 0:
+                self._start_shadow()
+        except Exception as e:
+            print(f"[ERROR - Candidate {name}]: {str(e)}")
+            candidate.state, candidate.error = 'failed', str(e)
+
+    def promote(self, name):
+        """Publish the candidate's bundle as the served one and swap it in
+
+        Works in any process: if the candidate is still loading here, it is
+        loaded now. The others swap when their watcher sees the new bundle.
+        """
+        candidate = self._sync(name)
+        if candidate is None or candidate.state == 'failed':
+            raise ValueError(f"'{name}' has no candidate ready to promote")
+        if candidate.model is None:
+            self._load_candidate(name, candidate)
+            if candidate.model is None:
+                raise ValueError(f"Candidate '{candidate.version}' of '{name}' failed to load: {candidate.error}")
+        candidate.stats = self.shadow_stats(name, candidate)
+        publish_bundle(candidate.path, self.registry.bundle_path(name))
+        self._seen[name] = self._stat(name)  # this process swaps now; the watcher must not load it again
+        self.registry.install(name, candidate.model)
+        self.candidates.pop(name, None)
+        self._remove_marker(name, candidate.token)
+        return candidate
+
+    def discard(self, name):
+        candidate = self._sync(name)
+        if candidate is None:
+            raise ValueError(f"'{name}' has no candidate")
+        self.candidates.pop(name, None)
+        self._remove_marker(name, candidate.token)
+
+    # Shadow statistics, one file per process and candidate
+
+    def _stats_dir(self, name, token):
+        return os.path.join(self.registry.model_dir, VERSIONS_DIR, SHADOW_DIR, f'{name}-{token}')
+
+    def _write_stats(self, name, token, file_name, stats):
+        directory = self._stats_dir(name, token)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{file_name}.json')
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(stats.to_dict(), f)
+        os.replace(f'{path}.tmp', path)
+
+    def _flush(self, name):
+        """Write this process's statistics (samples it dropped) for `name`'s candidate if they changed"""
+        candidate = self.candidates.get(name)
+        if candidate is None or self._process is None:
+            return
+        stats = candidate.stats
+        if self._flushed.get(candidate.token) == (stats.rows, stats.dropped):
+            return
+        self._write_stats(name, candidate.token, self._process, stats)
+        self._flushed[candidate.token] = (stats.rows, stats.dropped)
+
+    def shadow_stats(self, name, candidate):
+        """The candidate's statistics summed over every process that shadow-scored it
+
+        Shadow processes write theirs every SHADOW_FLUSH_INTERVAL, so the
+        latest batches may not be counted yet.
+        """
+        self._flush(name)
+        directory = self._stats_dir(name, candidate.token)
+        snapshots = []
+        try:
+            entries = [entry for entry in os.listdir(directory) if entry.endswith('.json')]
+        except FileNotFoundError:
+            entries = []
+        for entry in entries:
+            try:
+                with open(os.path.join(directory, entry)) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        if not any(entry == f'{self._process}.json' for entry in entries):
+            snapshots.append(candidate.stats.to_dict())
+        return ShadowStats.merged(snapshots)
+
+    # Shadow scoring
+
+    def shadow(self, name, model, X, predictions):
+        """Hand a sampled scored batch to the shadow process for comparison with the candidate; never blocks"""
+        candidate = self.candidates.get(name)
+        if candidate is None or candidate.model is None or random.random() >= candidate.fraction:
+            return
+        shadow = self._shadow
+        if shadow is None or shadow[0] != os.getpid():
+            candidate.stats.dropped += 1
+            return
+        try:
+            shadow[1].put_nowait((name, candidate.token, candidate.path, np.asarray(X), np.asarray(predictions)))
+        except queue.Full:
+            candidate.stats.dropped += 1
+
+    def _start_shadow(self):
+        """Start this process's shadow scoring process, once (from the candidate loading thread, not a request)"""
+        with self._lock:
+            if self._shadow is not None and self._shadow[0] == os.getpid() and self._shadow[2].is_alive():
+                return
+            context = multiprocessing.get_context('spawn')
+            pending = context.Queue(SHADOW_QUEUE_SIZE)
+            settings = {'model_dir': self.registry.model_dir, 'compiled_dir': self.registry.compiled_dir,
+                        'compact_dir': self.registry.compact_dir, 'specs': self.registry.specs,
+                        'unknown': self.registry.unknown}
+            process = context.Process(target=shadow_process, args=(settings, pending, os.getpid(), self._process),
+                                      daemon=True, name='shadow-scoring')
+            process.start()
+            self._shadow = (os.getpid(), pending, process)
+
+    def status(self):
+        """Per model: the active version here, available versions and the shared candidate (state as loaded here)"""
+        models = {}
+        for name in self.registry.names():
+            active = self.registry.loaded(name)
+            candidate = self._sync(name)
+            models[name] = {
+                'active': active and {'version': active.version, 'source': active.source},
+                'versions': self.registry.versions(name),
+                'lastError': self.errors.get(name),
+                'candidate': candidate and {'version': candidate.version, 'state': candidate.state,
+                                            'error': candidate.error, 'shadowFraction': candidate.fraction,
+                                            'shadow': self.shadow_stats(name, candidate).summary()},
+            }
+        return models
+
+
+def shadow_process(settings, pending, parent, file_name):
+    """Shadow scoring loop for one serving process (see ModelSwapper._start_shadow)
+
+    Scores each sampled batch with the served bundle and the candidate, both
+    loaded here from their files, and writes the statistics per candidate
+    while its marker is current. Exits when the serving process is gone.
+    """
+    swapper = ModelSwapper(ModelRegistry(**settings), watch_interval=0)
+    active, candidates, stats, dirty = {}, {}, {}, set()
+    last_flush = time.monotonic()
+    while os.getppid() == parent:
+        try:
+            name, token, path, X, predictions = pending.get(timeout=SHADOW_FLUSH_INTERVAL)
+        except queue.Empty:
+            name = None
+        if name is not None:
+            try:
+                stat = swapper._stat(name)
+                if name not in active or active[name][0] != stat:
+                    active[name] = (stat, swapper.registry.load(name))
+                if path not in candidates:
+                    candidates[path] = swapper.registry.load(name, path)
+                start = time.perf_counter()
+                active[name][1].predict(X)
+                active_seconds = time.perf_counter() - start
+                start = time.perf_counter()
+                shadow_predictions = candidates[path].predict(X)
+                stats.setdefault((name, token), ShadowStats()).add(predictions, shadow_predictions, active_seconds,
+                                                                    time.perf_counter() - start)
+                dirty.add((name, token))
+            except Exception as e:
+                print(f"[ERROR - Shadow]: {str(e)}")
+        if dirty and (name is None or time.monotonic() - last_flush >= SHADOW_FLUSH_INTERVAL):
+            for name, token in dirty:
+                marker = swapper._read_marker(name)
+                if marker is not None and marker['token'] == token:
+                    swapper._write_stats(name, token, f'{file_name}-shadow', stats[(name, token)])
+                else:  # promoted or discarded meanwhile
+                    stats.pop((name, token), None)
+                    candidates.clear()
+            dirty.clear()
+            last_flush = time.monotonic()
@@ -0,0 +1,381 @@
+import hashlib
+import io
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from store import EPOCH, PRODUCT_COLUMNS, STORE_DIR, open_converted, open_table, write_table
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.environ.get('WALMART_DATA_DIR', os.path.join(BASE_DIR, 'data'))
+
+# Rows parsed per pandas chunk while ingesting
+CHUNK_SIZE = 100000
+# Days of per-day demand kept for rolling aggregates
+WINDOW_DAYS = 28
+# A last line without a newline is only read once the file has been left alone this long
+SETTLE_SECONDS = 1.0
+# New log bytes folded in between two checkpoints of the aggregates to the store
+CHECKPOINT_BYTES = 64 * 1024 * 1024
+
+
+def parse_impact(values):
+    """'+30%' style impact strings as fractions (0.3); unparseable values count as no impact"""
+    cleaned = pd.Series(values, dtype=object).astype(str).str.strip().str.rstrip('%')
+    return pd.to_numeric(cleaned, errors='coerce').fillna(0.0).to_numpy() / 100
+
+
+def load_events(path=None):
+    events = pd.read_csv(path or os.path.join(DATA_DIR, 'events.csv'), dtype=str)
+    events['impact'] = parse_impact(events['impact'])
+    return events
+
+
+# Event listings that name a catalog category differently
+TERM_ALIASES = {'clothes': 'clothing'}
+
+
+def _singular(word):
+    """Strip at most one plural suffix: 'umbrellas', 'glasses', 'accessories' -> 'umbrella', 'glass', 'accessory'"""
+    if word.endswith('ies') and len(word) > 4:
+        return word[:-3] + 'y'
+    if word.endswith(('sses', 'shes', 'ches', 'xes', 'zes')):
+        return word[:-2]
+    if word.endswith('s') and not word.endswith(('ss', 'us', 'is')) and len(word) > 3:
+        return word[:-1]
+    return word
+
+
+def _term(label):
+    # Case- and plural-insensitive (on the last word), so product 'Umbrella' matches the event listing 'Umbrellas'
+    words = str(label).strip().lower().split()
+    if ' '.join(words) in TERM_ALIASES:
+        return TERM_ALIASES[' '.join(words)]
+    return ' '.join(words[:-1] + [_singular(word) for word in words[-1:]])
+
+
+class EventIndex:
+    """Inverted index of events.csv: product name or category -> events that lift its demand"""
+
+    def __init__(self, impact, products):
+        self.impact = impact  # {event name: impact fraction}
+        self.events_by_term = {}
+        for event, labels in products.items():
+            for label in labels:
+                self.events_by_term.setdefault(_term(label), set()).add(event)
+
+    @classmethod
+    def from_events(cls, events):
+        products = events['products'].fillna('').str.split(';')
+        listed = {name: [label for label in labels if label.strip()] for name, labels in zip(events['name'], products)}
+        return cls(dict(zip(events['name'], events['impact'])), listed)
+
+    def events_of(self, *labels):
+        """Events listing any of `labels` (e.g. a product name and its category)"""
+        return set().union(*(self.events_by_term.get(_term(label), ()) for label in labels if label))
+
+    def multiplier(self, events, *labels):
+        """1 + impact of each of `events` for a product, 1.0 where the event does not list it"""
+        active = self.events_of(*labels)
+        return np.array([1.0 + self.impact[event] if event in active else 1.0 for event in events])
+
+
+class _CompleteLines(io.RawIOBase):
+    """Read-only view of a file between two byte offsets"""
+
+    def __init__(self, f, end):
+        self.f = f
+        self.remaining = end - f.tell()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.f.read(min(len(buffer), self.remaining))
+        self.remaining -= len(data)
+        buffer[:len(data)] = data
+        return len(data)
+
+
+class SalesAggregates:
+    """Per-key running aggregates of the sales log, updated in place one chunk at a time
+
+    Arrays are indexed by a dense row per key (product id or region), so
+    reads are O(1) and memory grows with the number of keys, not the log.
+    Per-day units live in a ring buffer of `window_days` slots per key.
+    """
+
+    def __init__(self, window_days=WINDOW_DAYS, capacity=256):
+        self.window_days = window_days
+        self.index = {}
+        self.keys = []
+        self.total_units = np.zeros(capacity)
+        self.sales_count = np.zeros(capacity, dtype=np.int64)
+        self.first_day = np.full(capacity, np.iinfo(np.int64).max)
+        self.last_day = np.full(capacity, np.iinfo(np.int64).min)
+        self.latest_weather = np.full(capacity, '', dtype=object)
+        self.latest_event = np.full(capacity, '', dtype=object)
+        self.daily_units = np.zeros((capacity, window_days))
+        self.slot_day = np.full((capacity, window_days), -1, dtype=np.int64)
+        self.max_day = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _rows(self, keys):
+        inverse, uniques = pd.factorize(keys)
+        for key in uniques:
+            if key not in self.index:
+                self.index[key] = len(self.keys)
+                self.keys.append(key)
+        if len(self.keys) > len(self.total_units):
+            self._grow(max(len(self.keys), 2 * len(self.total_units)))
+        return np.array([self.index[key] for key in uniques], dtype=np.int64)[inverse]
+
+    def _grow(self, capacity):
+        def grown(array, fill):
+            out = np.full((capacity,) + array.shape[1:], fill, dtype=array.dtype)
+            out[:len(array)] = array
+            return out
+        self.total_units = grown(self.total_units, 0)
+        self.sales_count = grown(self.sales_count, 0)
+        self.first_day = grown(self.first_day, np.iinfo(np.int64).max)
+        self.last_day = grown(self.last_day, np.iinfo(np.int64).min)
+        self.latest_weather = grown(self.latest_weather, '')
+        self.latest_event = grown(self.latest_event, '')
+        self.daily_units = grown(self.daily_units, 0)
+        self.slot_day = grown(self.slot_day, -1)
+
+    def update(self, keys, quantity, day, weather, event):
+        """Fold one chunk of sales (parallel arrays; day = days since epoch) into the aggregates"""
+        rows = self._rows(keys)
+        np.add.at(self.total_units, rows, quantity)
+        np.add.at(self.sales_count, rows, 1)
+        np.minimum.at(self.first_day, rows, day)
+
+        # Latest weather/event per key: the last record on each key's newest day in this chunk
+        newest = pd.DataFrame({'row': rows, 'day': day, 'order': np.arange(len(rows))})
+        newest = newest.sort_values(['row', 'day', 'order']).drop_duplicates('row', keep='last')
+        take = newest['day'].to_numpy() >= self.last_day[newest['row'].to_numpy()]
+        newest_rows, newest_records = newest['row'].to_numpy()[take], newest['order'].to_numpy()[take]
+        self.latest_weather[newest_rows] = weather[newest_records]
+        self.latest_event[newest_rows] = event[newest_records]
+        np.maximum.at(self.last_day, rows, day)
+        chunk_max = int(day.max())
+        self.max_day = chunk_max if self.max_day is None else max(self.max_day, chunk_max)
+
+        # Per-day units into the ring buffer; a slot holding an older day is recycled
+        per_day = pd.DataFrame({'row': rows, 'day': day, 'units': quantity}).groupby(['row', 'day'], sort=False)
+        per_day = per_day['units'].sum().reset_index()
+        per_day['slot'] = per_day['day'] % self.window_days
+        per_day = per_day[per_day['day'] == per_day.groupby(['row', 'slot'])['day'].transform('max')]
+        r, s, d, units = (per_day[c].to_numpy() for c in ('row', 'slot', 'day', 'units'))
+        held = self.slot_day[r, s]
+        newer = d > held
+        self.daily_units[r[newer], s[newer]] = 0.0
+        self.slot_day[r[newer], s[newer]] = d[newer]
+        current = d >= held
+        self.daily_units[r[current], s[current]] += units[current]
+
+    def rows_of(self, keys):
+        """Row of each key (-1 for keys without sales)"""
+        return pd.Index(self.keys, dtype=object).get_indexer(pd.Index(keys, dtype=object))
+
+    def units_on(self, days):
+        """Units per key on each of `days` (days since epoch); days outside the window read as 0"""
+        n = len(self.keys)
+        days = np.asarray(days, dtype=np.int64)
+        slots = days % self.window_days
+        held = self.slot_day[:n][:, slots]
+        return np.where(held == days, self.daily_units[:n][:, slots], 0.0)
+
+    def rolling_units(self):
+        """Units per key over the last `window_days` days of the log"""
+        n = len(self.keys)
+        if self.max_day is None:
+            return np.zeros(n)
+        live = self.slot_day[:n] > self.max_day - self.window_days
+        return np.where(live, self.daily_units[:n], 0.0).sum(axis=1)
+
+    def mean_daily_units(self):
+        """Average units per calendar day between each key's first and last sale"""
+        n = len(self.keys)
+        span = np.maximum(self.last_day[:n] - self.first_day[:n] + 1, 1)
+        return self.total_units[:n] / span
+
+    def to_columns(self):
+        n = len(self.keys)
+        return {'key': np.array(self.keys, dtype=object), 'total_units': self.total_units[:n],
+                'sales_count': self.sales_count[:n], 'first_day': self.first_day[:n], 'last_day': self.last_day[:n],
+                'latest_weather': self.latest_weather[:n], 'latest_event': self.latest_event[:n],
+                'daily_units': self.daily_units[:n], 'slot_day': self.slot_day[:n]}
+
+    @classmethod
+    def from_table(cls, table):
+        """Aggregates restored from a stored checkpoint; numeric arrays stay mapped until they are updated"""
+        aggregates = cls(table.meta['window_days'], capacity=0)
+        aggregates.keys = list(table.decode('key'))
+        aggregates.index = {key: row for row, key in enumerate(aggregates.keys)}
+        for name in ('total_units', 'sales_count', 'first_day', 'last_day', 'daily_units', 'slot_day'):
+            setattr(aggregates, name, table[name])
+        aggregates.latest_weather = table.decode('latest_weather')
+        aggregates.latest_event = table.decode('latest_event')
+        aggregates.max_day = table.meta['max_day']
+        return aggregates
+
+    def get(self, key):
+        """Aggregates of one key as a dict, or None if it has no sales"""
+        row = self.index.get(key)
+        if row is None:
+            return None
+        return {
+            'totalUnits': float(self.total_units[row]),
+            'salesCount': int(self.sales_count[row]),
+            'meanDailyUnits': float(self.total_units[row] / max(self.last_day[row] - self.first_day[row] + 1, 1)),
+            'rollingUnits': float(self.daily_units[row][self.slot_day[row] > self.max_day - self.window_days].sum()),
+            'lastSale': str(EPOCH + int(self.last_day[row])),
+            'latestWeather': self.latest_weather[row],
+            'latestEvent': self.latest_event[row],
+        }
+
+
+class SalesIngestor:
+    """Tails data/sales.csv in chunks and keeps per-product and per-region aggregates current
+
+    Each refresh only parses bytes appended since the previous one (up to the
+    last complete line), so aggregates are never recomputed from scratch. The
+    aggregates are checkpointed to the columnar store (see store.py) and a new
+    process resumes from the checkpoint instead of re-reading the whole log.
+    """
+
+    def __init__(self, data_dir=DATA_DIR, window_days=WINDOW_DAYS, chunk_size=CHUNK_SIZE, store_dir=STORE_DIR):
+        self.data_dir = data_dir
+        self.store_dir = store_dir
+        self.chunk_size = chunk_size
+        self.by_product = SalesAggregates(window_days)
+        self.by_region = SalesAggregates(window_days)  # filled when the log has a region column
+        self.event_impact = {}
+        self.event_index = EventIndex({}, {})
+        self.products = None  # store.Table of the catalog
+        self.version = 0  # bumped whenever new rows or events are folded in
+        self._offset = 0
+        self._header = None
+        self._mtimes = {}
+        self._checkpointed = 0
+        self._lock = threading.Lock()
+        self._restore(window_days)
+
+    @property
+    def sales_path(self):
+        return os.path.join(self.data_dir, 'sales.csv')
+
+    def refresh(self):
+        """Fold in rows appended to the sales log and reload events/products if they changed; cheap when nothing did"""
+        with self._lock:
+            self._refresh_tables()
+            stat = os.stat(self.sales_path)
+            if stat.st_size < self._offset:
+                raise RuntimeError("sales.csv shrank; rebuild the aggregates with a new SalesIngestor")
+            if stat.st_size > self._offset:
+                settled = time.time() - stat.st_mtime >= SETTLE_SECONDS
+                self._ingest_sales(stat.st_size, settled)
+                if self._offset - self._checkpointed >= CHECKPOINT_BYTES:
+                    self._checkpoint()
+        return self
+
+    def checkpoint(self):
+        """Write the aggregates and the log offset they cover to the store"""
+        with self._lock:
+            self._checkpoint()
+
+    def _checkpoint(self):
+        meta = {'offset': self._offset, 'header': self._header, 'window_days': self.by_product.window_days,
+                'tail_digest': self._tail_digest(self._offset)}
+        try:
+            for name, aggregates in (('aggregates', self.by_product), ('region_aggregates', self.by_region)):
+                write_table(os.path.join(self.store_dir, name), aggregates.to_columns(),
+                            dict(meta, max_day=aggregates.max_day))
+        except OSError as e:
+            print(f"[ERROR - Checkpoint]: {str(e)}")  # another worker is writing one; the next checkpoint retries
+            return
+        self._checkpointed = self._offset
+
+    def _restore(self, window_days):
+        """Resume from a checkpoint if it still describes a prefix of the current sales log"""
+        try:
+            tables = [open_table(os.path.join(self.store_dir, name), mmap_mode='c')
+                      for name in ('aggregates', 'region_aggregates')]
+        except (OSError, ValueError, KeyError):
+            return
+        meta = tables[0].meta
+        if (tables[1].meta['offset'] != meta['offset'] or meta['window_days'] != window_days or meta['offset'] > os.path.getsize(self.sales_path)
+                or meta['tail_digest'] != self._tail_digest(meta['offset'])):
+            return
+        self.by_product, self.by_region = (SalesAggregates.from_table(table) for table in tables)
+        self._offset = self._checkpointed = meta['offset']
+        self._header = meta['header']
+
+    def _tail_digest(self, offset):
+        """Hash of the last few KB before `offset`, to tell an appended log from a replaced one"""
+        with open(self.sales_path, 'rb') as f:
+            f.seek(max(offset - 4096, 0))
+            return hashlib.sha1(f.read(offset - f.tell())).hexdigest()
+
+    def event_multiplier(self, events):
+        """1 + impact for each event name (unknown or empty names give 1.0)"""
+        return 1.0 + pd.Series(events, dtype=object).map(self.event_impact).fillna(0.0).to_numpy(dtype=np.float64)
+
+    def _refresh_tables(self):
+        """Reload the small dimension tables (events, product catalog) whole when their file changes"""
+        for name in ('events.csv', 'products.csv'):
+            path = os.path.join(self.data_dir, name)
+            mtime = os.stat(path).st_mtime_ns
+            if mtime == self._mtimes.get(name):
+                continue
+            if name == 'events.csv':
+                events = load_events(path)
+                self.event_impact = dict(zip(events['name'], events['impact']))
+                self.event_index = EventIndex.from_events(events)
+            else:
+                self.products = open_converted('products', path, PRODUCT_COLUMNS, self.store_dir)
+            self._mtimes[name] = mtime
+            self.version += 1
+
+    def _ingest_sales(self, size, settled):
+        with open(self.sales_path, 'rb') as f:
+            # Stop at the last complete line so a row still being appended is picked up next time
+            end = size
+            if not settled:
+                f.seek(max(size - 65536, self._offset))
+                tail = f.read(size - f.tell())
+                end = size - (len(tail) - tail.rfind(b'\n') - 1) if b'\n' in tail else self._offset
+            if end <= self._offset:
+                return
+            f.seek(self._offset)
+            if self._header is None:
+                self._header = f.readline().decode('utf-8-sig').strip().split(',')
+            reader = pd.read_csv(io.BufferedReader(_CompleteLines(f, end)), header=None, names=self._header,
+                                 dtype=str, chunksize=self.chunk_size, on_bad_lines='skip')
+            for chunk in reader:
+                self._ingest_chunk(chunk)
+            self._offset = end
+        self.version += 1
+
+    def _ingest_chunk(self, chunk):
+        quantity = pd.to_numeric(chunk['quantity'], errors='coerce')
+        dates = pd.to_datetime(chunk['date'], errors='coerce')
+        keep = (quantity.notna() & dates.notna() & chunk['productId'].notna()).to_numpy()
+        if not keep.any():
+            return
+        chunk = chunk[keep]
+        quantity = quantity.to_numpy(dtype=np.float64)[keep]
+        day = (dates.to_numpy()[keep].astype('datetime64[D]') - EPOCH).astype(np.int64)
+        weather = chunk.get('weather', pd.Series('', index=chunk.index)).fillna('').to_numpy(dtype=object)
+        event = chunk.get('event', pd.Series('', index=chunk.index)).fillna('').to_numpy(dtype=object)
+        self.by_product.update(chunk['productId'].to_numpy(dtype=object), quantity, day, weather, event)
+        if 'region' in chunk:
+            region = chunk['region'].fillna('').to_numpy(dtype=object)
+            self.by_region.update(region, quantity, day, weather, event)
@@ -0,0 +1,227 @@
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: exited workers' snapshots are still merged, just never compacted
+    fcntl = None
+
+# Latency histogram bucket upper bounds in seconds (+Inf is implicit)
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Shared directory where every worker process publishes its metrics (like prometheus_client's
+# PROMETHEUS_MULTIPROC_DIR); without it /metrics only reports the process that serves the scrape
+METRICS_DIR = os.environ.get('WALMART_METRICS_DIR')
+# Seconds between writes of this process's snapshot to METRICS_DIR
+FLUSH_INTERVAL = float(os.environ.get('WALMART_METRICS_FLUSH_INTERVAL', 1.0))
+# Totals of exited workers, folded together so their files (and pids) can be reused
+RETIRED_FILE = 'metrics-retired.json'
+
+HELP = {
+    'walmart_requests_total': ('counter', 'Requests served, by endpoint, model and HTTP status'),
+    'walmart_request_errors_total': ('counter', 'Requests answered with an error status, by endpoint and model'),
+    'walmart_request_seconds': ('histogram', 'End-to-end request latency, by endpoint and model'),
+    'walmart_stage_seconds': ('histogram', 'Latency of one request stage (decode, preprocess, predict, encode)'),
+    'walmart_microbatches_total': ('counter', 'Batches scored by the single-row micro-batcher, by model'),
+    'walmart_microbatch_rows_total': ('counter', 'Rows scored by the single-row micro-batcher, by model'),
+}
+
+
+class Metrics:
+    """In-process counters and fixed-bucket histograms, mergeable across worker processes"""
+
+    def __init__(self, directory=METRICS_DIR, flush_interval=FLUSH_INTERVAL):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._counters = {}    # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+        self._pid = self._token = None
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # The parent keeps publishing its own counts; a forked worker starts from zero
+        self._counters, self._histograms = {}, {}
+        self._lock = threading.Lock()
+        self._pid = self._token = None
+
+    def file_name(self):
+        """This process's snapshot file: pid plus a start token, so a reused pid never overwrites a dead worker's"""
+        if self._pid != os.getpid():
+            self._pid, self._token = os.getpid(), uuid.uuid4().hex[:8]
+        return f'metrics-{self._pid}-{self._token}.json'
+
+    def inc(self, name, labels, value=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, labels, seconds):
+        key = (name, labels)
+        index = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        with self._lock:
+            series = self._histograms.get(key)
+            if series is None:
+                series = self._histograms[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+            series[index] += 1
+            series[-1] += seconds
+
+    @contextmanager
+    def timer(self, name, labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, labels, time.perf_counter() - start)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self._counters.items()],
+                'histograms': [[name, list(labels), list(series)] for (name, labels), series in self._histograms.items()],
+            }
+
+    def maybe_flush(self):
+        """Publish this process's snapshot to the shared directory, at most once per flush interval"""
+        if not self.directory or time.monotonic() - self._last_flush < self.flush_interval:
+            return
+        self._last_flush = time.monotonic()
+        self.flush()
+
+    def flush(self):
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        _write_json(os.path.join(self.directory, self.file_name()), self.snapshot())
+
+    def collect(self):
+        """Merge the live snapshot of this process with those published by the other workers"""
+        snapshots = [self.snapshot()]
+        if self.directory and os.path.isdir(self.directory):
+            own = self.file_name()
+            if fcntl is not None:
+                self._retire_exited(own)
+            for entry in os.listdir(self.directory):
+                if entry.startswith('metrics-') and entry.endswith('.json') and entry != own:
+                    snapshot = _read_json(os.path.join(self.directory, entry))
+                    if snapshot is not None:  # None: a worker is rewriting its file
+                        snapshots.append(snapshot)
+        return _merge(snapshots)
+
+    def _retire_exited(self, own):
+        """Fold the snapshots of workers that have exited into RETIRED_FILE and remove them"""
+        if not any(_exited(entry, own) for entry in os.listdir(self.directory)):
+            return
+        with open(os.path.join(self.directory, 'metrics.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)  # one process at a time, or a file could be counted twice
+            entries = set(os.listdir(self.directory))
+            exited = sorted(entry for entry in entries if _exited(entry, own))
+            path = os.path.join(self.directory, RETIRED_FILE)
+            retired = _read_json(path) or {'counters': [], 'histograms': [], 'merged': []}
+            # Files already folded in by a process that died before removing them
+            merged = {entry for entry in retired.get('merged', []) if entry in entries}
+            snapshots = [retired]
+            for entry in exited:
+                snapshot = None if entry in merged else _read_json(os.path.join(self.directory, entry))
+                if snapshot is not None:
+                    snapshots.append(snapshot)
+                    merged.add(entry)
+            counters, histograms = _merge(snapshots)
+            _write_json(path, {
+                'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+                'histograms': [[name, list(labels), series] for (name, labels), series in histograms.items()],
+                'merged': sorted(merged),
+            })
+            for entry in exited:
+                try:
+                    os.remove(os.path.join(self.directory, entry))
+                except FileNotFoundError:
+                    pass
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        counters, histograms = self.collect()
+        lines = []
+        for name, (kind, help_text) in HELP.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'counter':
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f'{name}{_labels(labels)} {value}')
+                continue
+            for (metric, labels), series in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), series[:-1]):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_labels(labels + (("le", str(bound)),))} {cumulative}')
+                lines.append(f'{name}_sum{_labels(labels)} {series[-1]}')
+                lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def _exited(entry, own):
+    """Whether a snapshot file in the metrics directory belongs to a worker that is no longer running"""
+    parts = entry[:-len('.json')].split('-') if entry.endswith('.json') else []
+    if len(parts) < 2 or parts[0] != 'metrics' or not parts[1].isdigit() or entry == own:
+        return False
+    pid = int(parts[1])
+    if pid == os.getpid():
+        return True  # an earlier process that had this pid
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except OSError:  # running, under another user
+        pass
+    return False
+
+
+def _merge(snapshots):
+    counters, histograms = {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, series in snapshot['histograms']:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            merged = histograms.setdefault(key, [0] * len(series))
+            for i, value in enumerate(series):
+                merged[i] += value
+    return counters, histograms
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, value):
+    scratch = f'{path}.{os.getpid()}.tmp'
+    with open(scratch, 'w') as f:
+        json.dump(value, f)
+    os.replace(scratch, path)
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + '}'
+
+
+metrics = Metrics()
+atexit.register(metrics.flush)
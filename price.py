@@ -1,11 +1,12 @@
-import numpy as np
 import pandas as pd
 import joblib
 import os
-from datetime import datetime
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.preprocessing import LabelEncoder
 
+from encoders import compile_encoders
+from features import ENCODER_KEYS, build_feature_row, check_parity
+
 # Step 1: Create or load dataset
 data = pd.DataFrame({
     'Products': ['iPhone 15', 'Umbrella', 'Coca Cola', 'Parle G', 'Vanilla Ice Cream'],
@@ -33,34 +34,17 @@ le_region = LabelEncoder().fit(data['Region'])
 le_weather = LabelEncoder().fit(data['Weather Condition'])
 le_season = LabelEncoder().fit(data['Seasonality'])
 
-# Step 3: Feature engineering
-def preprocess_row(row):
-    product_encoded = le_products.transform([row['Products']])[0]
-    category_encoded = le_category.transform([row['Category']])[0]
-    region_encoded = le_region.transform([row['Region']])[0]
-    weather_encoded = le_weather.transform([row['Weather Condition']])[0]
-    season_encoded = le_season.transform([row['Seasonality']])[0]
-    units_sold_log = np.log1p(row['Units Sold'])
-    demand_forecast_log = np.log1p(row['Demand Forecast'])
-    date_obj = datetime(row['year'], row['month'], row['day'])
-    weekday = date_obj.weekday()
-    weekend = 1 if weekday > 4 else 0
-    m1 = np.sin(row['month'] * (2 * np.pi / 12))
-    m2 = np.cos(row['month'] * (2 * np.pi / 12))
-    price_discount_interaction = row['Price'] * row['Discount']
-    sold_ordered_interaction = units_sold_log * row['Units Ordered']
-
-    return [
-        product_encoded, category_encoded, region_encoded, units_sold_log, row['Units Ordered'],
-        demand_forecast_log, row['Price'], row['Discount'], weather_encoded,
-        row['Holiday/Promotion'], row['Competitor Pricing'], season_encoded,
-        row['year'], row['month'], row['day'],
-        weekend, m1, m2, weekday,
-        price_discount_interaction, sold_ordered_interaction
-    ]
+# Step 3: Feature engineering (shared with the API, see features.py)
+encoders = compile_encoders({
+    'label_encoder_products': le_products,
+    'label_encoder_category': le_category,
+    'label_encoder_region': le_region,
+    'label_encoder_weather': le_weather,
+    'label_encoder_seasonality': le_season
+}, ENCODER_KEYS)
 
-# Step 4: Create feature matrix and target
-X = np.array([preprocess_row(row) for _, row in data.iterrows()])
+# Step 4: Create feature matrix and target (columnar path, checked against the serving path)
+X = check_parity(data, encoders)
 y = data['Price']
 
 # Step 5: Train model
@@ -92,11 +76,7 @@ bundle = joblib.load(output_path)
 
 # Extract components
 model = bundle['model']
-le_products = bundle['label_encoder_products']
-le_category = bundle['label_encoder_category']
-le_region = bundle['label_encoder_region']
-le_weather = bundle['label_encoder_weather']
-le_season = bundle['label_encoder_seasonality']
+encoders = compile_encoders(bundle, ENCODER_KEYS)
 
 # Test input
 test_input = {
@@ -119,27 +99,7 @@ test_input = {
 
 # Preprocess test input
 def preprocess_input(user):
-    product_encoded = le_products.transform([user['Products']])[0]
-    category_encoded = le_category.transform([user['Category']])[0]
-    region_encoded = le_region.transform([user['Region']])[0]
-    weather_encoded = le_weather.transform([user['Weather Condition']])[0]
-    season_encoded = le_season.transform([user['Seasonality']])[0]
-    units_sold_log = np.log1p(user['Units Sold'])
-    demand_forecast_log = np.log1p(user['Demand Forecast'])
-    date_obj = datetime(user['year'], user['month'], user['day'])
-    weekday = date_obj.weekday()
-    weekend = 1 if weekday > 4 else 0
-    m1 = np.sin(user['month'] * (2 * np.pi / 12))
-    m2 = np.cos(user['month'] * (2 * np.pi / 12))
-    price_discount_interaction = user['Price'] * user['Discount']
-    sold_ordered_interaction = units_sold_log * user['Units Ordered']
-
-    return np.array([[product_encoded, category_encoded, region_encoded, units_sold_log, user['Units Ordered'],
-                      demand_forecast_log, user['Price'], user['Discount'], weather_encoded,
-                      user['Holiday/Promotion'], user['Competitor Pricing'], season_encoded,
-                      user['year'], user['month'], user['day'],
-                      weekend, m1, m2, weekday,
-                      price_discount_interaction, sold_ordered_interaction]])
+    return build_feature_row(user, encoders)
 
 # Predict price
 X_test = preprocess_input(test_input)
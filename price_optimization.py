@@ -0,0 +1,95 @@
+from datetime import date
+
+import numpy as np
+
+from features import FEATURE_COLUMNS, INPUT_FIELDS
+
+PRICE_COLUMN = FEATURE_COLUMNS.index('Price')
+DISCOUNT_COLUMN = FEATURE_COLUMNS.index('Discount')
+PRICE_DISCOUNT_COLUMN = FEATURE_COLUMNS.index('price_discount')
+
+# Default sweep: the range the dashboard used to show, on a dense grid
+DEFAULT_MIN_PRICE = 250.0
+DEFAULT_MAX_PRICE = 400.0
+DEFAULT_POINTS = 200
+MAX_GRID_SIZE = 100000
+
+
+def default_base_record(encoders):
+    """Feature inputs the sweep holds fixed when the caller doesn't override them"""
+    today = date.today()
+    return {
+        'Products': encoders['Products'].classes[0],
+        'Category': encoders['Category'].classes[0],
+        'Region': encoders['Region'].classes[0],
+        'Weather Condition': encoders['Weather Condition'].classes[0],
+        'Seasonality': encoders['Seasonality'].classes[0],
+        'Units Sold': 100,
+        'Units Ordered': 50,
+        'Demand Forecast': 120,
+        'Price': (DEFAULT_MIN_PRICE + DEFAULT_MAX_PRICE) / 2,
+        'Discount': 0,
+        'Holiday/Promotion': 0,
+        'Competitor Pricing': (DEFAULT_MIN_PRICE + DEFAULT_MAX_PRICE) / 2,
+        'year': today.year,
+        'month': today.month,
+        'day': today.day,
+    }
+
+
+def price_sweep(model, base_record, prices, discounts=(0,)):
+    """Score the demand model over every (price, discount) pair in one batched predict
+
+    Only Price, Discount and their price_discount interaction vary across the
+    grid, so the base row is preprocessed once and broadcast.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    discounts = np.asarray(discounts, dtype=np.float64)
+    if prices.size * discounts.size > MAX_GRID_SIZE:
+        raise ValueError(f"Grid has {prices.size * discounts.size} points, the limit is {MAX_GRID_SIZE}")
+
+    grid_price = np.repeat(prices, discounts.size)
+    grid_discount = np.tile(discounts, prices.size)
+    X = np.repeat(model.preprocess_row(base_record), grid_price.size, axis=0)
+    X[:, PRICE_COLUMN] = grid_price
+    X[:, DISCOUNT_COLUMN] = grid_discount
+    X[:, PRICE_DISCOUNT_COLUMN] = grid_price * grid_discount
+
+    demand = model.predict(X)
+    revenue = grid_price * demand
+    return grid_price, grid_discount, demand, revenue
+
+
+def optimize_price(model, product_id='all', params=None):
+    """Revenue-maximizing price and the full demand/revenue curve for a product
+
+    `params` (e.g. request.args) may set min_price, max_price, points, a
+    comma-separated list of discounts, and any model input field to override
+    the base row. 'all' sweeps the default product; any other product_id the
+    model doesn't know raises KeyError. The product used is echoed back.
+    """
+    params = params or {}
+    base = default_base_record(model.encoders)
+    if product_id != 'all':
+        if product_id not in model.encoders['Products'].codes:
+            raise KeyError(f"Unknown product '{product_id}'")
+        base['Products'] = product_id
+    base.update({name: params[name] for name in INPUT_FIELDS if name in params})
+
+    min_price = float(params.get('min_price', DEFAULT_MIN_PRICE))
+    max_price = float(params.get('max_price', DEFAULT_MAX_PRICE))
+    points = int(params.get('points', DEFAULT_POINTS))
+    if points < 1 or min_price > max_price:
+        raise ValueError("Price grid needs points >= 1 and min_price <= max_price")
+    discounts = [float(d) for d in str(params.get('discounts', base['Discount'])).split(',') if d.strip()]
+    # Checked before the price grid is built, not after
+    if points * max(len(discounts), 1) > MAX_GRID_SIZE:
+        raise ValueError(f"Grid has {points * len(discounts)} points, the limit is {MAX_GRID_SIZE}")
+
+    prices, discounts, demand, revenue = price_sweep(model, base, np.linspace(min_price, max_price, points),
+                                                     discounts)
+    best = int(np.argmax(revenue))
+    curve = [{'price': round(float(p), 2), 'discount': float(d), 'demand': round(float(q), 2),
+              'revenue': round(float(r), 2)}
+             for p, d, q, r in zip(prices, discounts, demand, revenue)]
+    return {'product': base['Products'], 'priceData': curve, 'optimal': curve[best]}
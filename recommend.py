@@ -0,0 +1,106 @@
+import threading
+
+import numpy as np
+
+from features import to_columns
+
+# Recommendations returned per profile when the caller doesn't ask for a number
+DEFAULT_TOP_K = 5
+
+
+class RecommendationTable:
+    """predict_proba of the recommendation forest for every profile, as one dense array
+
+    The inputs are four small categorical features, so the whole input space
+    (Job x Budget x Interest x Lifestyle codes) is scored once; a
+    recommendation is then an index into `proba` / `ranking`.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.version = model.version
+        self.shape = tuple(len(model.encoders[field].classes) for field in model.fields)
+        grid = np.indices(self.shape).reshape(len(self.shape), -1).T
+        n_classes = len(model.forest.classes)
+        self.proba = model.forest.predict_proba(grid).reshape(self.shape + (n_classes,))
+        # Stable sort so the first product equals predict()'s argmax, ties included
+        self.ranking = np.argsort(-self.proba, axis=-1, kind='stable')
+        self.products = np.array([model.target.decode(code) for code in model.forest.classes], dtype=object)
+
+    def entry(self, codes, k=DEFAULT_TOP_K):
+        """Top-k of one profile given its tuple of codes"""
+        best = self.ranking[codes][:max(1, k)]
+        return [{'product': product, 'score': round(float(score), 4)}
+                for product, score in zip(self.products[best], self.proba[codes][best])]
+
+    def top_k(self, X, k=DEFAULT_TOP_K):
+        """(products, scores), each (n_rows, k), for rows of encoded profiles"""
+        codes = np.asarray(X).astype(np.int64)
+        k = max(1, min(k, len(self.products)))
+        inside = np.all((codes >= 0) & (codes < self.shape), axis=1)
+        proba = np.empty((len(codes), len(self.products)))
+        ranking = np.empty((len(codes), len(self.products)), dtype=np.intp)
+        cells = tuple(codes[inside].T)
+        proba[inside], ranking[inside] = self.proba[cells], self.ranking[cells]
+        if not inside.all():
+            # Codes outside the vocabulary (fallback policies) are scored by the forest itself
+            proba[~inside] = self.model.forest.predict_proba(X[~inside])
+            ranking[~inside] = np.argsort(-proba[~inside], axis=1, kind='stable')
+        best = ranking[:, :k]
+        return self.products[best], np.take_along_axis(proba, best, axis=1)
+
+    def recommend(self, columns, n_rows=None, k=DEFAULT_TOP_K):
+        """Top-k products with scores per profile; returns (results, {row index: error})"""
+        X, errors = self.model.preprocess(columns, n_rows)
+        results = [None] * len(X)
+        valid = np.flatnonzero(~np.isin(np.arange(len(X)), list(errors)))
+        if len(valid):
+            products, scores = self.top_k(X[valid], k)
+            for i, row_products, row_scores in zip(valid, products, scores):
+                results[i] = [{'product': product, 'score': round(float(score), 4)}
+                              for product, score in zip(row_products, row_scores)]
+        return results, errors
+
+
+class RecommendationStore:
+    """The recommendation table for the current bundle, rebuilt when the registry reloads it"""
+
+    def __init__(self, registry, model_name='recommendation'):
+        self.registry = registry
+        self.model_name = model_name
+        self._table = None
+        self._lock = threading.Lock()
+        registry.add_listener(self._on_reload)
+
+    def _on_reload(self, name):
+        if name == self.model_name:
+            with self._lock:
+                self._table = None
+
+    def table(self):
+        model = self.registry.get(self.model_name)
+        table = self._table
+        if table is None or table.version != model.version:
+            with self._lock:
+                table = self._table
+                if table is None or table.version != model.version:
+                    table = self._table = RecommendationTable(model)
+        return table
+
+    def recommend_one(self, record, k=DEFAULT_TOP_K):
+        """Top-k for one profile: encode the four fields and index the table"""
+        if not isinstance(record, dict):
+            raise ValueError("Input must be a JSON object")
+        table = self.table()
+        codes = tuple(table.model.encoders[field].encode(record.get(field)) for field in table.model.fields)
+        if all(0 <= code < size for code, size in zip(codes, table.shape)):
+            return table.entry(codes, k)
+        results, errors = table.recommend({field: [record.get(field)] for field in table.model.fields}, 1, k)
+        if errors:
+            raise ValueError(errors[0])
+        return results[0]
+
+    def recommend_many(self, payload, k=DEFAULT_TOP_K):
+        table = self.table()
+        columns, n_rows = to_columns(payload, table.model.fields)
+        return table.recommend(columns, n_rows, k)
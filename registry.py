@@ -0,0 +1,299 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+
+from encoders import CategoryLookup, compile_encoders
+from features import (ENCODER_KEYS, INPUT_FIELDS, build_categorical_features, build_feature_row,
+                      build_features)
+from forest import FlatForest, compile_forest
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Bundles are read from Model/ next to this file unless overridden
+MODEL_DIR = os.environ.get('WALMART_MODEL_DIR', os.path.join(BASE_DIR, 'Model'))
+# Compiled forest arrays (.npy, opened with mmap so pre-forked workers share one page-cached copy)
+COMPILED_DIR = os.environ.get('WALMART_COMPILED_DIR', os.path.join(MODEL_DIR, 'compiled'))
+# Compressed array bundles written by compress.py (<COMPACT_DIR>/<model name>/), served in place of the
+# pickled bundle they were made from for as long as that bundle is unchanged
+COMPACT_DIR = os.environ.get('WALMART_COMPACT_DIR', os.path.join(MODEL_DIR, 'compact'))
+# How unseen categories are handled: 'error', 'fallback' or 'other' (see encoders.py)
+UNKNOWN_CATEGORY_POLICY = os.environ.get('WALMART_UNKNOWN_CATEGORY', 'error')
+
+# Versioned copies of each bundle (<file stem>-<version>.pkl, see train.py) live in this subdirectory
+VERSIONS_DIR = 'versions'
+
+FOREST_ARRAYS = ('feature', 'threshold', 'left', 'right', 'value', 'roots')
+
+# Bundles served from Model/: file, {feature: bundle encoder key}, feature pipeline and target encoder key
+MODEL_SPECS = {
+    'demand': {'file': 'demand_model_bundle.pkl', 'encoders': ENCODER_KEYS, 'features': 'sales'},
+    'pricing': {'file': 'pricing_model_bundle.pkl', 'encoders': ENCODER_KEYS, 'features': 'sales'},
+    'inventory': {'file': 'inventory_model_bundle.pkl', 'encoders': ENCODER_KEYS, 'features': 'sales'},
+    'recommendation': {'file': 'recommendation_model.pkl', 'encoders': {
+        'Job': 'le_job',
+        'Budget': 'le_budget',
+        'Interest': 'le_interest',
+        'Lifestyle': 'le_lifestyle',
+    }, 'features': 'profile', 'target': 'le_product'},
+}
+
+
+class LoadedModel:
+    """A compiled forest with its category lookup tables and feature pipeline"""
+
+    def __init__(self, name, forest, encoders, features='sales', target=None, version=None, source=None):
+        self.name = name
+        self.forest = forest
+        self.encoders = encoders
+        self.features = features  # 'sales' (21-feature pipeline) or 'profile' (encoded categories only)
+        self.target = target  # CategoryLookup decoding classifier outputs, if any
+        self.version = version
+        self.source = source  # bundle file the model was loaded from
+        self._lenient = None
+
+    @property
+    def fields(self):
+        return INPUT_FIELDS if self.features == 'sales' else list(self.encoders)
+
+    def preprocess(self, columns, n_rows=None):
+        """Columnar preprocessing: (X, {row index: error})"""
+        if self.features == 'sales':
+            return build_features(columns, self.encoders, n_rows)
+        return build_categorical_features(columns, self.encoders, self.fields, n_rows)
+
+    def preprocess_row(self, record):
+        if self.features == 'sales':
+            return build_feature_row(record, self.encoders)
+        if not isinstance(record, dict):
+            raise ValueError("Input must be a JSON object")
+        X, errors = self.preprocess({name: [record.get(name)] for name in self.fields}, 1)
+        if errors:
+            raise ValueError(errors[0])
+        return X
+
+    def lenient(self):
+        """This model with lenient category lookups (see CategoryLookup.lenient), for inputs meant for another model"""
+        if self._lenient is None:
+            self._lenient = LoadedModel(self.name, self.forest,
+                                        {feature: lookup.lenient() for feature, lookup in self.encoders.items()},
+                                        features=self.features, target=self.target, version=self.version,
+                                        source=self.source)
+        return self._lenient
+
+    def predict(self, X):
+        return self.forest.predict(X)
+
+    def predict_spread(self, X, quantiles=()):
+        """(predictions, std across trees, quantiles across trees) from one forest pass"""
+        return self.forest.predict_spread(X, quantiles)
+
+    def decode(self, predictions):
+        """Model outputs as response values: class labels for classifiers, floats for regressors"""
+        if self.target is not None:
+            return [self.target.decode(code) for code in predictions]
+        return np.asarray(predictions, dtype=np.float64).tolist()
+
+    def warm_up(self):
+        """Run one prediction so first requests don't pay for page faults and lazy allocations"""
+        self.forest.predict(np.zeros((1, self.forest.n_features)))
+
+
+def save_compiled(directory, forest, classes, target_classes=None, **meta):
+    """Write forest arrays as raw .npy files plus a small JSON header"""
+    for key in FOREST_ARRAYS:
+        np.save(os.path.join(directory, f'{key}.npy'), np.ascontiguousarray(getattr(forest, key)))
+    header = dict(meta, max_depth=forest.max_depth, n_features=forest.n_features,
+                  forest_classes=None if forest.classes is None else forest.classes.tolist(),
+                  encoders=classes, target=target_classes)
+    with open(os.path.join(directory, 'bundle.json'), 'w') as f:
+        json.dump(header, f)
+
+
+def load_compiled(directory, mmap_mode='r'):
+    """Open compiled forest arrays (memory-mapped by default); returns (forest, header)"""
+    with open(os.path.join(directory, 'bundle.json')) as f:
+        header = json.load(f)
+    arrays = {key: np.load(os.path.join(directory, f'{key}.npy'), mmap_mode=mmap_mode) for key in FOREST_ARRAYS}
+    classes = header['forest_classes']
+    forest = FlatForest(max_depth=header['max_depth'], n_features=header['n_features'],
+                        classes=None if classes is None else np.asarray(classes), **arrays)
+    return forest, header
+
+
+def publish_bundle(path, target):
+    """Make `path` the bundle served as `target`: link (or copy) next to it, then rename over it atomically"""
+    stem, ext = os.path.splitext(os.path.basename(path))
+    scratch = os.path.join(os.path.dirname(target), f'.{stem}{ext}')
+    try:
+        os.link(path, scratch)
+    except OSError:
+        shutil.copyfile(path, scratch)
+    os.replace(scratch, target)
+
+
+class ModelRegistry:
+    """Loads model bundles on first use and keeps one compiled copy per process"""
+
+    def __init__(self, model_dir=MODEL_DIR, compiled_dir=None, specs=None, unknown=UNKNOWN_CATEGORY_POLICY,
+                 mmap_mode='r', compact_dir=None):
+        self.model_dir = model_dir
+        self.compiled_dir = compiled_dir or (COMPILED_DIR if model_dir == MODEL_DIR
+                                             else os.path.join(model_dir, 'compiled'))
+        self.compact_dir = compact_dir or (COMPACT_DIR if model_dir == MODEL_DIR
+                                           else os.path.join(model_dir, 'compact'))
+        self.specs = dict(MODEL_SPECS if specs is None else specs)
+        self.unknown = unknown
+        self.mmap_mode = mmap_mode
+        self._models = {}
+        self._lock = threading.Lock()
+        self._listeners = []
+
+    def register(self, name, filename, encoder_keys, features='sales', target_key=None):
+        self.specs[name] = {'file': filename, 'encoders': encoder_keys, 'features': features, 'target': target_key}
+
+    def names(self):
+        return list(self.specs)
+
+    def get(self, name):
+        model = self._models.get(name)
+        if model is None:
+            with self._lock:
+                model = self._models.get(name)
+                if model is None:
+                    model = self._models[name] = self._load(name)
+        return model
+
+    def preload(self, names=None):
+        for name in names or self.names():
+            self.get(name)
+
+    def loaded(self, name):
+        """The model currently served as `name`, or None if it has not been loaded (never triggers a load)"""
+        return self._models.get(name)
+
+    def bundle_path(self, name):
+        return os.path.join(self.model_dir, self.specs[name]['file'])
+
+    def compact_path(self, name):
+        """Directory of the compressed array bundle served for `name`, if compress.py published one"""
+        return os.path.join(self.compact_dir, name)
+
+    def _compact(self, name, version):
+        """The published compact bundle if it was made from the bundle version being loaded, else None"""
+        directory = self.compact_path(name)
+        try:
+            with open(os.path.join(directory, 'bundle.json')) as f:
+                header = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if header.get('source_version') != version:
+            print(f"⚠️ Ignoring {directory}: it was compressed from another version of the '{name}' bundle")
+            return None
+        return directory
+
+    def version_path(self, name, version):
+        """Path of a versioned copy of a model's bundle"""
+        if not version or os.path.basename(version) != version:
+            raise ValueError(f"Invalid bundle version '{version}'")
+        stem, ext = os.path.splitext(self.specs[name]['file'])
+        return os.path.join(self.model_dir, VERSIONS_DIR, f'{stem}-{version}{ext}')
+
+    def candidate_path(self, name):
+        """Marker naming the version staged as `name`'s candidate, shared by every worker process (see hotswap.py)"""
+        stem, _ = os.path.splitext(self.specs[name]['file'])
+        return os.path.join(self.model_dir, VERSIONS_DIR, f'{stem}.candidate.json')
+
+    def versions(self, name):
+        """Versions available under VERSIONS_DIR for a model, oldest first"""
+        stem, ext = os.path.splitext(self.specs[name]['file'])
+        try:
+            entries = os.listdir(os.path.join(self.model_dir, VERSIONS_DIR))
+        except FileNotFoundError:
+            return []
+        return sorted(entry[len(stem) + 1:-len(ext)] for entry in entries
+                      if entry.startswith(f'{stem}-') and entry.endswith(ext))
+
+    def add_listener(self, callback):
+        """Call callback(name) whenever a model is reloaded, e.g. to invalidate cached predictions"""
+        self._listeners.append(callback)
+
+    def reload(self, name):
+        """Load a model again from its bundle (recompiling if the file changed) and swap it in"""
+        return self.install(name, self.load(name))
+
+    def install(self, name, model):
+        """Atomically make `model` the one served as `name`; requests already holding the old one finish on it"""
+        with self._lock:
+            self._models[name] = model
+        for callback in self._listeners:
+            callback(name)
+        return model
+
+    def load(self, name, path=None):
+        """Load and warm a model from its bundle (or a versioned copy of it) without serving it"""
+        return self._load(name, path)
+
+    def _load(self, name, path=None):
+        if name not in self.specs:
+            raise KeyError(f"Unknown model '{name}'")
+        spec = self.specs[name]
+        served, path = path is None, path or self.bundle_path(name)
+        try:
+            stat = os.stat(path)
+            # Compiled arrays are keyed by the bundle's mtime/size, so a replaced bundle is recompiled
+            version = f'{stat.st_mtime_ns}-{stat.st_size}'
+            directory = os.path.join(self.compiled_dir, f'{name}-{version}')
+            compact = self._compact(name, version) if served else None
+            if compact:
+                directory, path = compact, compact
+                version = f"{version}-compact-{os.stat(os.path.join(compact, 'bundle.json')).st_mtime_ns}"
+            elif not os.path.exists(os.path.join(directory, 'bundle.json')):
+                self._compile(name, path, directory)
+            forest, header = load_compiled(directory, mmap_mode=self.mmap_mode)
+        except Exception as e:
+            raise RuntimeError(f"❌ Failed to load model or encoders: {str(e)}")
+
+        encoders = {feature: CategoryLookup(classes, name=feature, unknown=self.unknown)
+                    for feature, classes in header['encoders'].items()}
+        target = header['target'] and CategoryLookup(header['target'], name='target')
+        model = LoadedModel(name, forest, encoders, features=spec.get('features', 'sales'), target=target,
+                            version=version, source=path)
+        model.warm_up()
+        return model
+
+    def _compile(self, name, path, directory):
+        import joblib  # only needed when a bundle has not been compiled yet
+
+        spec = self.specs[name]
+        bundle = joblib.load(path)
+        classes = {feature: lookup.classes for feature, lookup in compile_encoders(bundle, spec['encoders']).items()}
+        target_classes = None
+        if spec.get('target'):
+            target_classes = CategoryLookup.from_encoder(bundle[spec['target']]).classes
+
+        # Build in a scratch directory and rename into place so concurrent workers never see partial files
+        os.makedirs(self.compiled_dir, exist_ok=True)
+        scratch = tempfile.mkdtemp(prefix=f'.{name}-', dir=self.compiled_dir)
+        try:
+            save_compiled(scratch, compile_forest(bundle['model']), classes, target_classes, source=path)
+            os.rename(scratch, directory)
+        except OSError:
+            if not os.path.exists(os.path.join(directory, 'bundle.json')):
+                raise
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+        # Drop arrays compiled from older copies of this bundle, except the ones being served
+        active = self._models.get(name)
+        keep = {directory} | ({os.path.join(self.compiled_dir, f'{name}-{active.version}')} if active else set())
+        for entry in os.listdir(self.compiled_dir):
+            stale = os.path.join(self.compiled_dir, entry)
+            if entry.startswith(f'{name}-') and stale not in keep:
+                shutil.rmtree(stale, ignore_errors=True)
+
+
+registry = ModelRegistry()
@@ -0,0 +1,93 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from features import CodedColumn
+from forecast import demand_features, sales_inputs
+
+# Days of predicted demand the stock should cover, and safety units ordered on top (as in server/server.js)
+RESTOCK_DAYS = 5
+RESTOCK_BUFFER = 10
+# Suggestions returned when the caller doesn't ask for a number
+DEFAULT_LIMIT = 20
+
+
+def catalog_inputs(products, ingestor):
+    """Demand-model inputs for every catalog product, one vectorized pass over the store columns
+
+    Average daily units, latest weather and event impact come from the sales
+    aggregates; products without sales are scored with 0 average daily units,
+    as in server/server.js (the catalog's demand column is a 0-100 popularity
+    score, not a sales rate).
+    """
+    sales = ingestor.by_product
+    n_products, n_sales = len(products), len(sales)
+    rows = sales.rows_of(products.vocab['id'])[products['id']] if n_sales else np.full(n_products, -1)
+    known = rows >= 0
+
+    mean_daily = np.zeros(n_products)
+    impact = np.zeros(n_products)
+    weather_codes = np.full(n_products, -1, dtype=np.int64)
+    weather_labels = []
+    if known.any():
+        mean_daily[known] = sales.mean_daily_units()[rows[known]]
+        impact[known] = ingestor.event_multiplier(sales.latest_event[rows[known]]) - 1.0
+        codes, weather_labels = pd.factorize(pd.Series(sales.latest_weather[:n_sales]).str.capitalize())
+        weather_codes[known] = codes[rows[known]]
+
+    inputs = sales_inputs(mean_daily, impact)
+    inputs.update({
+        'Products': CodedColumn(products['name'], products.vocab['name']),
+        'Category': CodedColumn(products['category'], products.vocab['category']),
+        'Weather Condition': CodedColumn(weather_codes, list(weather_labels)),
+        'Price': products['price'],
+        'Competitor Pricing': products['price'],
+    })
+    return inputs
+
+
+def top_n(values, limit):
+    """Indices of the `limit` largest values, largest first; a partial sort, so O(n) for a small limit"""
+    if limit is None or limit >= len(values):
+        return np.argsort(-values, kind='stable')
+    if limit <= 0:
+        return np.array([], dtype=np.intp)
+    best = np.argpartition(-values, limit - 1)[:limit]
+    return best[np.argsort(-values[best], kind='stable')]
+
+
+def plan_restock(model, products, ingestor, limit=DEFAULT_LIMIT, day=None,
+                 days=RESTOCK_DAYS, buffer=RESTOCK_BUFFER, quantile=None):
+    """Restock suggestions for the whole catalog, largest reorder first
+
+    Daily demand for every product is scored with the demand forest in one
+    batch (distinct feature patterns are traversed once), then
+    predictedDemand = daily demand * days, and products whose stock is below
+    it are reordered up to predictedDemand + buffer. With a `quantile` (e.g.
+    0.9 for safety stock), the reorder target is that quantile of the trees'
+    daily demand instead, taken from the same tree evaluations, and is
+    returned as demandQuantile.
+    """
+    day = np.datetime64(day or date.today(), 'D')
+    X = demand_features(model, catalog_inputs(products, ingestor), len(products), np.array([day]))
+    if quantile is None:
+        predicted = np.round(model.forest.predict_distinct(X) * days)
+        target = predicted
+    else:
+        first, inverse = model.forest.distinct_rows(X)
+        mean, _, spread = model.forest.predict_spread(X[first], [quantile])
+        predicted = np.round(mean[inverse] * days)
+        target = np.round(spread[inverse, 0] * days)
+
+    stock = np.asarray(products['stock'], dtype=np.float64)
+    restock = np.where(stock < target, target - stock + buffer, 0.0)
+    candidates = np.flatnonzero(restock > 0)
+    selected = candidates[top_n(restock[candidates], limit)]
+    suggestions = [{'name': name, 'stock': int(stock[i]), 'predictedDemand': float(predicted[i]),
+                    'restock': int(restock[i])}
+                   for i, name in zip(selected, products.decode('name', selected))]
+    if quantile is not None:
+        for suggestion, i in zip(suggestions, selected):
+            suggestion['demandQuantile'] = float(target[i])
+    return suggestions
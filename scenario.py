@@ -0,0 +1,215 @@
+"""What-if scenarios: a declarative grid of demand-model inputs scored in one batched predict
+
+A scenario is a base record (any model input field; unset ones get the
+price-optimization defaults) plus a grid mapping dimensions to the values to
+try, e.g.
+
+    {"base": {"Products": "Umbrella", "Category": "Groceries"},
+     "grid": {"Region": "all", "Weather Condition": ["Rainy"], "event": ["Festival Season", null],
+              "Discount": [0, 10], "date": {"start": "2025-10-01", "days": 7}}}
+
+Every combination becomes one row of a single feature matrix. Categorical
+dimensions accept "all" for the model's whole vocabulary. An `event` scales
+the product's Demand Forecast input by 1 + impact when the event index lists
+the product or its category (from the catalog, else the base row's), the
+way the forecast applies events; unless
+set, Holiday/Promotion follows whether an event applies and Seasonality
+follows each date's month.
+"""
+import numpy as np
+import pandas as pd
+
+from features import CodedColumn, INPUT_FIELDS, NUMERIC_FIELDS
+from forecast import SEASONS
+from price_optimization import default_base_record
+
+MAX_GRID_SIZE = 100000
+# Dimensions a grid may vary, in layout order (the last one varies fastest)
+GRID_DIMENSIONS = ['Products', 'Region', 'Weather Condition', 'Seasonality', 'event', 'Holiday/Promotion',
+                   'Discount', 'date']
+CATEGORICAL_DIMENSIONS = ('Products', 'Region', 'Weather Condition', 'Seasonality')
+# Grid value meaning every label the model knows for a categorical dimension
+ALL = 'all'
+# Inputs derived per cell (from the event and the date) unless the scenario sets them
+DERIVED_FIELDS = ('Holiday/Promotion', 'Seasonality')
+
+
+def _as_list(value):
+    return value if isinstance(value, list) else [value]
+
+
+def _days(value):
+    try:
+        days = int(value.get('days', 1))
+    except (TypeError, ValueError):
+        raise ValueError("date range 'days' must be an integer")
+    if days < 1:
+        raise ValueError("date range 'days' must be at least 1")
+    return days
+
+
+def _dates(value):
+    """Grid dates from a list of ISO dates or {"start": ..., "days": n}"""
+    if isinstance(value, dict):
+        if 'start' not in value:
+            raise ValueError("date range needs a 'start'")
+        return np.datetime64(value['start'], 'D') + np.arange(_days(value))
+    return np.array(_as_list(value), dtype='datetime64[D]')
+
+
+def _dimension_size(model, name, value):
+    if name in CATEGORICAL_DIMENSIONS and value == ALL:
+        return len(model.encoders[name].classes)
+    if name == 'date' and isinstance(value, dict):
+        return _days(value)
+    return len(_as_list(value))
+
+
+def grid_size(model, grid):
+    """Cells of `grid`, from the dimension sizes alone, so an oversized grid is refused before anything is built"""
+    n_cells = 1
+    for name, value in grid.items():
+        size = _dimension_size(model, name, value)
+        if size > MAX_GRID_SIZE:
+            raise ValueError(f"Grid dimension '{name}' has {size} values, the limit is {MAX_GRID_SIZE} cells")
+        n_cells *= size
+        if n_cells > MAX_GRID_SIZE:
+            raise ValueError(f"Grid has more than {MAX_GRID_SIZE} cells")
+    return n_cells
+
+
+def grid_values(model, grid, event_index):
+    """{dimension: values} for the dimensions present in `grid`, in GRID_DIMENSIONS order"""
+    unknown = set(grid) - set(GRID_DIMENSIONS)
+    if unknown:
+        raise ValueError(f"Unknown grid dimension(s) {sorted(unknown)}; expected any of {GRID_DIMENSIONS}")
+    grid_size(model, grid)
+    values = {}
+    for name in GRID_DIMENSIONS:
+        if name not in grid:
+            continue
+        if name in CATEGORICAL_DIMENSIONS and grid[name] == ALL:
+            values[name] = list(model.encoders[name].classes)
+        elif name == 'date':
+            values[name] = _dates(grid[name])
+        elif name == 'event':
+            values[name] = [event or None for event in _as_list(grid[name])]
+            missing = [event for event in values[name] if event is not None and event not in event_index.impact]
+            if missing:
+                raise ValueError(f"Unknown event(s) {missing}")
+        elif name in NUMERIC_FIELDS:
+            try:
+                values[name] = np.asarray(_as_list(grid[name]), dtype=np.float64)
+            except (TypeError, ValueError):
+                raise ValueError(f"Missing or invalid value for '{name}'")
+        else:
+            values[name] = _as_list(grid[name])
+        if not len(values[name]):
+            raise ValueError(f"Grid dimension '{name}' has no values")
+    return values
+
+
+def _constant(value, n_cells, name):
+    if name in NUMERIC_FIELDS:
+        try:
+            return np.full(n_cells, float(value))
+        except (TypeError, ValueError):
+            raise ValueError(f"Missing or invalid value for '{name}'")
+    return CodedColumn(np.zeros(n_cells, dtype=np.int64), [value])
+
+
+def product_categories(products, default, catalog=None):
+    """Each product's category in the catalog (a store.Table), `default` for products it doesn't list"""
+    if catalog is None or not len(catalog):
+        return [default] * len(products)
+    rows = catalog.rows_of('name', products)
+    return [catalog.vocab['category'][catalog['category'][row]] if row >= 0 else default for row in rows]
+
+
+def scenario_inputs(model, base, values, event_index, catalog=None):
+    """Model input columns for every grid cell, plus each cell's event multiplier"""
+    shape = tuple(len(v) for v in values.values())
+    n_cells = int(np.prod(shape))
+    if n_cells > MAX_GRID_SIZE:
+        raise ValueError(f"Grid has {n_cells} cells, the limit is {MAX_GRID_SIZE}")
+    cell = dict(zip(values, np.indices(shape).reshape(len(shape), n_cells)))
+
+    columns = {}
+    for name in values:
+        if name in CATEGORICAL_DIMENSIONS:
+            columns[name] = CodedColumn(cell[name], values[name])
+        elif name in NUMERIC_FIELDS:
+            columns[name] = values[name][cell[name]]
+
+    dates = pd.DatetimeIndex(values['date'] if 'date' in values else
+                             [pd.Timestamp(year=int(base['year']), month=int(base['month']), day=int(base['day']))])
+    date_of_cell = cell['date'] if 'date' in values else np.zeros(n_cells, dtype=np.int64)
+    for name, part in (('year', dates.year), ('month', dates.month), ('day', dates.day)):
+        columns[name] = part.to_numpy(dtype=np.float64)[date_of_cell]
+    if 'Seasonality' not in columns and 'Seasonality' not in base:
+        columns['Seasonality'] = CodedColumn(dates.month.to_numpy()[date_of_cell], SEASONS)
+
+    # Multiplier of each (product, event) pair from the inverted index, then picked per cell
+    products = values.get('Products', [base['Products']])
+    events = values.get('event', [None])
+    table = np.array([event_index.multiplier(events, product, category)
+                      for product, category in zip(products, product_categories(products, base['Category'], catalog))])
+    multiplier = table[cell['Products'] if 'Products' in values else 0, cell['event'] if 'event' in values else 0]
+    multiplier = np.broadcast_to(multiplier, n_cells)
+    columns['Demand Forecast'] = _constant(base['Demand Forecast'], n_cells, 'Demand Forecast') * multiplier
+    if 'Holiday/Promotion' not in columns and 'Holiday/Promotion' not in base:
+        columns['Holiday/Promotion'] = (multiplier > 1).astype(np.float64)
+
+    for name in INPUT_FIELDS:
+        if name not in columns:
+            columns[name] = _constant(base[name], n_cells, name)
+    return columns, n_cells, shape, multiplier
+
+
+def _describe(values, shape, flat_index):
+    at = np.unravel_index(flat_index, shape)
+    return {name: _json_value(values[name][i]) for name, i in zip(values, at)}
+
+
+def _json_value(value):
+    if isinstance(value, np.datetime64):
+        return str(value)
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def run_scenario(model, spec, event_index, catalog=None):
+    """Score a scenario grid with the demand forest; demand is flat in row-major order over `dimensions`
+
+    `catalog` (the store's products table) gives each product's category for event matching.
+    """
+    if not isinstance(spec, dict):
+        raise ValueError("Scenario must be a JSON object with 'base' and 'grid'")
+    base_input, grid = spec.get('base') or {}, spec.get('grid') or {}
+    if not isinstance(base_input, dict) or not isinstance(grid, dict):
+        raise ValueError("'base' and 'grid' must be JSON objects")
+    defaults = default_base_record(model.encoders)
+    base = {name: base_input.get(name, defaults[name]) for name in INPUT_FIELDS
+            if name in base_input or name not in DERIVED_FIELDS}
+
+    values = grid_values(model, grid, event_index)
+    columns, n_cells, shape, multiplier = scenario_inputs(model, base, values, event_index, catalog)
+    X, errors = model.preprocess(columns, n_cells)
+    if errors:
+        i = next(iter(errors))
+        raise ValueError(f"Scenario cell {_describe(values, shape, i)}: {errors[i]}")
+    demand = model.predict(X)
+
+    lowest, highest = int(np.argmin(demand)), int(np.argmax(demand))
+    return {
+        'size': n_cells,
+        'shape': list(shape),
+        'dimensions': [{'name': name, 'values': [_json_value(v) for v in values[name]]} for name in values],
+        'base': base,
+        'demand': np.round(demand, 2).tolist(),
+        'eventMultiplier': np.round(multiplier, 4).tolist() if 'event' in values else None,
+        'summary': {
+            'mean': round(float(demand.mean()), 2),
+            'min': dict(_describe(values, shape, lowest), demand=round(float(demand[lowest]), 2)),
+            'max': dict(_describe(values, shape, highest), demand=round(float(demand[highest]), 2)),
+        },
+    }
@@ -0,0 +1,267 @@
+"""Columnar on-disk store for the catalog, sales history and sales aggregates
+
+Each table is a directory of one .npy file per column plus a table.json header.
+String columns are stored as int32 codes with their vocabulary in the header,
+dates as int32 days since epoch. Tables are opened memory-mapped, so every
+worker shares one page-cached copy and cold start does not parse any CSV.
+The serving path tails the sales log itself (ingest.py) and reads the
+aggregates; whole-history jobs such as backtest.py read the sales table.
+
+Convert the CSV/JSON files under data/ with:
+    python store.py
+"""
+import json
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock; a failed swap falls back to the table already published
+    fcntl = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.environ.get('WALMART_DATA_DIR', os.path.join(BASE_DIR, 'data'))
+STORE_DIR = os.environ.get('WALMART_STORE_DIR', os.path.join(DATA_DIR, 'store'))
+
+# Rows parsed per pandas chunk while converting CSV files
+CHUNK_SIZE = 1000000
+
+EPOCH = np.datetime64('1970-01-01', 'D')
+
+# Column kinds of the CSV files under data/ (columns not listed are not stored)
+PRODUCT_COLUMNS = {'id': 'str', 'name': 'str', 'category': 'str', 'price': 'float', 'stock': 'int',
+                   'brand': 'str', 'demand': 'float'}
+SALES_COLUMNS = {'productId': 'str', 'quantity': 'float', 'date': 'date', 'weather': 'str', 'event': 'str',
+                 'region': 'str'}
+
+KIND_DTYPES = {'str': np.int32, 'float': np.float64, 'int': np.int64, 'date': np.int32}
+
+
+class Table:
+    """Memory-mapped columns of one stored table"""
+
+    def __init__(self, directory, header, columns):
+        self.directory = directory
+        self.header = header
+        self.columns = columns
+        self.vocab = {name: np.array(spec['vocab'], dtype=object)
+                      for name, spec in header['columns'].items() if spec['kind'] == 'str'}
+        self._codes = {}
+        self._rows = {}
+
+    def __len__(self):
+        return self.header['n_rows']
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    @property
+    def meta(self):
+        return self.header['meta']
+
+    def decode(self, name, rows=None):
+        """Strings of a coded column, for all rows or the given row indices"""
+        codes = self.columns[name] if rows is None else self.columns[name][rows]
+        return self.vocab[name][codes]
+
+    def codes_of(self, name, values):
+        """Codes of `values` in a string column (-1 for values it does not contain)"""
+        lookup = self._codes.get(name)
+        if lookup is None:
+            lookup = self._codes[name] = {value: code for code, value in enumerate(self.vocab[name])}
+        return np.array([lookup.get(value, -1) for value in values], dtype=np.int64)
+
+    def rows_of(self, name, values):
+        """Row holding each of `values` in a unique-key string column (-1 for values it does not contain)"""
+        by_code = self._rows.get(name)
+        if by_code is None:
+            by_code = np.full(len(self.vocab[name]) + 1, -1, dtype=np.int64)  # last slot answers code -1
+            by_code[self.columns[name]] = np.arange(len(self))
+            self._rows[name] = by_code
+        return by_code[self.codes_of(name, values)]
+
+
+def open_table(directory, mmap_mode='r'):
+    with open(os.path.join(directory, 'table.json')) as f:
+        header = json.load(f)
+    columns = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mmap_mode)
+               for name in header['columns']}
+    return Table(directory, header, columns)
+
+
+@contextmanager
+def _locked(directory, purpose):
+    """Exclusive lock on a table directory across processes, held for one `purpose` (e.g. 'swap')"""
+    if fcntl is None:
+        yield
+        return
+    path = os.path.join(os.path.dirname(directory), f'.{os.path.basename(directory)}.{purpose}.lock')
+    with open(path, 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+def _publish(build, directory):
+    """Run build(scratch) and rename the scratch directory into place, replacing any older copy"""
+    parent = os.path.dirname(directory)
+    os.makedirs(parent, exist_ok=True)
+    scratch = tempfile.mkdtemp(prefix=f'.{os.path.basename(directory)}-', dir=parent)
+    try:
+        build(scratch)
+        stale = f'{scratch}.old'
+        with _locked(directory, 'swap'):  # two workers renaming at once fail with ENOENT/ENOTEMPTY
+            if os.path.exists(directory):
+                os.rename(directory, stale)
+            os.rename(scratch, directory)
+        shutil.rmtree(stale, ignore_errors=True)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def _write_header(directory, n_rows, columns, meta):
+    with open(os.path.join(directory, 'table.json'), 'w') as f:
+        json.dump({'n_rows': n_rows, 'columns': columns, 'meta': meta}, f)
+
+
+def write_table(directory, columns, meta=None):
+    """Store in-memory columns; object/string arrays are dictionary-encoded"""
+    def build(scratch):
+        specs, n_rows = {}, None
+        for name, values in columns.items():
+            values = np.asarray(values)
+            if values.dtype == object or values.dtype.kind in 'US':
+                codes, vocab = pd.factorize(values.astype(object))
+                values, specs[name] = codes.astype(np.int32), {'kind': 'str', 'vocab': [str(v) for v in vocab]}
+            else:
+                specs[name] = {'kind': values.dtype.str}
+            np.save(os.path.join(scratch, f'{name}.npy'), np.ascontiguousarray(values))
+            n_rows = len(values) if n_rows is None else n_rows
+        _write_header(scratch, n_rows or 0, specs, meta or {})
+    _publish(build, directory)
+
+
+def convert_csv(path, directory, kinds, chunk_size=CHUNK_SIZE, meta=None):
+    """Convert a CSV file chunk by chunk; memory is bounded by the chunk size and the vocabularies
+
+    Rows whose numeric or date fields do not parse are skipped.
+    """
+    def build(scratch):
+        vocabs = {name: {} for name, kind in kinds.items() if kind == 'str'}
+        raw = {name: open(os.path.join(scratch, f'{name}.raw'), 'wb') for name in kinds}
+        n_rows = 0
+        try:
+            reader = pd.read_csv(path, dtype=str, usecols=lambda c: c in kinds, chunksize=chunk_size,
+                                 on_bad_lines='skip')
+            for chunk in reader:
+                parsed = {}
+                for name, kind in kinds.items():
+                    values = chunk[name] if name in chunk else pd.Series(np.nan, index=chunk.index, dtype=object)
+                    if kind == 'date':
+                        parsed[name] = pd.to_datetime(values, errors='coerce')
+                    elif kind != 'str':
+                        parsed[name] = pd.to_numeric(values, errors='coerce')
+                    else:
+                        parsed[name] = values.fillna('')
+                keep = np.logical_and.reduce([parsed[n].notna().to_numpy() for n, k in kinds.items() if k != 'str']
+                                             or [np.ones(len(chunk), dtype=bool)])
+                for name, kind in kinds.items():
+                    values = parsed[name][keep]
+                    if kind == 'str':
+                        vocab = vocabs[name]
+                        inverse, uniques = pd.factorize(values)
+                        for value in uniques:
+                            vocab.setdefault(value, len(vocab))
+                        values = np.array([vocab[v] for v in uniques], dtype=np.int32)[inverse]
+                    elif kind == 'date':
+                        values = values.to_numpy().astype('datetime64[D]') - EPOCH
+                    raw[name].write(np.asarray(values).astype(KIND_DTYPES[kind]).tobytes())
+                n_rows += int(keep.sum())
+        finally:
+            for f in raw.values():
+                f.close()
+
+        specs = {}
+        for name, kind in kinds.items():
+            source = os.path.join(scratch, f'{name}.raw')
+            out = np.lib.format.open_memmap(os.path.join(scratch, f'{name}.npy'), mode='w+',
+                                            dtype=KIND_DTYPES[kind], shape=(n_rows,))
+            if n_rows:
+                out[:] = np.memmap(source, dtype=KIND_DTYPES[kind], mode='r', shape=(n_rows,))
+            out.flush()
+            del out
+            os.remove(source)
+            specs[name] = {'kind': kind}
+            if kind == 'str':
+                specs[name]['vocab'] = list(vocabs[name])
+        _write_header(scratch, n_rows, specs, meta or {})
+    _publish(build, directory)
+
+
+def source_meta(path):
+    """Identity of a source file, stored with the tables converted from it"""
+    stat = os.stat(path)
+    return {'source': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _open_current(directory, meta, mmap_mode):
+    """The stored table if it was converted from the source file `meta` describes, else None"""
+    try:
+        table = open_table(directory, mmap_mode)
+        if all(table.meta.get(key) == value for key, value in meta.items()):
+            return table
+    except (OSError, ValueError, KeyError):
+        pass
+    return None
+
+
+def open_converted(name, path, kinds, store_dir=STORE_DIR, mmap_mode='r'):
+    """Open a stored table, converting it again first if its source file changed since the last conversion
+
+    Workers that find the table stale at the same time convert it once: the
+    others wait for the conversion and open its result.
+    """
+    directory = os.path.join(store_dir, name)
+    meta = source_meta(path)
+    table = _open_current(directory, meta, mmap_mode)
+    if table is not None:
+        return table
+    os.makedirs(store_dir, exist_ok=True)
+    with _locked(directory, 'convert'):
+        table = _open_current(directory, meta, mmap_mode)  # converted while this worker waited
+        if table is not None:
+            return table
+        try:
+            convert_csv(path, directory, kinds, meta=meta)
+        except OSError:
+            if fcntl is not None:
+                raise
+            # Unlocked, another worker may have swapped its copy in first; serve that one
+        return open_table(directory, mmap_mode)
+
+
+def build_store(data_dir=DATA_DIR, store_dir=STORE_DIR):
+    """Convert the catalog and sales history, and checkpoint the sales aggregates"""
+    from ingest import SalesIngestor  # ingest.py reads the catalog from this module
+
+    tables = {
+        'products': open_converted('products', os.path.join(data_dir, 'products.csv'), PRODUCT_COLUMNS, store_dir),
+        'sales': open_converted('sales', os.path.join(data_dir, 'sales.csv'), SALES_COLUMNS, store_dir),
+    }
+    ingestor = SalesIngestor(data_dir, store_dir=store_dir)
+    ingestor.refresh()
+    ingestor.checkpoint()
+    tables['aggregates'] = open_table(os.path.join(store_dir, 'aggregates'))
+    return tables
+
+
+if __name__ == '__main__':
+    for name, table in build_store().items():
+        print(f"{name}: {len(table)} rows -> {table.directory}")
@@ -0,0 +1,69 @@
+"""Batch endpoints: bad rows are reported by index and only the good rows are scored"""
+import os
+
+import pytest
+
+from registry import MODEL_DIR
+
+pytestmark = [
+    pytest.mark.filterwarnings('ignore::UserWarning'),
+    pytest.mark.skipif(not os.path.exists(os.path.join(MODEL_DIR, 'demand_model_bundle.pkl')),
+                       reason='the demand bundle is not available'),
+]
+
+GOOD = {
+    'Products': 'Iphone 15', 'Category': 'Electronics', 'Region': 'North', 'Weather Condition': 'Sunny',
+    'Seasonality': 'Summer', 'Units Sold': 120, 'Units Ordered': 80, 'Demand Forecast': 135, 'Price': 329.99,
+    'Discount': 10, 'Holiday/Promotion': 1, 'Competitor Pricing': 318.0, 'year': 2024, 'month': 7, 'day': 14,
+}
+ROWS = [
+    GOOD,
+    dict(GOOD, month=2, day=30),                # invalid date
+    dict(GOOD, Products='Umbrella', Price=25),
+    dict(GOOD, Region='Atlantis'),              # unknown label
+    {k: v for k, v in GOOD.items() if k != 'Price'},  # missing field
+    dict(GOOD, Discount='ten'),                 # not a number
+    dict(GOOD, Products='Coca Cola', day=15),
+]
+BAD = {1: 'day is out of range', 3: "'Atlantis'", 4: "'Price'", 5: "'Discount'"}
+
+
+@pytest.fixture(scope='module')
+def client():
+    from api import app
+
+    return app.test_client()
+
+
+def single(client, row):
+    response = client.post('/predict/demand', json=row)
+    assert response.status_code == 200
+    return response.get_json()['predicted_demand_forecast']
+
+
+@pytest.mark.parametrize('layout', ['rows', 'columns'])
+def test_mixed_batch_reports_bad_rows_by_index(client, layout):
+    if layout == 'rows':
+        payload = ROWS
+    else:
+        payload = {'columns': {name: [row.get(name) for row in ROWS] for name in GOOD}}
+    response = client.post('/predict/demand/batch', json=payload)
+    assert response.status_code == 200
+    body = response.get_json()
+
+    assert [error['index'] for error in body['errors']] == sorted(BAD)
+    for error in body['errors']:
+        assert BAD[error['index']] in error['error']
+    predictions = body['predicted_demand_forecast']
+    assert len(predictions) == len(ROWS)
+    for i, row in enumerate(ROWS):
+        if i in BAD:
+            assert predictions[i] is None
+        else:
+            assert predictions[i] == pytest.approx(single(client, row), abs=0.01)
+
+
+def test_batch_without_good_rows(client):
+    body = client.post('/predict/demand/batch', json=[ROWS[1], ROWS[3]]).get_json()
+    assert body['predicted_demand_forecast'] == [None, None]
+    assert [error['index'] for error in body['errors']] == [0, 1]
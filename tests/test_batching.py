@@ -0,0 +1,103 @@
+"""MicroBatcher: batches close at max_batch or after max_wait, and errors reach every waiting caller"""
+import threading
+import time
+
+import numpy as np
+
+from batching import MicroBatcher
+
+LONG_WAIT = 30.0  # a batch that waits this long has not closed on its size
+
+
+class FakeModel:
+    fields = ['x']
+
+    def __init__(self, fail=None):
+        self.batches = []
+        self.fail = fail
+
+    def preprocess(self, columns, n_rows):
+        errors = {i: "Missing or invalid value for 'x'" for i, value in enumerate(columns['x']) if value is None}
+        X = np.array([[0.0 if value is None else value] for value in columns['x']])
+        return X, errors
+
+    def predict(self, X):
+        self.batches.append(len(X))
+        if self.fail:
+            raise RuntimeError(self.fail)
+        return X[:, 0] * 2
+
+    def decode(self, raw):
+        return raw
+
+
+class FakeRegistry:
+    def __init__(self, model):
+        self.model = model
+
+    def get(self, name):
+        return self.model
+
+
+def submit_all(batcher, values):
+    """Submit each value from its own thread; returns ({index: result or exception}, seconds until all returned)"""
+    results = {}
+
+    def call(i, value):
+        try:
+            results[i] = batcher.submit({'x': value})
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=call, args=(i, value)) for i, value in enumerate(values)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(LONG_WAIT * 2)
+    return results, time.monotonic() - start
+
+
+def test_batch_closes_when_max_batch_rows_arrive():
+    model = FakeModel()
+    batcher = MicroBatcher(FakeRegistry(model), 'fake', max_batch=4, max_wait=LONG_WAIT)
+    results, seconds = submit_all(batcher, [1.0, 2.0, 3.0, 4.0])
+    assert seconds < LONG_WAIT / 3
+    assert model.batches == [4]
+    assert results == {0: 2.0, 1: 4.0, 2: 6.0, 3: 8.0}
+
+
+def test_batch_closes_after_max_wait():
+    model = FakeModel()
+    batcher = MicroBatcher(FakeRegistry(model), 'fake', max_batch=64, max_wait=0.2)
+    start = time.monotonic()
+    assert batcher.submit({'x': 5.0}) == 10.0
+    assert 0.2 <= time.monotonic() - start < LONG_WAIT / 3
+    assert model.batches == [1]
+
+
+def test_lone_request_does_not_wait_when_nothing_else_is_in_flight():
+    model = FakeModel()
+    batcher = MicroBatcher(FakeRegistry(model), 'fake', max_batch=64, max_wait=LONG_WAIT, in_flight=lambda: 1)
+    start = time.monotonic()
+    assert batcher.submit({'x': 1.0}) == 2.0
+    assert time.monotonic() - start < LONG_WAIT / 3
+
+
+def test_predict_error_reaches_every_waiter():
+    model = FakeModel(fail='forest exploded')
+    batcher = MicroBatcher(FakeRegistry(model), 'fake', max_batch=3, max_wait=LONG_WAIT)
+    results, _ = submit_all(batcher, [1.0, 2.0, 3.0])
+    assert model.batches == [3]
+    assert len(results) == 3
+    for result in results.values():
+        assert isinstance(result, ValueError) and 'forest exploded' in str(result)
+
+
+def test_bad_row_fails_alone():
+    model = FakeModel()
+    batcher = MicroBatcher(FakeRegistry(model), 'fake', max_batch=3, max_wait=LONG_WAIT)
+    results, _ = submit_all(batcher, [1.0, None, 3.0])
+    assert model.batches == [2]
+    assert isinstance(results[1], ValueError) and "'x'" in str(results[1])
+    assert (results[0], results[2]) == (2.0, 6.0)
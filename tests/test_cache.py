@@ -0,0 +1,80 @@
+"""TTLCache: entries expire after their TTL and the least recently used go first at capacity"""
+import pytest
+
+import cache
+from cache import MISSING, TTLCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, 'monotonic', clock)
+    return clock
+
+
+def test_entries_expire_after_their_ttl(clock):
+    store = TTLCache(maxsize=10)
+    store.set(('forecast', 'a'), 1, ttl=30)
+    store.set(('dashboard', 'b'), 2, ttl=5)
+    clock.now += 4.9
+    assert store.get(('forecast', 'a')) == 1
+    assert store.get(('dashboard', 'b')) == 2
+    clock.now += 0.1  # exactly at the dashboard entry's expiry
+    assert store.get(('dashboard', 'b')) is MISSING
+    assert store.get(('forecast', 'a')) == 1
+    clock.now += 25
+    assert store.get(('forecast', 'a')) is MISSING
+    stats = store.stats()
+    assert (stats['hits'], stats['misses'], stats['expirations'], stats['size']) == (3, 2, 2, 0)
+    assert stats['namespaces']['dashboard'] == {'hits': 1, 'misses': 1}
+
+
+def test_setting_again_renews_the_ttl(clock):
+    store = TTLCache(maxsize=10)
+    store.set(('forecast', 'a'), 1, ttl=30)
+    clock.now += 20
+    store.set(('forecast', 'a'), 2, ttl=30)
+    clock.now += 20
+    assert store.get(('forecast', 'a')) == 2
+
+
+def test_least_recently_used_entry_is_evicted_at_capacity(clock):
+    store = TTLCache(maxsize=3)
+    for name in 'abc':
+        store.set(('predict', name), name, ttl=60)
+    assert store.get(('predict', 'a')) == 'a'  # a is now the most recently used
+    store.set(('predict', 'd'), 'd', ttl=60)
+    assert store.get(('predict', 'b')) is MISSING
+    assert [store.get(('predict', name)) for name in 'acd'] == ['a', 'c', 'd']
+    store.set(('predict', 'c'), 'c2', ttl=60)  # overwriting refreshes recency without growing the cache
+    store.set(('predict', 'e'), 'e', ttl=60)
+    assert store.get(('predict', 'a')) is MISSING
+    assert [store.get(('predict', name)) for name in 'cde'] == ['c2', 'd', 'e']
+    assert store.stats()['evictions'] == 2
+    assert store.stats()['size'] == 3
+
+
+def test_disabled_or_zero_ttl_stores_nothing(clock):
+    store = TTLCache(maxsize=3, enabled=False)
+    store.set(('predict', 'a'), 1, ttl=60)
+    assert store.get(('predict', 'a')) is MISSING
+    store = TTLCache(maxsize=3)
+    store.set(('predict', 'a'), 1, ttl=0)
+    assert store.get(('predict', 'a')) is MISSING
+
+
+def test_invalidate_one_namespace(clock):
+    store = TTLCache(maxsize=10)
+    store.set(('forecast', 'a'), 1, ttl=60)
+    store.set(('restock', 'a'), 2, ttl=60)
+    store.invalidate('forecast')
+    assert store.get(('forecast', 'a')) is MISSING
+    assert store.get(('restock', 'a')) == 2
@@ -0,0 +1,79 @@
+"""Compression with no pruning must not change a single prediction, and pruning settings are validated"""
+import argparse
+import os
+
+import numpy as np
+import pytest
+
+from compress import compress_forest, config_name, positive_int, write_compact
+from registry import MODEL_DIR, MODEL_SPECS, ModelRegistry, load_compiled
+
+N_ROWS = 5000
+
+pytestmark = pytest.mark.filterwarnings('ignore::UserWarning')
+
+
+@pytest.fixture(scope='module')
+def registry(tmp_path_factory):
+    return ModelRegistry(compiled_dir=str(tmp_path_factory.mktemp('compiled')))
+
+
+def served(registry, name):
+    path = os.path.join(MODEL_DIR, MODEL_SPECS[name]['file'])
+    if not os.path.exists(path):
+        pytest.skip(f"{path} is not available")
+    return registry.load(name, path)
+
+
+def random_inputs(forest, seed=0):
+    """Random rows over each feature's split range, a share of them exactly on a threshold"""
+    rng = np.random.default_rng(seed)
+    X = np.empty((N_ROWS, forest.n_features))
+    points = dict(forest.split_points())
+    for j in range(forest.n_features):
+        thresholds = points.get(j, np.zeros(1))
+        X[:, j] = rng.uniform(thresholds.min() - 1, thresholds.max() + 1, N_ROWS)
+        on_split = rng.random(N_ROWS) < 0.2
+        X[on_split, j] = rng.choice(thresholds, int(on_split.sum()))
+    return X
+
+
+def outputs(forest, X):
+    return forest.predict_proba(X) if forest.is_classifier else forest.predict(X)
+
+
+@pytest.mark.parametrize('name', ['demand', 'pricing', 'inventory', 'recommendation'])
+def test_default_compression_reproduces_predictions(registry, tmp_path, name):
+    model = served(registry, name)
+    X = random_inputs(model.forest)
+    compressed = compress_forest(model.forest)
+
+    assert compressed.threshold.dtype == np.float32
+    assert np.array_equal(outputs(compressed, X), outputs(model.forest, X))
+    assert np.array_equal(compressed.predict(X), model.forest.predict(X))
+    if not compressed.is_classifier:
+        assert np.array_equal(compressed.predict_trees(X), model.forest.predict_trees(X))
+
+    write_compact(model, compressed, str(tmp_path))  # as the registry maps it back
+    mapped, _ = load_compiled(str(tmp_path))
+    assert np.array_equal(outputs(mapped, X), outputs(model.forest, X))
+
+
+def test_config_name_keeps_explicit_limits():
+    assert config_name(None, None, 'float64') == 'depth=full trees=all values=float64'
+    assert config_name(0, 1, 'float32') == 'depth=0 trees=1 values=float32'
+
+
+def test_pruning_limits_must_be_positive():
+    assert positive_int('3') == 3
+    for value in ('0', '-2'):
+        with pytest.raises(argparse.ArgumentTypeError):
+            positive_int(value)
+    with pytest.raises(ValueError):
+        positive_int('two')
+
+
+def test_zero_trees_is_rejected(registry):
+    model = served(registry, 'demand')
+    with pytest.raises(ValueError, match='n_trees must be at least 1'):
+        compress_forest(model.forest, n_trees=0)
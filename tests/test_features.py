@@ -0,0 +1,164 @@
+"""The columnar (training/batch) and single-row (serving) feature paths must agree bit for bit,
+with each other and with the scalar per-row formula they replaced"""
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.preprocessing import LabelEncoder
+
+from encoders import CategoryLookup
+from features import (CATEGORICAL_FIELDS, INPUT_FIELDS, CodedColumn, build_feature_row, build_features, check_parity,
+                      scalar_feature_row)
+
+LABELS = {
+    'Products': ['Coca Cola', 'Iphone 15', 'Umbrella'],
+    'Category': ['Clothing', 'Electronics', 'Groceries'],
+    'Region': ['East', 'North', 'South', 'West'],
+    'Weather Condition': ['Cloudy', 'Rainy', 'Snowy', 'Sunny'],
+    'Seasonality': ['Autumn', 'Spring', 'Summer', 'Winter'],
+}
+
+
+@pytest.fixture
+def encoders():
+    return {name: CategoryLookup(labels, name=name) for name, labels in LABELS.items()}
+
+
+def record(**overrides):
+    row = {
+        'Products': 'Iphone 15', 'Category': 'Electronics', 'Region': 'North', 'Weather Condition': 'Sunny',
+        'Seasonality': 'Summer', 'Units Sold': 120, 'Units Ordered': 80, 'Demand Forecast': 135.5, 'Price': 329.99,
+        'Discount': 10, 'Holiday/Promotion': 1, 'Competitor Pricing': 318.0, 'year': 2024, 'month': 2, 'day': 29,
+    }
+    row.update(overrides)
+    return row
+
+
+def frame(n_rows=60):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        **{name: rng.choice(labels, n_rows) for name, labels in LABELS.items()},
+        'Units Sold': rng.integers(0, 500, n_rows), 'Units Ordered': rng.integers(0, 300, n_rows),
+        'Demand Forecast': rng.uniform(0, 400, n_rows), 'Price': rng.uniform(5, 900, n_rows),
+        'Discount': rng.choice([0, 5, 10, 20], n_rows), 'Holiday/Promotion': rng.integers(0, 2, n_rows),
+        'Competitor Pricing': rng.uniform(5, 900, n_rows),
+        'year': rng.integers(2021, 2025, n_rows), 'month': rng.integers(1, 13, n_rows),
+        'day': rng.integers(1, 29, n_rows),
+    })
+
+
+def legacy_row(row, label_encoders):
+    """The per-row preprocessing api.py and app.py used before features.py, verbatim"""
+    units_sold_transformed = np.log1p(row['Units Sold'])
+    demand_forecast_transformed = np.log1p(row['Demand Forecast'])
+    weekday = datetime(row['year'], row['month'], row['day']).weekday()
+    return np.array([[
+        label_encoders['Products'].transform([row['Products']])[0],
+        label_encoders['Category'].transform([row['Category']])[0],
+        label_encoders['Region'].transform([row['Region']])[0],
+        units_sold_transformed, row['Units Ordered'], demand_forecast_transformed, row['Price'], row['Discount'],
+        label_encoders['Weather Condition'].transform([row['Weather Condition']])[0],
+        row['Holiday/Promotion'], row['Competitor Pricing'],
+        label_encoders['Seasonality'].transform([row['Seasonality']])[0],
+        row['year'], row['month'], row['day'],
+        1 if weekday > 4 else 0,
+        # month * (2 pi / 12), not 2 pi * month / 12: the two differ in the last bit for May and October
+        np.sin(row['month'] * (2 * np.pi / 12)), np.cos(row['month'] * (2 * np.pi / 12)), weekday,
+        row['Price'] * row['Discount'], units_sold_transformed * row['Units Ordered'],
+    ]], dtype=np.float64)
+
+
+@pytest.mark.parametrize('year, month, day', [
+    (2024, 1, 1), (2024, 2, 29), (2024, 3, 31), (2024, 5, 4), (2024, 5, 5), (2023, 6, 30), (2024, 8, 31),
+    (2025, 10, 31), (2025, 11, 1), (2025, 11, 2), (2023, 12, 31),
+])
+def test_both_paths_match_the_legacy_formula(year, month, day):
+    label_encoders = {name: LabelEncoder().fit(labels) for name, labels in LABELS.items()}
+    lookups = {name: CategoryLookup.from_encoder(encoder, name=name) for name, encoder in label_encoders.items()}
+    rows = [record(year=year, month=month, day=day),
+            record(year=year, month=month, day=day, Products='Umbrella', Category='Clothing', Region='West',
+                   **{'Weather Condition': 'Rainy', 'Seasonality': 'Autumn', 'Units Sold': 0, 'Discount': 0,
+                      'Holiday/Promotion': 0, 'Demand Forecast': 7})]
+    expected = np.vstack([legacy_row(row, label_encoders) for row in rows])
+    X, errors = build_features({name: [row[name] for row in rows] for name in INPUT_FIELDS}, lookups)
+    assert errors == {}
+    assert X.tobytes() == expected.tobytes()
+    for i, row in enumerate(rows):
+        assert build_feature_row(row, lookups).tobytes() == expected[i:i + 1].tobytes()
+        assert scalar_feature_row(row, lookups).tobytes() == expected[i:i + 1].tobytes()
+
+
+def test_rows_match_columnar_features(encoders):
+    data = frame()
+    X, errors = build_features(data, encoders)
+    assert errors == {}
+    rows = np.vstack([build_feature_row(row, encoders) for row in data.to_dict('records')])
+    assert X.tobytes() == rows.tobytes()
+
+
+@pytest.mark.parametrize('overrides, message', [
+    ({'month': 2, 'day': 30}, 'day is out of range for month'),
+    ({'year': 2023, 'month': 2, 'day': 29}, 'day is out of range for month'),
+    ({'month': 13}, 'day is out of range for month'),
+    ({'day': 1.5}, 'day is out of range for month'),
+    ({'Price': float('nan')}, "Missing or invalid value for 'Price'"),
+    ({'Units Sold': None}, "Missing or invalid value for 'Units Sold'"),
+    ({'Discount': 'ten'}, "Missing or invalid value for 'Discount'"),
+    ({'Region': 'Atlantis'}, "previously unseen labels: 'Atlantis'"),
+    ({'Products': 'iphone 15'}, "previously unseen labels: 'iphone 15'"),
+    ({'Seasonality': None}, "previously unseen labels: 'None'"),
+])
+def test_bad_rows_fail_the_same_way(encoders, overrides, message):
+    rows = [record(), record(**overrides), record(month=12, day=31)]
+    X, errors = build_features({name: [row[name] for row in rows] for name in INPUT_FIELDS}, encoders)
+    assert list(errors) == [1]
+    assert message in errors[1]
+    with pytest.raises(ValueError, match=message.replace('(', r'\(')):
+        build_feature_row(rows[1], encoders)
+    for i in (0, 2):
+        assert X[i].tobytes() == build_feature_row(rows[i], encoders)[0].tobytes()
+
+
+def test_coded_and_categorical_columns_match_plain_labels(encoders):
+    data = frame(30)
+    expected, _ = build_features(data, encoders)
+    coded = {name: data[name] for name in INPUT_FIELDS}
+    categorical = dict(coded)
+    for name in CATEGORICAL_FIELDS:
+        values = pd.Categorical(data[name])
+        categorical[name] = values
+        coded[name] = CodedColumn(values.codes, list(values.categories))
+    for columns in (coded, categorical):
+        X, errors = build_features(columns, encoders, n_rows=len(data))
+        assert errors == {}
+        assert X.tobytes() == expected.tobytes()
+
+
+def test_coded_columns_report_unknown_and_missing_labels(encoders):
+    data = frame(4)
+    columns = {name: data[name] for name in INPUT_FIELDS}
+    columns['Region'] = CodedColumn(np.array([0, 1, -1, 0]), ['North', 'Atlantis'])
+    columns['Products'] = pd.Categorical(['Umbrella', 'Umbrella', 'Umbrella', 'Kite'])
+    X, errors = build_features(columns, encoders, n_rows=4)
+    assert sorted(errors) == [1, 2, 3]
+    assert "'Atlantis'" in errors[1] and "'None'" in errors[2] and "'Kite'" in errors[3]
+    row = dict(data.iloc[0], Region='North', Products='Umbrella')
+    assert X[0].tobytes() == build_feature_row(row, encoders)[0].tobytes()
+
+
+def test_check_parity_samples_a_bounded_number_of_rows(encoders, monkeypatch):
+    import features
+
+    data = frame(1000)
+    calls = []
+    original = features.scalar_feature_row
+    monkeypatch.setattr(features, 'scalar_feature_row', lambda row, enc: calls.append(row) or original(row, enc))
+    X = check_parity(data, encoders, sample_rows=25)
+    assert X.shape == (1000, 21)
+    assert len(calls) == 25
+
+    tampered = X.copy()
+    tampered[-1, 6] += 1  # the last row is always part of the sample
+    with pytest.raises(AssertionError):
+        check_parity(data, encoders, sample_rows=25, X=tampered)
@@ -0,0 +1,61 @@
+"""FlatForest must predict exactly what the sklearn forests it was compiled from predict"""
+import os
+
+import numpy as np
+import pytest
+
+from forest import TRAVERSAL_CHUNK_SIZE
+from registry import MODEL_DIR, MODEL_SPECS, ModelRegistry
+
+N_ROWS = 3 * TRAVERSAL_CHUNK_SIZE + 17  # several traversal chunks plus a partial one
+
+# The bundles were pickled by an older sklearn; they unpickle fine but warn about it
+pytestmark = pytest.mark.filterwarnings('ignore::UserWarning')
+
+
+def bundle(name):
+    path = os.path.join(MODEL_DIR, MODEL_SPECS[name]['file'])
+    if not os.path.exists(path):
+        pytest.skip(f"{path} is not available")
+    import joblib
+
+    return path, joblib.load(path)['model']
+
+
+def random_inputs(forest, seed=0):
+    """Random rows over each feature's split range, with a share of values exactly on a threshold"""
+    rng = np.random.default_rng(seed)
+    X = np.empty((N_ROWS, forest.n_features))
+    points = dict(forest.split_points())
+    for j in range(forest.n_features):
+        thresholds = points.get(j, np.zeros(1))
+        X[:, j] = rng.uniform(thresholds.min() - 1, thresholds.max() + 1, N_ROWS)
+        on_split = rng.random(N_ROWS) < 0.2
+        X[on_split, j] = rng.choice(thresholds, int(on_split.sum()))
+    X[:50] = X[0]  # repeated rows, so predict_distinct has patterns to share
+    return X
+
+
+@pytest.fixture(scope='module')
+def registry(tmp_path_factory):
+    return ModelRegistry(compiled_dir=str(tmp_path_factory.mktemp('compiled')))
+
+
+@pytest.mark.parametrize('name', ['demand', 'pricing', 'inventory', 'recommendation'])
+def test_compiled_forest_matches_sklearn(registry, name):
+    path, model = bundle(name)
+    forest = registry.load(name, path).forest  # compiled, saved and memory-mapped back, as served
+    X = random_inputs(forest)
+    expected = model.predict(X)
+    per_tree = np.column_stack([estimator.predict(X) for estimator in model.estimators_])
+
+    assert np.array_equal(forest.predict(X), expected)
+    assert np.array_equal(forest.predict_distinct(X), expected)
+    if forest.is_classifier:
+        assert np.array_equal(forest.predict_proba(X), model.predict_proba(X))
+        return
+    assert np.array_equal(forest.predict_trees(X), per_tree)
+    mean, std, spread = forest.predict_spread(X, quantiles=(0.1, 0.5, 0.9))
+    assert np.array_equal(mean, expected)
+    assert np.array_equal(std, per_tree.std(axis=1))
+    assert np.array_equal(spread, np.quantile(per_tree, (0.1, 0.5, 0.9), axis=1).T)
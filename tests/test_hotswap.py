@@ -0,0 +1,114 @@
+"""Candidate staging shared through the marker file, promotion/rollback and shadow statistics across workers"""
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pytest
+
+from hotswap import ModelSwapper
+from registry import MODEL_DIR, MODEL_SPECS, VERSIONS_DIR, ModelRegistry
+
+pytestmark = [
+    pytest.mark.filterwarnings('ignore::UserWarning'),
+    pytest.mark.skipif(not all(os.path.exists(os.path.join(MODEL_DIR, spec['file'])) for spec in MODEL_SPECS.values()),
+                       reason='the model bundles are not available'),
+]
+
+
+@pytest.fixture
+def model_dir(tmp_path):
+    """A model directory with the served bundles and two versions of the pricing one: v1 as served, v2 different"""
+    os.makedirs(tmp_path / VERSIONS_DIR)
+    for spec in MODEL_SPECS.values():
+        shutil.copy(os.path.join(MODEL_DIR, spec['file']), tmp_path / spec['file'])
+    shutil.copy(tmp_path / 'pricing_model_bundle.pkl', tmp_path / VERSIONS_DIR / 'pricing_model_bundle-v1.pkl')
+    shutil.copy(tmp_path / 'demand_model_bundle.pkl', tmp_path / VERSIONS_DIR / 'pricing_model_bundle-v2.pkl')
+    return str(tmp_path)
+
+
+def worker(model_dir):
+    """One serving worker's registry and swapper (two of them in one process stand for two workers)"""
+    swapper = ModelSwapper(ModelRegistry(model_dir=model_dir), watch_interval=0, shadow_fraction=1.0)
+    swapper.ensure_started()
+    return swapper
+
+
+def wait_for(condition, timeout=60):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.05)
+
+
+def candidate_state(swapper):
+    candidate = swapper.status()['pricing']['candidate']
+    return candidate and candidate['state']
+
+
+def test_staged_candidate_is_shared_through_the_marker(model_dir):
+    first, second = worker(model_dir), worker(model_dir)
+    candidate = first.stage('pricing', 'v2', 0.25)
+    with open(first.registry.candidate_path('pricing')) as f:
+        assert json.load(f) == {'version': 'v2', 'fraction': 0.25, 'token': candidate.token}
+
+    wait_for(lambda: candidate_state(second) == 'ready')
+    status = second.status()['pricing']['candidate']
+    assert (status['version'], status['shadowFraction']) == ('v2', 0.25)
+
+    second.discard('pricing')
+    assert not os.path.exists(first.registry.candidate_path('pricing'))
+    assert first.status()['pricing']['candidate'] is None
+    with pytest.raises(ValueError):
+        first.discard('pricing')
+
+
+def test_promote_from_another_worker_and_roll_back(model_dir):
+    first, second = worker(model_dir), worker(model_dir)
+    served = first.registry.bundle_path('pricing')
+    X = np.random.default_rng(0).uniform(0, 400, (64, 21))
+    before = first.registry.get('pricing').predict(X)
+
+    first.stage('pricing', 'v2', 0.0)
+    promoted = second.promote('pricing')  # loads the candidate itself if it isn't ready there yet
+    assert promoted.version == 'v2'
+    with open(served, 'rb') as a, open(first.registry.version_path('pricing', 'v2'), 'rb') as b:
+        assert a.read() == b.read()
+    assert not np.array_equal(second.registry.get('pricing').predict(X), before)
+    assert first.status()['pricing']['candidate'] is None  # the marker is gone for every worker
+    first._reload('pricing')  # what its watcher does when the served file changes
+    assert np.array_equal(first.registry.get('pricing').predict(X), second.registry.get('pricing').predict(X))
+
+    first.stage('pricing', 'v1', 0.0)
+    wait_for(lambda: candidate_state(first) == 'ready')
+    first.promote('pricing')
+    assert np.array_equal(first.registry.get('pricing').predict(X), before)
+    with pytest.raises(ValueError):
+        first.promote('pricing')
+
+
+def test_shadow_statistics_are_summed_over_workers(model_dir):
+    first, second = worker(model_dir), worker(model_dir)
+    candidate = first.stage('pricing', 'v2', 1.0)
+    wait_for(lambda: candidate_state(first) == 'ready' and candidate_state(second) == 'ready')
+    wait_for(lambda: all(s._shadow is not None and s._shadow[2].is_alive() for s in (first, second)))
+
+    X = np.random.default_rng(1).uniform(0, 400, (32, 21))
+    for swapper, batches in ((first, 3), (second, 2)):
+        model = swapper.registry.get('pricing')
+        for _ in range(batches):
+            swapper.shadow('pricing', model, X, model.predict(X))
+    wait_for(lambda: second.status()['pricing']['candidate']['shadow']['rows'] == 5 * len(X))
+
+    shadow = first.status()['pricing']['candidate']['shadow']
+    expected = first.candidates['pricing'].model.predict(X) - first.registry.get('pricing').predict(X)
+    assert shadow['batches'] == 5
+    assert shadow['meanDiff'] == round(float(expected.mean()), 4)
+    assert shadow['maxAbsDiff'] == round(float(np.abs(expected).max()), 4)
+    assert shadow['disagreementRate'] == round(float(np.count_nonzero(expected) / len(X)), 4)
+
+    promoted = first.promote('pricing')
+    assert promoted.stats.rows == 5 * len(X)
+    assert not os.path.exists(first._stats_dir('pricing', candidate.token))
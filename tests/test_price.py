@@ -0,0 +1,53 @@
+"""/predict/price: labels only one model knows are scored, but the answer says which model guessed"""
+import os
+
+import pytest
+
+from registry import MODEL_DIR, MODEL_SPECS
+
+pytestmark = [
+    pytest.mark.filterwarnings('ignore::UserWarning'),
+    pytest.mark.skipif(not all(os.path.exists(os.path.join(MODEL_DIR, MODEL_SPECS[name]['file']))
+                               for name in ('demand', 'pricing')),
+                       reason='the demand and pricing bundles are not available'),
+]
+
+ROW = {
+    'Products': 'Umbrella', 'Category': 'Groceries', 'Region': 'North', 'Weather Condition': 'Rainy',
+    'Seasonality': 'Autumn', 'Units Sold': 120, 'Units Ordered': 80, 'Demand Forecast': 135, 'Price': 25.0,
+    'Discount': 10, 'Holiday/Promotion': 0, 'Competitor Pricing': 24.0, 'year': 2024, 'month': 10, 'day': 3,
+}
+
+
+@pytest.fixture(scope='module')
+def client():
+    from api import app
+
+    return app.test_client()
+
+
+def price(client, **changes):
+    return client.post('/predict/price', json=dict(ROW, **changes))
+
+
+def test_labels_both_models_know_are_not_degraded(client):
+    for products in ('Umbrella', 'Iphone 15', 'iPhone 15'):  # spellings differ only in case between the models
+        body = price(client, Products=products).get_json()
+        assert 'degraded' not in body and 'unknownLabels' not in body, products
+        assert {'predicted_demand_forecast', 'predicted_dynamic_price'} <= body.keys()
+
+
+def test_label_one_model_lacks_marks_the_response_degraded(client):
+    response = price(client, Category='Clothing')  # only the demand model was fitted with Clothing
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['degraded'] is True
+    assert body['unknownLabels'] == {'pricing': {'Category': 'Clothing'}}
+
+
+def test_label_no_model_knows_is_rejected_and_logged(client, caplog):
+    with caplog.at_level('ERROR', logger='api'):
+        response = price(client, Region='Atlantis')
+    assert response.status_code == 400
+    assert "'Atlantis'" in response.get_json()['error']
+    assert [record.getMessage() for record in caplog.records] == [f"Price: {response.get_json()['error']}"]
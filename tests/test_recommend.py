@@ -0,0 +1,52 @@
+"""The precomputed recommendation table must agree with the sklearn forest on every profile"""
+import itertools
+import os
+
+import numpy as np
+import pytest
+
+from recommend import RecommendationStore, RecommendationTable
+from registry import MODEL_DIR, MODEL_SPECS, ModelRegistry
+
+SPEC = MODEL_SPECS['recommendation']
+BUNDLE = os.path.join(MODEL_DIR, SPEC['file'])
+
+pytestmark = [
+    pytest.mark.filterwarnings('ignore::UserWarning'),
+    pytest.mark.skipif(not os.path.exists(BUNDLE), reason='the recommendation bundle is not available'),
+]
+
+
+@pytest.fixture(scope='module')
+def registry(tmp_path_factory):
+    return ModelRegistry(compiled_dir=str(tmp_path_factory.mktemp('compiled')))
+
+
+@pytest.fixture(scope='module')
+def bundle():
+    import joblib
+
+    return joblib.load(BUNDLE)
+
+
+def test_table_matches_the_forest_for_every_profile(registry, bundle):
+    table = RecommendationTable(registry.get('recommendation'))
+    fields = table.model.fields
+    encoders = [bundle[SPEC['encoders'][field]] for field in fields]
+    profiles = list(itertools.product(*(encoder.classes_ for encoder in encoders)))
+    assert len(profiles) == int(np.prod(table.shape))
+
+    X = np.column_stack([encoder.transform([profile[i] for profile in profiles]) for i, encoder in enumerate(encoders)])
+    expected = bundle[SPEC['target']].inverse_transform(bundle['model'].predict(X))
+    expected_proba = bundle['model'].predict_proba(X)
+
+    store = RecommendationStore(registry)
+    for i, profile in enumerate(profiles):
+        codes = tuple(X[i])
+        assert table.proba[codes].tobytes() == expected_proba[i].tobytes()
+        assert table.entry(codes, k=1)[0]['product'] == expected[i]
+        assert store.recommend_one(dict(zip(fields, profile)), k=1)[0]['product'] == expected[i]
+
+    products, scores = table.top_k(X, k=3)
+    assert list(products[:, 0]) == list(expected)
+    assert np.all(np.diff(scores, axis=1) <= 0)
@@ -0,0 +1,174 @@
+"""Content negotiation: every body format decodes to the same columns, and responses round-trip in each format"""
+import json
+
+import numpy as np
+import pytest
+from flask import Flask, request
+
+import wire
+from features import CodedColumn
+
+msgpack = pytest.importorskip('msgpack')
+pa = pytest.importorskip('pyarrow')
+import pyarrow.ipc  # noqa: E402
+
+ROWS = [
+    {'Products': 'Iphone 15', 'Region': 'North', 'Price': 329.99, 'Discount': 10, 'month': 7},
+    {'Products': 'Umbrella', 'Region': 'South', 'Price': 25.0, 'Discount': 0, 'month': 2},
+    {'Products': 'Iphone 15', 'Region': 'North', 'Price': 310.5, 'Discount': 5, 'month': 12},
+]
+COLUMNS = {name: [row[name] for row in ROWS] for name in ROWS[0]}
+NUMERIC = ['Price', 'Discount', 'month']
+
+
+@pytest.fixture(scope='module')
+def app():
+    app = Flask(__name__)
+    wire.install_json(app)
+    return app
+
+
+def decode(app, data, content_type, single=False):
+    with app.test_request_context('/', method='POST', data=data, content_type=content_type):
+        return wire.decode_body(request, single=single)
+
+
+def as_columns(payload):
+    """Decoded payload as {name: list of Python values}, whatever layout it came in"""
+    if isinstance(payload, list):
+        return {name: [row[name] for row in payload] for name in payload[0]}
+    columns = {}
+    for name, values in payload['columns'].items():
+        if isinstance(values, CodedColumn):
+            values = [values.categories[code] for code in values.codes]
+        columns[name] = [v.item() if isinstance(v, np.generic) else v for v in values]
+    return columns
+
+
+def arrow_stream(table):
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def read_arrow(data):
+    return pa.ipc.open_stream(pa.py_buffer(data)).read_all()
+
+
+def bodies():
+    binary = {name: {'dtype': '<f8', 'data': np.asarray(COLUMNS[name], dtype='<f8').tobytes()} for name in NUMERIC}
+    arrow = pa.table({name: pa.array(values).dictionary_encode() if name not in NUMERIC else pa.array(values)
+                      for name, values in COLUMNS.items()})
+    return {
+        'json rows': (json.dumps(ROWS), wire.JSON),
+        'json columns': (json.dumps({'columns': COLUMNS}), wire.JSON),
+        'msgpack rows': (msgpack.packb(ROWS), wire.MSGPACK),
+        'msgpack columns': (msgpack.packb({'columns': COLUMNS}), 'application/x-msgpack'),
+        'msgpack binary columns': (msgpack.packb({'columns': dict(COLUMNS, **binary)}), wire.MSGPACK),
+        'arrow': (arrow_stream(arrow), wire.ARROW),
+    }
+
+
+@pytest.mark.parametrize('body', list(bodies()))
+def test_every_format_decodes_to_the_same_columns(app, body):
+    data, content_type = bodies()[body]
+    columns = as_columns(decode(app, data, content_type))
+    assert columns.keys() == COLUMNS.keys()
+    for name in COLUMNS:
+        if name in NUMERIC:
+            np.testing.assert_array_equal(np.asarray(columns[name], dtype=float), COLUMNS[name], err_msg=name)
+        else:
+            assert columns[name] == COLUMNS[name], name
+
+
+def test_arrow_string_columns_are_coded_once(app):
+    data, content_type = bodies()['arrow']
+    products = decode(app, data, content_type)['columns']['Products']
+    assert isinstance(products, CodedColumn)
+    assert sorted(products.categories) == ['Iphone 15', 'Umbrella']
+
+
+def test_arrow_nulls_read_as_missing(app):
+    table = pa.table({'Products': pa.array(['Umbrella', None]).dictionary_encode(), 'Price': pa.array([25, None])})
+    columns = decode(app, arrow_stream(table), wire.ARROW)['columns']
+    assert list(columns['Products'].codes) == [0, -1]
+    assert columns['Price'][0] == 25 and np.isnan(columns['Price'][1])
+
+
+def test_single_record_bodies_agree(app):
+    record = ROWS[0]
+    arrow = decode(app, arrow_stream(pa.Table.from_pylist([record])), wire.ARROW, single=True)
+    assert decode(app, json.dumps(record), wire.JSON, single=True) == record
+    assert decode(app, msgpack.packb(record), wire.MSGPACK, single=True) == record
+    assert arrow == record
+    with pytest.raises(ValueError, match='Expected one row'):
+        decode(app, arrow_stream(pa.Table.from_pylist(ROWS)), wire.ARROW, single=True)
+
+
+def test_missing_codec_is_a_request_error(app, monkeypatch):
+    monkeypatch.setattr(wire, 'msgpack', None)
+    monkeypatch.setattr(wire, 'pa', None)
+    with pytest.raises(ValueError, match='msgpack is not installed'):
+        decode(app, b'\x90', wire.MSGPACK)
+    with pytest.raises(ValueError, match='pyarrow is not installed'):
+        wire.encode(app, {'error': 'x'}, wire.ARROW)
+
+
+# Responses
+
+BATCH = {
+    'predicted_demand_forecast': [131.2, None, 88.04],
+    'errors': [{'index': 1, 'error': "Unknown label 'Atlantis' for Region"}],
+}
+ERROR = {'error': "Unknown label 'Atlantis' for Region"}
+
+
+def decode_response(response):
+    if response.mimetype == wire.MSGPACK:
+        return msgpack.unpackb(response.get_data(), raw=False)
+    if response.mimetype == wire.ARROW:
+        return read_arrow(response.get_data())
+    return json.loads(response.get_data())
+
+
+@pytest.mark.parametrize('kind', [wire.JSON, wire.MSGPACK])
+@pytest.mark.parametrize('payload', [BATCH, ERROR], ids=['batch', 'error'])
+def test_responses_round_trip(app, kind, payload):
+    with app.app_context():
+        response = wire.encode(app, payload, kind)
+    assert response.mimetype == kind
+    assert decode_response(response) == payload
+
+
+def test_numpy_values_encode_as_plain_numbers(app):
+    payload = {'predictions': np.array([1.5, 2.0]), 'count': np.int64(2)}
+    for kind in (wire.JSON, wire.MSGPACK):
+        with app.app_context():
+            assert decode_response(wire.encode(app, payload, kind)) == {'predictions': [1.5, 2.0], 'count': 2}
+
+
+def test_arrow_batch_errors_go_to_the_metadata(app):
+    table = decode_response(wire.encode(app, BATCH, wire.ARROW))
+    assert table.column_names == ['predicted_demand_forecast']
+    assert table.column(0).to_pylist() == BATCH['predicted_demand_forecast']
+    assert json.loads(table.schema.metadata[b'errors']) == BATCH['errors']
+
+
+def test_arrow_error_response_is_one_row(app):
+    table = decode_response(wire.encode(app, ERROR, wire.ARROW))
+    assert table.to_pylist() == [ERROR]
+
+
+def test_response_format_negotiation(app):
+    cases = [({}, {}, wire.JSON),
+             ({'format': 'msgpack'}, {}, wire.MSGPACK),
+             ({'format': 'arrow'}, {'Accept': wire.MSGPACK}, wire.ARROW),
+             ({}, {'Accept': wire.ARROW}, wire.ARROW),
+             ({}, {'Accept': 'text/html'}, wire.JSON)]
+    for args, headers, expected in cases:
+        with app.test_request_context('/', query_string=args, headers=headers):
+            assert wire.response_format(request) == expected, (args, headers)
+    with app.test_request_context('/', query_string={'format': 'xml'}):
+        with pytest.raises(ValueError, match='format must be one of'):
+            wire.response_format(request)
@@ -0,0 +1,255 @@
+"""Chunked, parallel training of the sales-feature forests (demand, pricing, inventory)
+
+Reads a history CSV with the model input columns (see features.INPUT_FIELDS)
+and the target column in chunks: a first pass collects each categorical
+column's labels and counts rows, a second pass builds the 21 features per
+chunk straight into one preallocated float32 matrix (the dtype the trees
+split on, so fitting makes no extra copy). Forests are fitted on every core.
+
+With --warm-start, trees are added to the currently published bundle
+instead of retraining from scratch; its label encoders are kept so existing
+trees stay valid, and rows with labels they have never seen are skipped.
+
+Each run writes a versioned bundle to <output-dir>/versions/ and, unless
+--no-publish is given, atomically replaces <output-dir>/<model file> so the
+registry picks it up. Each stage reports its wall time, the process's peak
+RSS so far (cumulative: ru_maxrss never goes down) and how much the stage
+raised that peak; --trace-memory adds tracemalloc's per-stage peak of Python
+allocations, at a cost in speed.
+
+    python train.py demand --history data/history.csv
+    python train.py demand --history data/new_sales.csv --warm-start --add-trees 20
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from encoders import compile_encoders
+from features import CATEGORICAL_FIELDS, ENCODER_KEYS, FEATURE_COLUMNS, INPUT_FIELDS, build_features, check_parity
+from registry import MODEL_DIR, MODEL_SPECS, VERSIONS_DIR, publish_bundle
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Rows read and featurized per pandas chunk
+CHUNK_SIZE = 200000
+# Trees in a forest trained from scratch, and trees added per --warm-start run
+N_ESTIMATORS = 100
+ADD_TREES = 20
+RANDOM_STATE = 42
+
+# Target column of each forest trained on the sales features
+TARGETS = {'demand': 'Demand Forecast', 'pricing': 'Price', 'inventory': 'Inventory Level'}
+
+
+class StageReport:
+    """Wall time and peak memory of each training stage (traced allocations only while tracemalloc runs)
+
+    process_peak_rss_mb is the process's high-water mark at the end of the
+    stage, earlier stages included; peak_rss_growth_mb is how far the stage
+    raised it (0 when it stayed below an earlier stage's peak).
+    """
+
+    def __init__(self):
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+        peak_before = max_rss_mb()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            peak = max_rss_mb()
+            growth = None if peak is None else round(peak - peak_before, 1)
+            entry = {'stage': name, 'seconds': round(time.perf_counter() - start, 3),
+                     'process_peak_rss_mb': peak, 'peak_rss_growth_mb': growth}
+            message = f"[{name}] {entry['seconds']:.2f} s, process peak RSS {peak} MB (+{growth} MB this stage)"
+            if tracing:
+                entry['peak_traced_mb'] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+                message += f", peak {entry['peak_traced_mb']:.1f} MB traced"
+            self.stages.append(entry)
+            print(message, flush=True)
+
+
+def max_rss_mb():
+    """High-water resident set size of this process (threads included), or None where unavailable"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / 2 ** 20 if sys.platform == 'darwin' else rss / 2 ** 10, 1)  # bytes on macOS, KiB elsewhere
+
+
+def read_history(path, columns, chunk_size=CHUNK_SIZE):
+    """History CSV in chunks of `columns`; categorical columns are read as strings"""
+    dtype = {name: str for name in CATEGORICAL_FIELDS if name in columns}
+    return pd.read_csv(path, usecols=columns, dtype=dtype, chunksize=chunk_size)
+
+
+def scan_history(path, chunk_size=CHUNK_SIZE):
+    """First pass: (row count, {categorical field: sorted distinct labels})"""
+    n_rows, labels = 0, {name: set() for name in CATEGORICAL_FIELDS}
+    for chunk in read_history(path, CATEGORICAL_FIELDS, chunk_size):
+        n_rows += len(chunk)
+        for name in CATEGORICAL_FIELDS:
+            labels[name].update(chunk[name].dropna().unique())
+    return n_rows, {name: sorted(values) for name, values in labels.items()}
+
+
+def fit_encoders(labels):
+    """Bundle-style LabelEncoders ({bundle key: encoder}) fitted on the scanned labels"""
+    from sklearn.preprocessing import LabelEncoder
+
+    return {ENCODER_KEYS[name]: LabelEncoder().fit(values) for name, values in labels.items()}
+
+
+def feature_matrix(path, encoders, target, n_rows, chunk_size=CHUNK_SIZE):
+    """Second pass: (X float32, y, skipped row count); rows failing preprocessing are skipped
+
+    Reads at most the `n_rows` rows the first pass counted: rows appended to
+    the history in between are left for the next run.
+    """
+    lookups = compile_encoders(encoders, ENCODER_KEYS)
+    X = np.empty((n_rows, len(FEATURE_COLUMNS)), dtype=np.float32)
+    y = np.empty(n_rows, dtype=np.float64)
+    read = filled = skipped = 0
+    checked = False
+    for chunk in read_history(path, INPUT_FIELDS + [target], chunk_size):
+        if read + len(chunk) > n_rows:
+            chunk = chunk.iloc[:n_rows - read]
+        read += len(chunk)
+        if chunk.empty:
+            break
+        features, errors = build_features(chunk, lookups)
+        keep = np.ones(len(chunk), dtype=bool)
+        keep[list(errors)] = False
+        keep &= chunk[target].notna().to_numpy()
+        if not checked and keep.any():
+            check_parity(chunk[keep], lookups, X=features[keep])
+            checked = True
+        n_kept = int(keep.sum())
+        X[filled:filled + n_kept] = features[keep]
+        y[filled:filled + n_kept] = chunk[target].to_numpy(dtype=np.float64)[keep]
+        filled += n_kept
+        skipped += len(chunk) - n_kept
+    return X[:filled], y[:filled], skipped
+
+
+def new_forest(n_estimators=N_ESTIMATORS, random_state=RANDOM_STATE):
+    from sklearn.ensemble import RandomForestRegressor
+
+    return RandomForestRegressor(n_estimators=n_estimators, random_state=random_state, n_jobs=-1)
+
+
+def grow_forest(model, add_trees=ADD_TREES):
+    """Prepare a fitted forest to have `add_trees` more trees fitted onto it"""
+    model.set_params(warm_start=True, n_estimators=len(model.estimators_) + add_trees, n_jobs=-1)
+    return model
+
+
+def bundle_version():
+    return datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+
+
+def save_bundle(bundle, output_dir, filename, version, publish=True):
+    """Write <output_dir>/versions/<stem>-<version>.pkl and optionally publish it as <output_dir>/<filename>"""
+    import joblib
+
+    stem, ext = os.path.splitext(filename)
+    versions_dir = os.path.join(output_dir, VERSIONS_DIR)
+    os.makedirs(versions_dir, exist_ok=True)
+    path = os.path.join(versions_dir, f'{stem}-{version}{ext}')
+    joblib.dump(bundle, path)
+    if publish:
+        publish_bundle(path, os.path.join(output_dir, filename))
+    return path
+
+
+def train(name, history, output_dir=MODEL_DIR, warm_start=False, base=None, n_estimators=N_ESTIMATORS,
+          add_trees=ADD_TREES, chunk_size=CHUNK_SIZE, publish=True, report=None):
+    """Train (or grow) one sales-feature forest from a history CSV; returns the metadata stored in the bundle"""
+    import joblib
+
+    if name not in TARGETS:
+        raise ValueError(f"Model must be one of {sorted(TARGETS)}, got '{name}'")
+    report = report or StageReport()
+    filename = MODEL_SPECS[name]['file']
+
+    with report.stage('scan'):
+        n_rows, labels = scan_history(history, chunk_size)
+    with report.stage('setup'):
+        if warm_start:
+            bundle = joblib.load(base or os.path.join(output_dir, filename))
+            encoders = {key: bundle[key] for key in ENCODER_KEYS.values()}
+            model = grow_forest(bundle['model'], add_trees)
+        else:
+            encoders = fit_encoders(labels)
+            model = new_forest(n_estimators)
+    with report.stage('features'):
+        X, y, skipped = feature_matrix(history, encoders, TARGETS[name], n_rows, chunk_size)
+    if not len(X):
+        raise ValueError(f"No usable training rows in {history} ({skipped} skipped)")
+    with report.stage('fit'):
+        model.fit(X, y)
+    # Serving does not fit or predict through sklearn, so don't ship the training-time settings
+    model.set_params(warm_start=False, n_jobs=None)
+
+    version = bundle_version()
+    metadata = {'model': name, 'version': version, 'history': os.path.abspath(history), 'rows': len(X),
+                'skipped_rows': skipped, 'n_estimators': len(model.estimators_), 'warm_start': warm_start,
+                'target': TARGETS[name]}
+    with report.stage('save'):
+        metadata['path'] = save_bundle(dict(encoders, model=model, metadata=metadata), output_dir, filename,
+                                       version, publish)
+    return metadata
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('model', choices=sorted(TARGETS))
+    parser.add_argument('--history', required=True, help='CSV with the model input columns and the target')
+    parser.add_argument('--output-dir', default=MODEL_DIR)
+    parser.add_argument('--warm-start', action='store_true', help='add trees to the published bundle')
+    parser.add_argument('--base', help='bundle to grow with --warm-start (default: the published one)')
+    parser.add_argument('--n-estimators', type=int, default=N_ESTIMATORS)
+    parser.add_argument('--add-trees', type=int, default=ADD_TREES)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--no-publish', action='store_true', help='only write the versioned bundle')
+    parser.add_argument('--report', help='write the stage report as JSON to this file')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='also report the peak of Python allocations per stage (slower)')
+    args = parser.parse_args()
+
+    if args.trace_memory:
+        tracemalloc.start()
+    report = StageReport()
+    start = time.perf_counter()
+    try:
+        metadata = train(args.model, args.history, args.output_dir, args.warm_start, args.base, args.n_estimators,
+                         args.add_trees, args.chunk_size, not args.no_publish, report)
+    except Exception as e:
+        print(f"[ERROR - Train]: {str(e)}")
+        sys.exit(1)
+    total = round(time.perf_counter() - start, 3)
+    print(f"✅ {metadata['model']} bundle {metadata['version']}: {metadata['n_estimators']} trees on "
+          f"{metadata['rows']} rows ({metadata['skipped_rows']} skipped) in {total:.2f} s -> {metadata['path']}")
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({'metadata': metadata, 'seconds': total, 'stages': report.stages}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
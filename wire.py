@@ -0,0 +1,170 @@
+"""Content negotiation for the API: JSON (through orjson when installed), MessagePack and Arrow IPC
+
+Request bodies are decoded by Content-Type and responses encoded by the
+Accept header (or ?format=json|msgpack|arrow). Columnar MessagePack and
+Arrow bodies decode straight into NumPy columns, so batch scoring never
+builds per-row dicts:
+
+- MessagePack: the same shapes as JSON (rows, or {"columns": {...}}); a
+  column may also be {"dtype": "<f8", "data": <bin>}, read with np.frombuffer.
+- Arrow IPC stream: one record batch column per input field; dictionary-
+  encoded string columns become CodedColumns (each label encoded once).
+
+msgpack and pyarrow are optional; asking for them when they are not
+installed is a request error.
+"""
+import json
+
+import numpy as np
+from flask.json.provider import DefaultJSONProvider
+
+from features import CodedColumn
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:
+    pa = None
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+ARROW = 'application/vnd.apache.arrow.stream'
+
+# Accepted request Content-Types, and ?format= names for responses
+CONTENT_TYPES = {JSON: JSON, MSGPACK: MSGPACK, 'application/x-msgpack': MSGPACK, ARROW: ARROW}
+FORMATS = {'json': JSON, 'msgpack': MSGPACK, 'arrow': ARROW}
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider on orjson: same sorted-key compact output, several times faster"""
+
+    OPTIONS = (orjson.OPT_SORT_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self.OPTIONS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, default=self.default, option=self.OPTIONS),
+                                        mimetype=self.mimetype)
+
+
+def install_json(app):
+    """Serve the app's JSON through orjson when it is installed"""
+    if orjson is not None:
+        app.json = FastJSONProvider(app)
+
+
+def _require(module, name):
+    if module is None:
+        raise ValueError(f"{name} is not installed on this server; send or accept JSON instead")
+
+
+def _plain(value):
+    """NumPy scalars/arrays as Python values, for encoders without NumPy support"""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+# Request bodies
+
+def decode_msgpack(data):
+    _require(msgpack, 'msgpack')
+    payload = msgpack.unpackb(data, raw=False)
+    columns = payload.get('columns', payload) if isinstance(payload, dict) and 'rows' not in payload else None
+    if isinstance(columns, dict):
+        for name, values in columns.items():
+            if isinstance(values, dict) and 'data' in values:
+                columns[name] = np.frombuffer(values['data'], dtype=np.dtype(values.get('dtype', '<f8')))
+    return payload
+
+
+def _arrow_column(column):
+    column = column.combine_chunks() if hasattr(column, 'combine_chunks') else column
+    if pa.types.is_dictionary(column.type):
+        codes = column.indices.fill_null(-1).to_numpy(zero_copy_only=False)
+        return CodedColumn(codes, column.dictionary.to_pylist())
+    if column.null_count and (pa.types.is_integer(column.type) or pa.types.is_floating(column.type)):
+        column = column.cast(pa.float64())  # nulls read as NaN, reported as missing values
+    return column.to_numpy(zero_copy_only=False)
+
+
+def decode_arrow(data, single=False):
+    """An Arrow IPC stream as {'columns': {name: array}}, or its first row as a dict when `single`"""
+    _require(pa, 'pyarrow')
+    table = pa.ipc.open_stream(pa.py_buffer(data)).read_all()
+    if single:
+        if table.num_rows != 1:
+            raise ValueError(f"Expected one row, got {table.num_rows}")
+        return table.to_pylist()[0]
+    return {'columns': {name: _arrow_column(table.column(name)) for name in table.column_names}}
+
+
+def decode_body(request, force=True, single=False):
+    """The request body by Content-Type; JSON (or anything else when `force`) goes through app.json"""
+    kind = CONTENT_TYPES.get(request.mimetype)
+    if kind == MSGPACK:
+        return decode_msgpack(request.get_data())
+    if kind == ARROW:
+        return decode_arrow(request.get_data(), single)
+    return request.get_json(force=force)
+
+
+# Responses
+
+def response_format(request):
+    """Negotiated response type: ?format= first, then the Accept header, JSON by default"""
+    if 'format' in request.args:
+        if request.args['format'] not in FORMATS:
+            raise ValueError(f"format must be one of {sorted(FORMATS)}")
+        return FORMATS[request.args['format']]
+    return request.accept_mimetypes.best_match([JSON, MSGPACK, ARROW], default=JSON)
+
+
+def to_arrow(payload):
+    """Arrow IPC stream of a response: list values become columns, nested dicts of lists flatten to
+    'name.key' columns, and everything else (errors, scalars) goes to the schema metadata as JSON"""
+    _require(pa, 'pyarrow')
+    if isinstance(payload, list):
+        table = pa.Table.from_pylist(payload)
+    else:
+        columns, meta = {}, {}
+        for name, value in payload.items():
+            if isinstance(value, (list, np.ndarray)) and name != 'errors':
+                columns[name] = value
+            elif isinstance(value, dict) and value and all(isinstance(v, list) for v in value.values()):
+                columns.update({f'{name}.{key}': v for key, v in value.items()})
+            else:
+                meta[name] = json.dumps(value, default=_plain)
+        if not columns:  # single-row response: one row of scalars
+            columns, meta = {name: [value] for name, value in payload.items()}, {}
+        table = pa.table({name: pa.array(values) for name, values in columns.items()},
+                         metadata=meta or None)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def encode(app, payload, kind):
+    """Response for `payload` in the negotiated content type"""
+    if kind == MSGPACK:
+        _require(msgpack, 'msgpack')
+        return app.response_class(msgpack.packb(payload, default=_plain), mimetype=MSGPACK)
+    if kind == ARROW:
+        return app.response_class(to_arrow(payload), mimetype=ARROW)
+    return app.json.response(payload)